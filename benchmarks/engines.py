@@ -0,0 +1,362 @@
+"""
+End-to-end throughput benchmark for the archive engines.
+
+Generates file corpora (many tiny files, a few huge files, incompressible
+and compressible data) and runs every engine's create and extract path on
+each, reporting MB/s, files/s, peak RSS and wall time per phase as JSON.
+
+    python benchmarks/engines.py --output results.json
+    python benchmarks/engines.py --standins --save-baseline my-baseline.json
+    python benchmarks/engines.py --standins --baseline my-baseline.json
+
+Real 7z/gpg/veracrypt are used when installed; missing ones are replaced
+by scripted stand-ins (see standins.py), or all of them with --standins.
+Results are only compared with baseline entries measured against the same
+kind of tool. A phase that is slower or larger than the baseline by more
+than --tolerance exits with status 1.
+
+benchmarks/engines-baseline.json was recorded with --standins at --scale 1
+on the machine named in its "platform" field. It shows what a run looks
+like; save your own baseline before comparing on other hardware.
+
+Each phase runs in its own subprocess, so peak RSS (the larger of the
+Python process and the tools it waited for) belongs to that phase alone.
+"""
+
+import argparse
+import filecmp
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "..", "src")
+sys.path.insert(0, HERE)
+sys.path.insert(0, SRC)
+
+import standins  # noqa: E402
+from crypto.tools import TOOLS_CACHE_ENV  # noqa: E402
+
+PASSWORD = "benchmark-password-not-secret"
+
+ENGINES = ("zip", "7z", "gpg", "veracrypt")
+
+# Binary each engine shells out to (stand-in name in standins.TOOLS)
+ENGINE_TOOLS = {"zip": "7z", "7z": "7z", "gpg": "gpg",
+                "veracrypt": "veracrypt"}
+
+# Alternative names the engines also accept
+_TOOL_NAMES = {"7z": ("7z", "7zz"), "gpg": ("gpg", "gpg2"),
+               "veracrypt": ("veracrypt",)}
+
+ARCHIVE_NAMES = {"zip": "archive.zip", "7z": "archive.7z",
+                 "gpg": "archive.tar.gpg", "veracrypt": "container.hc"}
+
+# name: (file count, bytes per file, compressible) at --scale 1
+CORPORA = {
+    "tiny": (2000, 1024, False),
+    "huge": (2, 64 * 1024 * 1024, False),
+    "incompressible": (32, 2 * 1024 * 1024, False),
+    "compressible": (32, 2 * 1024 * 1024, True),
+}
+
+DEFAULT_TOLERANCE = 0.25
+
+
+# ── Corpora ───────────────────────────────────────────────────────
+
+
+def _compressible_block(size):
+    line = b"Diophantus of Alexandria, Arithmetica, book I, problem 1.\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def make_corpus(root, name, scale=1.0):
+    """Create corpus `name` under root/name; returns (path, files, bytes)."""
+    count, size, compressible = CORPORA[name]
+    size = max(int(size * scale), 1)
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    for i in range(count):
+        # Spread tiny files over subdirectories, as real trees are
+        subdir = os.path.join(path, f"d{i // 100:03d}") if count > 100 \
+            else path
+        os.makedirs(subdir, exist_ok=True)
+        with open(os.path.join(subdir, f"f{i:05d}.bin"), "wb") as f:
+            remaining = size
+            while remaining > 0:
+                n = min(remaining, 1 << 20)
+                f.write(_compressible_block(n) if compressible
+                        else os.urandom(n))
+                remaining -= n
+    return path, count, count * size
+
+
+# ── Phase worker (runs in a subprocess) ───────────────────────────
+
+
+def _peak_rss_mb():
+    scale = 1 if sys.platform == "darwin" else 1024  # bytes vs KiB
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak * scale / 2**20, 1)
+
+
+def run_phase(engine, phase, corpus, archive, out_dir):
+    """Run one create or extract call; returns its timing record."""
+    from crypto.zip_engine import create_encrypted_zip, extract_encrypted_zip
+    from crypto.sevenz_engine import create_encrypted_7z, extract_encrypted_7z
+    from crypto.gpg_engine import create_gpg_encrypted, extract_gpg_encrypted
+    from crypto.veracrypt_engine import (
+        create_veracrypt_container, extract_veracrypt_container
+    )
+
+    # Progress reporting is part of the real code path; keep it on
+    updates = [0]
+
+    def progress(done, total):
+        updates[0] += 1
+
+    creators = {
+        "zip": lambda: create_encrypted_zip([corpus], archive, PASSWORD,
+            progress_callback=progress),
+        "7z": lambda: create_encrypted_7z([corpus], archive, PASSWORD,
+            progress_callback=progress),
+        "gpg": lambda: create_gpg_encrypted([corpus], archive, PASSWORD,
+            single_archive=True, progress_callback=progress),
+        "veracrypt": lambda: create_veracrypt_container([corpus], archive,
+            PASSWORD, quick_format=True, progress_callback=progress),
+    }
+    extractors = {
+        "zip": extract_encrypted_zip,
+        "7z": extract_encrypted_7z,
+        "gpg": extract_gpg_encrypted,
+        "veracrypt": extract_veracrypt_container,
+    }
+
+    start = time.perf_counter()
+    if phase == "create":
+        creators[engine]()
+    else:
+        extractors[engine](archive, out_dir, PASSWORD,
+                           progress_callback=progress)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "peak_rss_mb": _peak_rss_mb(),
+            "progress_updates": updates[0]}
+
+
+def _worker_main(argv):
+    engine, phase, corpus, archive, out_dir = argv
+    try:
+        record = run_phase(engine, phase, corpus, archive, out_dir)
+    except Exception as e:
+        record = {"error": f"{type(e).__name__}: {e}"}
+    print(json.dumps(record))
+    return 0
+
+
+# ── Driver ────────────────────────────────────────────────────────
+
+
+def _tool_available(tool):
+    return any(shutil.which(name) for name in _TOOL_NAMES[tool])
+
+
+def prepare_tools(bin_dir, force_standins):
+    """
+    Install stand-ins for missing tools.
+
+    Returns:
+        dict: tool -> "real" or "standin"
+    """
+    kinds = {}
+    for tool in standins.TOOLS:
+        kinds[tool] = ("standin" if force_standins
+                       or not _tool_available(tool) else "real")
+    wanted = [t for t, kind in kinds.items() if kind == "standin"]
+    if wanted:
+        standins.install(bin_dir, wanted)
+    return kinds
+
+
+def _same_tree(a, b):
+    cmp = filecmp.dircmp(a, b)
+    if cmp.left_only or cmp.right_only or cmp.funny_files:
+        return False
+    _, mismatch, errors = filecmp.cmpfiles(a, b, cmp.common_files,
+                                           shallow=False)
+    if mismatch or errors:
+        return False
+    return all(_same_tree(os.path.join(a, d), os.path.join(b, d))
+               for d in cmp.common_dirs)
+
+
+def _spawn_phase(env, engine, phase, corpus, archive, out_dir):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--phase-worker",
+         engine, phase, corpus, archive, out_dir],
+        env=env, capture_output=True, text=True)
+    try:
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {"error": (result.stderr or "worker failed").strip()[-500:]}
+
+
+def run(engines, corpora, scale, env, kinds):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="diophantine-bench-") as work:
+        for corpus_name in corpora:
+            corpus, files, size = make_corpus(
+                os.path.join(work, "corpora"), corpus_name, scale)
+            for engine in engines:
+                case_dir = os.path.join(work, engine, corpus_name)
+                out_dir = os.path.join(case_dir, "out")
+                os.makedirs(out_dir)
+                archive = os.path.join(case_dir, ARCHIVE_NAMES[engine])
+
+                for phase in ("create", "extract"):
+                    record = _spawn_phase(env, engine, phase, corpus,
+                                          archive, out_dir)
+                    entry = {
+                        "engine": engine,
+                        "corpus": corpus_name,
+                        "phase": phase,
+                        "tool": kinds[ENGINE_TOOLS[engine]],
+                        "files": files,
+                        "bytes": size,
+                    }
+                    entry.update(record)
+                    if "seconds" in entry:
+                        seconds = max(entry["seconds"], 1e-9)
+                        entry["mb_per_s"] = round(size / 2**20 / seconds, 2)
+                        entry["files_per_s"] = round(files / seconds, 1)
+                        entry["seconds"] = round(entry["seconds"], 4)
+                    if phase == "extract" and "error" not in entry:
+                        entry["round_trip_ok"] = _same_tree(
+                            corpus, os.path.join(out_dir, corpus_name))
+                    results.append(entry)
+                    print(json.dumps(entry), file=sys.stderr)
+                    if "error" in entry:
+                        break
+                shutil.rmtree(case_dir, ignore_errors=True)
+            shutil.rmtree(corpus, ignore_errors=True)
+    return results
+
+
+def _key(entry):
+    return (entry["engine"], entry["corpus"], entry["phase"], entry["tool"])
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline run.
+
+    Returns:
+        list: Human-readable regression descriptions
+    """
+    previous = {_key(e): e for e in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        label = "/".join(_key(entry))
+        if "error" in entry:
+            regressions.append(f"{label}: failed: {entry['error']}")
+            continue
+        if entry.get("round_trip_ok") is False:
+            regressions.append(f"{label}: extracted tree differs from input")
+        old = previous.get(_key(entry))
+        if old is None or "mb_per_s" not in old:
+            continue
+        if entry["mb_per_s"] < old["mb_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: {entry['mb_per_s']} MB/s, baseline "
+                f"{old['mb_per_s']} MB/s")
+        if entry["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{label}: peak RSS {entry['peak_rss_mb']} MB, baseline "
+                f"{old['peak_rss_mb']} MB")
+    return regressions
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["--phase-worker"]:
+        return _worker_main(argv[1:])
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--engine", action="append", choices=ENGINES,
+        help="limit to these engines (default: all)")
+    parser.add_argument("--corpus", action="append", choices=list(CORPORA),
+        help="limit to these corpora (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0,
+        help="multiply per-file corpus sizes by this factor")
+    parser.add_argument("--standins", action="store_true",
+        help="use stand-ins even for installed tools")
+    parser.add_argument("--standin-mbps", type=float,
+        help="throughput cap for stand-ins (MB/s)")
+    parser.add_argument("--standin-latency-ms", type=int,
+        help="per-invocation delay for stand-ins")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline",
+        help="write results to this path as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help="allowed fractional slowdown/growth (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="diophantine-tools-") as bin_dir:
+        kinds = prepare_tools(bin_dir, args.standins)
+        env = dict(os.environ)
+        env["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+        # Stand-ins live and die with bin_dir; keep them out of the
+        # checkout's config/tools.json
+        env[TOOLS_CACHE_ENV] = os.path.join(bin_dir, "tools.json")
+        if args.standin_mbps is not None:
+            env["DIOPHANTINE_STANDIN_MBPS"] = str(args.standin_mbps)
+        if args.standin_latency_ms is not None:
+            env["DIOPHANTINE_STANDIN_LATENCY_MS"] = str(
+                args.standin_latency_ms)
+
+        results = run(args.engine or ENGINES, args.corpus or list(CORPORA),
+                      args.scale, env, kinds)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "tools": kinds,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    elif any("error" in e or e.get("round_trip_ok") is False
+             for e in results):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
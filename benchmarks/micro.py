@@ -0,0 +1,259 @@
+"""
+Microbenchmarks for the pure-Python hot paths in utils/.
+
+Covers the functions that run on every keystroke or every unlock:
+entropy and pattern-aware strength scoring, recovery phrase generation and validation,
+password generation and keyfile loading/combining. Each case reports
+operations per second and its memory behaviour under tracemalloc: the
+peak bytes allocated during one call, and the blocks still allocated
+after many calls (non-zero means something is being retained).
+
+    python benchmarks/micro.py
+    python benchmarks/micro.py --save-baseline my-baseline.json
+    python benchmarks/micro.py --baseline my-baseline.json
+
+With --baseline, a case whose ops/sec drops, or whose peak allocation
+grows, by more than --tolerance exits with status 1.
+benchmarks/micro-baseline.json is a reference run on the machine named
+in its "platform" field; ops/sec only compare on the same hardware.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "src"))
+
+DEFAULT_TOLERANCE = 0.2
+
+# Peak allocations this small are noise (interpreter caches, small ints)
+ALLOC_SLACK_BYTES = 256
+
+# Typed one character at a time, as the strength meter sees it
+TYPED_PASSWORD = "correct-Horse7battery$staple"
+
+
+def _cases(workdir):
+    """
+    Yield (name, callable) pairs.
+
+    Imports happen here so that loading this module stays cheap.
+    """
+    from utils.entropy import calculate_entropy, entropy_to_strength
+    from utils.strength import StrengthEstimator, estimate, password_strength
+    from utils import recovery_phrase
+    from utils import keyfile_auth
+
+    yield "entropy.calculate_entropy/short", \
+        lambda: calculate_entropy("Tr0ub4dor&3")
+    yield "entropy.calculate_entropy/long", \
+        lambda: calculate_entropy("x7$Kq" * 13)
+
+    def keystrokes():
+        # The strength meter rescoring each prefix as the user types
+        for i in range(1, len(TYPED_PASSWORD) + 1):
+            entropy_to_strength(calculate_entropy(TYPED_PASSWORD[:i]))
+    yield "entropy.keystroke_sequence", keystrokes
+
+    yield "strength.password_strength", \
+        lambda: password_strength(TYPED_PASSWORD)
+    yield "strength.estimate/short", lambda: estimate("Tr0ub4dor&3")
+    yield "strength.estimate/200_chars", \
+        lambda: estimate((TYPED_PASSWORD + " ") * 7)
+
+    def incremental_keystrokes():
+        # The estimator as the Encrypt tab drives it: one update per key
+        estimator = StrengthEstimator()
+        for i in range(1, len(TYPED_PASSWORD) + 1):
+            estimator.update(TYPED_PASSWORD[:i])
+            estimator.label
+    yield "strength.keystroke_sequence", incremental_keystrokes
+
+    entropy = bytes(range(32))
+    words = recovery_phrase.mnemonic_from_entropy(entropy)
+    yield "recovery_phrase.generate/128", \
+        lambda: recovery_phrase.generate_recovery_phrase(128)
+    yield "recovery_phrase.generate/256", \
+        lambda: recovery_phrase.generate_recovery_phrase(256)
+    yield "recovery_phrase.mnemonic_from_entropy/256", \
+        lambda: recovery_phrase.mnemonic_from_entropy(entropy)
+    yield "recovery_phrase.validate/24_words", \
+        lambda: recovery_phrase.validate_recovery_phrase(words)
+    batch = recovery_phrase.generate_many(100, 256)
+    yield "recovery_phrase.generate_many/100x256", \
+        lambda: recovery_phrase.generate_many(100, 256)
+    yield "recovery_phrase.validate_many/100x24_words", \
+        lambda: recovery_phrase.validate_many(batch)
+
+    def typing():
+        # Live validation rechecking each word as the phrase is typed
+        for word in words:
+            for i in range(1, len(word) + 1):
+                recovery_phrase.word_status(word[:i])
+    yield "recovery_phrase.word_status/24_words_typed", typing
+
+    keyfile = os.path.join(workdir, "bench.diophantus")
+    keyfile_auth.generate_keyfile(keyfile)
+    yield "keyfile_auth.load_keyfile", \
+        lambda: keyfile_auth.load_keyfile(keyfile)
+    yield "keyfile_auth.validate_keyfile", \
+        lambda: keyfile_auth.validate_keyfile(keyfile)
+    yield "keyfile_auth.combine_keyfile_and_password", \
+        lambda: keyfile_auth.combine_keyfile_and_password(keyfile, "hunter2")
+
+    # A photo-sized keyfile: first use hashes it, later uses hit the cache
+    large = os.path.join(workdir, "bench-large.jpg")
+    with open(large, "wb") as f:
+        f.write(os.urandom(8 * 1024 * 1024))
+
+    def cold():
+        keyfile_auth.clear_keyfile_cache()
+        return keyfile_auth.keyfile_password(large)
+    yield "keyfile_auth.keyfile_password/8MiB_cold", cold
+    yield "keyfile_auth.keyfile_password/8MiB_cached", \
+        lambda: keyfile_auth.keyfile_password(large)
+
+    from utils.passwords import PasswordPolicy, generate, generate_passwords
+    policy = PasswordPolicy()
+    yield "passwords.generate/24", lambda: generate(policy)
+    yield "passwords.generate/64", lambda: generate(PasswordPolicy(length=64))
+    yield "passwords.generate_passwords/1000x24", \
+        lambda: generate_passwords(1000, policy)
+    no_ambiguous = PasswordPolicy(exclude_ambiguous=True)
+    yield "passwords.generate_passwords/1000x24-unambiguous", \
+        lambda: generate_passwords(1000, no_ambiguous)
+
+
+def measure_speed(func, min_time=0.2, repeat=5):
+    """Best-of-`repeat` operations per second."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    # autorange targets 0.2 s; scale up for a steadier figure
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number / best
+
+
+def measure_memory(func, calls=200):
+    """
+    Returns:
+        tuple: (peak bytes during one call, blocks retained over `calls`)
+    """
+    func()  # warm caches, lazy imports and interned strings
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes = peak - base
+
+        before = tracemalloc.take_snapshot()
+        for _ in range(calls):
+            func()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.count_diff
+                   for stat in after.compare_to(before, "lineno")
+                   if stat.count_diff > 0)
+    return peak_bytes, retained
+
+
+def run(selected=None):
+    results = []
+    # Blocks the snapshots themselves account for; subtracted from each case
+    _, floor = measure_memory(lambda: None)
+    with tempfile.TemporaryDirectory(prefix="diophantine-micro-") as workdir:
+        for name, func in _cases(workdir):
+            if selected and not any(name.startswith(s) for s in selected):
+                continue
+            ops = measure_speed(func)
+            peak, retained = measure_memory(func)
+            entry = {
+                "name": name,
+                "ops_per_s": round(ops, 1),
+                "us_per_op": round(1e6 / ops, 3),
+                "alloc_peak_bytes": peak,
+                "alloc_retained_blocks": max(retained - floor, 0),
+            }
+            results.append(entry)
+            print(json.dumps(entry), file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        list: Human-readable regression descriptions
+    """
+    previous = {e["name"]: e for e in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        old = previous.get(entry["name"])
+        if old is None or "ops_per_s" not in old or "ops_per_s" not in entry:
+            continue
+        if entry["ops_per_s"] < old["ops_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{entry['name']}: {entry['ops_per_s']} ops/s, baseline "
+                f"{old['ops_per_s']} ops/s")
+        limit = old["alloc_peak_bytes"] * (1 + tolerance) + ALLOC_SLACK_BYTES
+        if entry["alloc_peak_bytes"] > limit:
+            regressions.append(
+                f"{entry['name']}: peak allocation "
+                f"{entry['alloc_peak_bytes']} B, baseline "
+                f"{old['alloc_peak_bytes']} B")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--case", action="append",
+        help="only run cases whose name starts with this (repeatable)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline",
+        help="write results to this path as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help="allowed fractional slowdown/growth (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": run(args.case),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report["results"], baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
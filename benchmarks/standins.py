@@ -0,0 +1,552 @@
+"""
+Scripted stand-ins for 7z, gpg and veracrypt.
+
+The engine benchmarks run against the real tools when they are installed.
+When one is missing, install() puts a stand-in of the same name on a
+private PATH directory so every create/extract path can still be timed.
+Stand-ins accept the exact command lines the engines build, keep the
+on-disk round trip honest (what goes in comes back out, wrong passwords
+fail) and simulate the tool's cost:
+
+    DIOPHANTINE_STANDIN_LATENCY_MS   start-up/key-derivation delay (20)
+    DIOPHANTINE_STANDIN_MBPS         throughput cap in MB/s (0 = uncapped)
+
+Point crypto.tools.TOOLS_CACHE_ENV at a scratch file as well, or the
+temporary stand-in paths are cached in config/tools.json.
+
+Payloads are zlib-compressed, so compressible corpora are cheaper than
+incompressible ones, as with the real tools. Nothing is encrypted: these
+exist to measure the Python side of the pipeline, not to protect data.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import tarfile
+import time
+import zlib
+
+MAGIC = b"DIOPHANTINE-STANDIN\n"
+CHUNK = 1 << 20
+
+TOOLS = ("7z", "gpg", "veracrypt")
+
+
+def install(bin_dir, tools=TOOLS):
+    """
+    Write executable stand-ins for `tools` into bin_dir.
+
+    Returns:
+        list: Names of the stand-ins written
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    here = os.path.dirname(os.path.abspath(__file__))
+    for tool in tools:
+        path = os.path.join(bin_dir, tool)
+        with open(path, "w") as f:
+            f.write(f"#!{sys.executable}\n"
+                    "import sys\n"
+                    f"sys.path.insert(0, {here!r})\n"
+                    "from standins import main\n"
+                    f"sys.exit(main({tool!r}, sys.argv[1:]))\n")
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP
+                 | stat.S_IXOTH)
+    return list(tools)
+
+
+# ── Cost simulation ───────────────────────────────────────────────
+
+
+class _Throttle:
+    def __init__(self):
+        self.latency = int(os.environ.get(
+            "DIOPHANTINE_STANDIN_LATENCY_MS", "20")) / 1000
+        mbps = float(os.environ.get("DIOPHANTINE_STANDIN_MBPS", "0"))
+        self.bytes_per_sec = mbps * 1024 * 1024
+        self.start = None
+        self.count = 0
+
+    def begin(self):
+        time.sleep(self.latency)
+        self.start = time.monotonic()
+
+    def account(self, n):
+        self.count += n
+        if self.bytes_per_sec:
+            due = self.start + self.count / self.bytes_per_sec
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def _password_tag(password):
+    return hashlib.sha256(password.encode("utf-8")).digest()
+
+
+class _CompressWriter:
+    """File-like sink that zlib-compresses into `raw`."""
+
+    def __init__(self, raw, throttle, on_write=None):
+        self.raw = raw
+        self.throttle = throttle
+        self.on_write = on_write
+        self.z = zlib.compressobj(1)
+
+    def write(self, data):
+        self.raw.write(self.z.compress(data))
+        self.throttle.account(len(data))
+        if self.on_write:
+            self.on_write(len(data))
+        return len(data)
+
+    def close(self):
+        self.raw.write(self.z.flush())
+
+
+class _DecompressReader:
+    """File-like source that inflates zlib data read from `raw`."""
+
+    def __init__(self, raw, throttle, on_read=None):
+        self.raw = raw
+        self.throttle = throttle
+        self.on_read = on_read
+        self.z = zlib.decompressobj()
+        # Trimmed from the front in place: tarfile reads 512 bytes at a
+        # time, and re-slicing a buffer that one compressible chunk can
+        # inflate to megabytes made extraction quadratic
+        self.buf = bytearray()
+        self.eof = False
+
+    def read(self, size=-1):
+        while not self.eof and (size < 0 or len(self.buf) < size):
+            chunk = self.raw.read(CHUNK)
+            if self.on_read:
+                self.on_read(len(chunk))
+            if not chunk:
+                self.buf += self.z.flush()
+                self.eof = True
+                break
+            self.buf += self.z.decompress(chunk)
+            # Containers carry free space after the stream; stop at its end
+            self.eof = self.z.eof
+        if size < 0:
+            size = len(self.buf)
+        data = bytes(self.buf[:size])
+        del self.buf[:size]
+        self.throttle.account(len(data))
+        return data
+
+
+def _write_header(f, password):
+    f.write(MAGIC)
+    f.write(_password_tag(password))
+
+
+def _check_header(f, password):
+    """Return None if the header matches, else an error message."""
+    if f.read(len(MAGIC)) != MAGIC:
+        return "not a stand-in archive"
+    if f.read(32) != _password_tag(password):
+        return "wrong password"
+    return None
+
+
+def _tree_size(paths):
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        for dirpath, _, files in os.walk(path):
+            for name in files:
+                total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+# ── 7z ────────────────────────────────────────────────────────────
+
+
+class _Percent:
+    """Prints -bsp1 style percentages, redrawn with backspaces."""
+
+    def __init__(self, total, enabled):
+        self.total = max(total, 1)
+        self.enabled = enabled
+        self.done = 0
+        self.last = -1
+
+    def add(self, n):
+        self.done += n
+        pct = min(self.done * 100 // self.total, 100)
+        if self.enabled and pct != self.last:
+            self.last = pct
+            sys.stdout.write(f"{pct:3d}%\b\b\b\b")
+            sys.stdout.flush()
+
+
+def _sevenz(argv):
+    if not argv:
+        sys.stderr.write("Usage: 7z <command> [<switches>...] <archive>\n")
+        return 7
+    command, args = argv[0], argv[1:]
+    if command == "i":
+        # Banner and codec table, as probed by crypto.tools
+        sys.stdout.write("7-Zip (a) 23.01 (stand-in)\n\nCodecs:\n"
+                         " 0ED   21 LZMA2\n 0ED   6F10701 7zAES\n")
+        return 0
+    switches = [a for a in args if a.startswith("-")]
+    positional = [a for a in args if not a.startswith("-")]
+    password = next((s[2:] for s in switches if s.startswith("-p")), "")
+    out_dir = next((s[2:] for s in switches if s.startswith("-o")), ".")
+    show = "-bsp1" in switches
+    throttle = _Throttle()
+    throttle.begin()
+
+    if command == "a":
+        archive, items = positional[0], positional[1:]
+        progress = _Percent(_tree_size(items), show)
+        with open(archive, "wb") as f:
+            _write_header(f, password)
+            sink = _CompressWriter(f, throttle, progress.add)
+            with tarfile.open(fileobj=sink, mode="w|") as tar:
+                for item in items:
+                    tar.add(item, arcname=os.path.basename(item.rstrip("/")))
+            sink.close()
+        return 0
+
+    if command in ("u", "d"):
+        archive, names = positional[0], _list_args(positional[1:])
+        return _rewrite(archive, password, command, names, throttle,
+                        _Percent(_tree_size(names) if command == "u" else
+                                 os.path.getsize(archive), show))
+
+    if command in ("x", "t", "l", "e"):
+        archive, names = positional[0], set(positional[1:])
+        # Root-level exclusions (-x!name, -xr-!name)
+        excluded = {s.partition("!")[2] for s in switches
+                    if s.startswith("-x") and "!" in s}
+        to_stdout = "-so" in switches
+        progress = _Percent(os.path.getsize(archive), show)
+        with open(archive, "rb") as f:
+            error = _check_header(f, password)
+            if error:
+                sys.stderr.write(f"ERROR: {archive}\n{error}\n")
+                return 2
+            source = _DecompressReader(f, throttle, progress.add)
+            with tarfile.open(fileobj=source, mode="r|") as tar:
+                for member in tar:
+                    if member.name in excluded:
+                        continue
+                    if command == "x":
+                        tar.extract(member, path=out_dir)
+                    elif command == "e" and to_stdout:
+                        if member.isfile() and member.name in names:
+                            sys.stdout.buffer.write(
+                                tar.extractfile(member).read())
+                    elif command == "l" and "-slt" in switches:
+                        sys.stdout.write(
+                            f"Path = {member.name}\n"
+                            f"Folder = {'+' if member.isdir() else '-'}\n"
+                            f"Size = {member.size}\n"
+                            f"Encrypted = {'+' if password else '-'}\n\n")
+                    elif command == "l":
+                        sys.stdout.write(member.name + "\n")
+        return 0
+
+    sys.stderr.write(f"Unsupported command: {command}\n")
+    return 7
+
+
+def _list_args(args):
+    """Expand @listfile arguments, one name per line."""
+    names = []
+    for arg in args:
+        if arg.startswith("@"):
+            with open(arg[1:], "r") as f:
+                names.extend(line.rstrip("\n") for line in f if line.strip())
+        else:
+            names.append(arg)
+    return names
+
+
+def _rewrite(archive, password, command, names, throttle, progress):
+    """
+    `u`: replace or add the named files and folders (always from disk);
+    `d`: drop the named entries and everything under them.
+    """
+    if command == "u":
+        # Entries still on disk are replaced; the rest are kept (-uq1)
+        replaced = set()
+        for name in names:
+            root = name.rstrip("/")
+            top = os.path.basename(root)
+            replaced.add(top)
+            for dirpath, dirnames, filenames in os.walk(root):
+                rel = os.path.relpath(dirpath, root)
+                base = top if rel == "." else f"{top}/{rel}"
+                replaced.update(f"{base}/{n}" for n in dirnames + filenames)
+    else:
+        replaced = set(names)
+    tmp = archive + ".standin.tmp"
+    with open(archive, "rb") as f, open(tmp, "wb") as out:
+        error = _check_header(f, password)
+        if error:
+            sys.stderr.write(f"ERROR: {archive}\n{error}\n")
+            out.close()
+            os.remove(tmp)
+            return 2
+        _write_header(out, password)
+        sink = _CompressWriter(out, throttle, progress.add)
+        with tarfile.open(fileobj=sink, mode="w|") as new, \
+                tarfile.open(fileobj=_DecompressReader(f, throttle),
+                             mode="r|") as old:
+            for member in old:
+                if command == "u" and member.name in replaced:
+                    continue
+                if command == "d" and any(
+                        member.name == n or member.name.startswith(n + "/")
+                        for n in replaced):
+                    continue
+                new.addfile(member, old.extractfile(member)
+                            if member.isfile() else None)
+            if command == "u":
+                for name in names:
+                    new.add(name, arcname=os.path.basename(name.rstrip("/")))
+        sink.close()
+    os.replace(tmp, archive)
+    return 0
+
+
+# ── gpg ───────────────────────────────────────────────────────────
+
+
+def _gpg(argv):
+    options = {}
+    positional = []
+    flags = {"--batch", "--yes", "--symmetric", "--decrypt",
+             "--enable-progress-filter", "--version"}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in flags:
+            options[arg] = True
+        elif arg.startswith("--"):
+            options[arg] = argv[i + 1]
+            i += 1
+        else:
+            positional.append(arg)
+        i += 1
+
+    if "--version" in options:
+        sys.stdout.write("gpg (GnuPG) 2.2.40 (stand-in)\n"
+                         "Supported algorithms:\n"
+                         "Cipher: AES, AES192, AES256\n"
+                         "Compression: Uncompressed, ZIP, ZLIB\n")
+        return 0
+
+    status = None
+    if "--status-fd" in options:
+        status = os.fdopen(int(options["--status-fd"]), "w", closefd=False)
+    pass_fd = int(options.get("--passphrase-fd", "0"))
+    # gpg reads one line from the passphrase fd
+    password = b""
+    while not password.endswith(b"\n"):
+        byte = os.read(pass_fd, 1)
+        if not byte:
+            break
+        password += byte
+    password = password.rstrip(b"\n").decode("utf-8")
+
+    source = open(positional[0], "rb") if positional \
+        else sys.stdin.buffer
+    output = options.get("--output", "-")
+    sink = sys.stdout.buffer if output == "-" else open(output, "wb")
+    total = os.path.getsize(positional[0]) if positional else 0
+    done = [0]
+
+    def report(n):
+        done[0] += n
+        if status and total:
+            status.write(f"[GNUPG:] PROGRESS {os.path.basename(positional[0])}"
+                         f" ? {done[0]} {total}\n")
+            status.flush()
+
+    throttle = _Throttle()
+    throttle.begin()
+    try:
+        if "--symmetric" in options:
+            _write_header(sink, password)
+            writer = _CompressWriter(sink, throttle, report)
+            while True:
+                chunk = source.read(CHUNK)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            writer.close()
+            return 0
+
+        if "--decrypt" in options:
+            error = _check_header(source, password)
+            if error:
+                sys.stderr.write(
+                    f"gpg: decryption failed: Bad session key ({error})\n")
+                return 2
+            reader = _DecompressReader(source, throttle, report)
+            while True:
+                chunk = reader.read(CHUNK)
+                if not chunk:
+                    break
+                sink.write(chunk)
+            return 0
+    finally:
+        sink.flush()
+        if sink is not sys.stdout.buffer:
+            sink.close()
+
+    sys.stderr.write("gpg: no command given\n")
+    return 2
+
+
+# ── veracrypt ─────────────────────────────────────────────────────
+
+
+def _state_path():
+    return os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])),
+                        "veracrypt-state.json")
+
+
+def _load_state():
+    try:
+        with open(_state_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state):
+    with open(_state_path(), "w") as f:
+        json.dump(state, f)
+
+
+def _write_tree(f, directory, throttle):
+    """Stream a tar of the directory's contents into f, compressed."""
+    sink = _CompressWriter(f, throttle)
+    with tarfile.open(fileobj=sink, mode="w|") as tar:
+        for name in sorted(os.listdir(directory)):
+            tar.add(os.path.join(directory, name), arcname=name)
+    sink.close()
+
+
+def _clear(directory):
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def _veracrypt(argv):
+    options = {}
+    positional = []
+    flags = {"--text", "--non-interactive", "--quick", "-d", "--list",
+             "--version"}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in flags:
+            options[arg] = True
+        elif arg.startswith("--") and "=" in arg:
+            key, _, value = arg.partition("=")
+            options[key] = value
+        elif arg.startswith("--"):
+            options[arg] = argv[i + 1]
+            i += 1
+        else:
+            positional.append(arg)
+        i += 1
+
+    state = _load_state()
+    throttle = _Throttle()
+
+    if "--version" in options:
+        sys.stdout.write("VeraCrypt 1.26.7 (stand-in)\n")
+        return 0
+
+    if "--list" in options:
+        if not state:
+            sys.stderr.write("Error: No volumes mounted.\n")
+            return 1
+        for mount_dir, entry in sorted(state.items(),
+                                       key=lambda kv: kv[1]["slot"]):
+            sys.stdout.write(f"{entry['slot']}: {entry['container']} "
+                             f"/dev/mapper/veracrypt{entry['slot']} "
+                             f"{mount_dir}\n")
+        return 0
+
+    if "--create" in options:
+        throttle.begin()
+        container = options["--create"]
+        size = int(options["--size"].rstrip("M")) * 1024 * 1024
+        with open(container, "wb") as f:
+            _write_header(f, options.get("--password", ""))
+            # An empty filesystem: the stream of an empty tar
+            sink = _CompressWriter(f, throttle)
+            tarfile.open(fileobj=sink, mode="w|").close()
+            sink.close()
+            if "--quick" not in options:
+                # A full format fills the volume with random-looking data
+                block = b"\0" * CHUNK
+                remaining = size - f.tell()
+                while remaining > 0:
+                    n = min(remaining, CHUNK)
+                    f.write(block[:n])
+                    throttle.account(n)
+                    remaining -= n
+            f.truncate(size)
+        return 0
+
+    if "--mount" in options:
+        throttle.begin()
+        container = options["--mount"]
+        mount_dir = os.path.normpath(positional[0])
+        os.makedirs(mount_dir, exist_ok=True)
+        with open(container, "rb") as f:
+            error = _check_header(f, options.get("--password", ""))
+            if error:
+                sys.stderr.write(f"Error: Incorrect password ({error}).\n")
+                return 1
+            with tarfile.open(fileobj=_DecompressReader(f, throttle),
+                              mode="r|") as tar:
+                tar.extractall(mount_dir)
+        used = {entry["slot"] for entry in state.values()}
+        slot = next(n for n in range(1, 65) if n not in used)
+        state[mount_dir] = {"container": container, "slot": slot}
+        _save_state(state)
+        return 0
+
+    if "--dismount" in options or "-d" in options:
+        target = options.get("--dismount")
+        targets = [os.path.normpath(target)] if isinstance(target, str) \
+            else list(state)
+        for mount_dir in targets:
+            entry = state.pop(mount_dir, None)
+            if entry is None:
+                continue
+            with open(entry["container"], "r+b") as f:
+                f.seek(len(MAGIC) + 32)
+                _write_tree(f, mount_dir, throttle)
+            _clear(mount_dir)
+        _save_state(state)
+        return 0
+
+    sys.stderr.write("Error: unsupported command line\n")
+    return 1
+
+
+def main(tool, argv):
+    handlers = {"7z": _sevenz, "7zz": _sevenz, "gpg": _gpg,
+                "veracrypt": _veracrypt}
+    return handlers[tool](argv)
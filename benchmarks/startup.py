@@ -0,0 +1,203 @@
+"""
+Startup-time budget check for the window and the CLI.
+
+Each measurement starts a fresh interpreter, so every run is a cold
+Python start (module caches, not the OS page cache):
+
+- gui: `src/main.py --measure-startup`, which builds the window, draws the
+  first frame and reports the time to it. Skipped without a display.
+- gui-imports: imports the window and the Encrypt tab without drawing
+  anything, and checks that none of the deferred modules (engines, the
+  Decrypt tab, dialogs, recovery phrase word list) were loaded.
+- cli: `diophantine --help`, which must not import tkinter.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --gui-budget 0.8 --cli-budget 0.15
+
+Exits with status 1 if the median of any measurement exceeds its budget
+or a deferred module is loaded early.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC = os.path.join(ROOT, "src")
+
+# Median seconds from process start
+DEFAULT_GUI_BUDGET = 1.0
+DEFAULT_GUI_IMPORTS_BUDGET = 0.5
+DEFAULT_CLI_BUDGET = 0.25
+
+DEFAULT_RUNS = 5
+
+# Must not be imported before the user asks for them
+DEFERRED_MODULES = (
+    "crypto.zip_engine",
+    "crypto.sevenz_engine",
+    "crypto.gpg_engine",
+    "crypto.veracrypt_engine",
+    "crypto.copy_engine",
+    "crypto.backup",
+    "crypto.dedup_engine",
+    "ui.decrypt_tab",
+    "ui.password_generator",
+    "ui.preferences_window",
+    "utils.recovery_phrase",
+    "utils.keyfile_auth",
+    "tkinter.filedialog",
+    "tarfile",
+    "subprocess",
+    "concurrent.futures",
+)
+
+_GUI_IMPORTS = (
+    "import json, sys; "
+    "import tkinterdnd2, ui.main_window, ui.encrypt_tab, utils.preferences; "
+    "print(json.dumps(sorted(sys.modules)))"
+)
+
+_CLI_IMPORTS = (
+    "import json, sys; import cli; print(json.dumps(sorted(sys.modules)))"
+)
+
+
+def _run(cmd):
+    """Returns (wall seconds, CompletedProcess)."""
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=SRC, capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+
+def _median_wall(cmd, runs):
+    times = []
+    for _ in range(runs):
+        elapsed, result = _run(cmd)
+        if result.returncode != 0:
+            return None, result
+        times.append(elapsed)
+    return statistics.median(times), result
+
+
+def measure_gui(runs):
+    cmd = [sys.executable, os.path.join(SRC, "main.py"), "--measure-startup"]
+    frames = []
+    result = None
+    for _ in range(runs):
+        _, result = _run(cmd)
+        if result.returncode != 0:
+            return {"skipped": result.stderr.strip().splitlines()[-1]
+                    if result.stderr.strip() else "failed"}
+        frames.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        "first_frame_s": statistics.median(f["first_frame_s"] for f in frames),
+        "imports_s": statistics.median(f["imports_s"] for f in frames),
+        "window_s": statistics.median(f["window_s"] for f in frames),
+        "modules": frames[-1]["modules"],
+    }
+
+
+def measure_imports(code, runs):
+    wall, result = _median_wall([sys.executable, "-c", code], runs)
+    if wall is None:
+        return {"error": result.stderr.strip()}
+    modules = json.loads(result.stdout)
+    return {"wall_s": round(wall, 4), "modules": len(modules),
+            "_loaded": set(modules)}
+
+
+def measure_cli(runs):
+    wall, result = _median_wall(
+        [sys.executable, os.path.join(ROOT, "diophantine"), "--help"], runs)
+    if wall is None:
+        return {"error": result.stderr.strip()}
+    return {"wall_s": round(wall, 4)}
+
+
+def check(report, budgets):
+    """
+    Returns:
+        list: Human-readable budget violations
+    """
+    failures = []
+    gui = report["gui"]
+    if "first_frame_s" in gui and gui["first_frame_s"] > budgets["gui"]:
+        failures.append(f"gui: first frame after {gui['first_frame_s']:.3f} s,"
+                        f" budget {budgets['gui']} s")
+
+    for name in ("gui_imports", "cli_imports", "cli"):
+        entry = report[name]
+        if "error" in entry:
+            failures.append(f"{name}: {entry['error']}")
+
+    imports = report["gui_imports"]
+    if "wall_s" in imports:
+        if imports["wall_s"] > budgets["gui_imports"]:
+            failures.append(f"gui-imports: {imports['wall_s']:.3f} s, "
+                            f"budget {budgets['gui_imports']} s")
+        early = imports.pop("_loaded") & set(DEFERRED_MODULES)
+        imports["deferred_loaded"] = sorted(early)
+        for module in sorted(early):
+            failures.append(f"gui-imports: {module} loaded at startup")
+
+    cli_imports = report["cli_imports"]
+    if "_loaded" in cli_imports:
+        tk_modules = sorted(m for m in cli_imports.pop("_loaded")
+                            if m == "tkinter" or m.startswith("tkinter."))
+        cli_imports["tkinter_loaded"] = bool(tk_modules)
+        if tk_modules:
+            failures.append("cli: imports tkinter")
+
+    cli = report["cli"]
+    if "wall_s" in cli and cli["wall_s"] > budgets["cli"]:
+        failures.append(f"cli: {cli['wall_s']:.3f} s, "
+                        f"budget {budgets['cli']} s")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+        help="fresh interpreters per measurement (default %(default)s)")
+    parser.add_argument("--gui-budget", type=float, default=DEFAULT_GUI_BUDGET,
+        help="seconds to the first frame (default %(default)s)")
+    parser.add_argument("--gui-imports-budget", type=float,
+        default=DEFAULT_GUI_IMPORTS_BUDGET,
+        help="seconds to import the window (default %(default)s)")
+    parser.add_argument("--cli-budget", type=float, default=DEFAULT_CLI_BUDGET,
+        help="seconds for `diophantine --help` (default %(default)s)")
+    parser.add_argument("--require-gui", action="store_true",
+        help="fail instead of skipping when there is no display")
+    args = parser.parse_args(argv)
+
+    report = {
+        "gui": measure_gui(args.runs),
+        "gui_imports": measure_imports(_GUI_IMPORTS, args.runs),
+        "cli_imports": measure_imports(_CLI_IMPORTS, 1),
+        "cli": measure_cli(args.runs),
+    }
+    failures = check(report, {
+        "gui": args.gui_budget,
+        "gui_imports": args.gui_imports_budget,
+        "cli": args.cli_budget,
+    })
+    if args.require_gui and "skipped" in report["gui"]:
+        failures.append(f"gui: {report['gui']['skipped']}")
+
+    print(json.dumps(report, indent=2))
+    if failures:
+        print("OVER BUDGET:", file=sys.stderr)
+        for line in failures:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    print("Startup within budget.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
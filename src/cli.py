@@ -0,0 +1,583 @@
+"""
+Headless command-line interface.
+
+    diophantine encrypt [options] ITEM...
+    diophantine decrypt [options] FILE...
+    diophantine verify  [options] FILE...
+    diophantine update  [options] ARCHIVE [ITEM...]
+    diophantine backup  [options] ITEM...
+    diophantine restore [options] ARCHIVE... | STORE
+    diophantine snapshots STORE
+    diophantine generate [options]
+
+Runs the same engines and job batches as the window, without Tk, so it
+works on servers with no display. Progress is printed to stdout as one
+JSON object per line; errors go to stderr. Exit status is 0 when every
+item succeeded, 1 when any failed and 2 for usage or authentication
+errors.
+
+Secrets are never taken from the command line, where other users could
+read them from the process list: use --password-fd, --password-env or a
+keyfile, or type the password at the prompt.
+"""
+
+import argparse
+import getpass
+import json
+import os
+import sys
+
+from crypto.manifest import ALGORITHMS, DEFAULT_ALGORITHM
+from crypto.operations import (
+    METHODS, NAMING_SCHEMES, EXTRACTORS, UPDATERS, build_encrypt_tasks,
+    decrypt_task, decrypt_group_limits, detect_type, encrypt_then_verify,
+    select_password, update_task, verify_task
+)
+from crypto.veracrypt_sizing import FILESYSTEMS
+from utils.jobs import (
+    JobEngine, STARTED, PROGRESS, TASK_DONE, FINISHED, resolve_workers
+)
+from utils.preferences import load_preferences
+from utils.profiles import load_profile, list_profiles
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+class UsageError(Exception):
+    """Bad arguments or authentication input; exits with EXIT_USAGE."""
+
+
+# ── Progress output ───────────────────────────────────────────────
+
+
+class JsonProgress:
+    """Prints job events as JSON lines, one per state change."""
+
+    def __init__(self, stream=None, quiet=False):
+        self.stream = stream or sys.stdout
+        self.quiet = quiet
+        self._last_percent = None
+
+    def emit(self, **fields):
+        if self.quiet:
+            return
+        self.stream.write(json.dumps(fields) + "\n")
+        self.stream.flush()
+
+    def __call__(self, event):
+        job = event.job
+        if event.kind == STARTED:
+            self.emit(event="started", job=job.name,
+                      tasks=[t.label for t in job.tasks])
+        elif event.kind == PROGRESS:
+            # Engines report per chunk; only print visible changes
+            percent = round(event.data, 1)
+            if percent != self._last_percent:
+                self._last_percent = percent
+                self.emit(event="progress", job=job.name, percent=percent)
+        elif event.kind == TASK_DONE:
+            self.emit(event="task_done", job=job.name,
+                      task=event.task.label, ok=event.data == "OK",
+                      status=event.data)
+        elif event.kind == FINISHED:
+            self.emit(event="finished", job=job.name, ok=job.ok_count,
+                      failed=[{"task": label, "status": status}
+                              for label, status in job.failed])
+
+
+# ── Authentication ────────────────────────────────────────────────
+
+
+def _read_fd(fd):
+    """Read a secret from an inherited file descriptor (first line)."""
+    try:
+        with os.fdopen(fd, "r", closefd=False) as f:
+            return f.readline().rstrip("\r\n")
+    except OSError as e:
+        raise UsageError(f"Cannot read password from fd {fd}: {e}")
+
+
+def _secret(args):
+    """The password or phrase from fd, env or prompt; None if absent."""
+    if args.password_fd is not None:
+        return _read_fd(args.password_fd)
+    if args.password_env:
+        value = os.environ.get(args.password_env)
+        if value is None:
+            raise UsageError(
+                f"Environment variable {args.password_env} is not set.")
+        return value
+    return None
+
+
+def resolve_password(args, profile):
+    """
+    Build the engine password exactly as the window does.
+
+    A recovery phrase is used as-is. A keyfile plus a password is the
+    two-factor HMAC; a keyfile alone is its SHA-256. A profile supplies
+    the keyfile when its advanced features are enabled.
+    """
+    from utils.keyfile_auth import (
+        validate_keyfile, combine_keyfile_and_password, keyfile_password
+    )
+    from utils.recovery_phrase import validate_recovery_phrase
+
+    keyfile = args.keyfile
+    two_factor = None
+    if keyfile is None and profile and profile.get("advanced_enabled"):
+        keyfile = profile.get("keyfile_path") or None
+        two_factor = bool(profile.get("use_two_factor"))
+
+    secret = _secret(args)
+
+    if args.recovery_phrase:
+        if secret is None:
+            secret = _prompt("Recovery phrase: ")
+        phrase = " ".join(secret.split())
+        if not validate_recovery_phrase(phrase.split()):
+            raise UsageError("Invalid recovery phrase.")
+        return phrase
+
+    if keyfile:
+        if not validate_keyfile(keyfile):
+            raise UsageError("Keyfile is invalid or corrupted.")
+        if two_factor is False:
+            # The profile encrypted with the keyfile alone
+            return keyfile_password(keyfile)
+        if two_factor and secret is None:
+            secret = _prompt("Password: ")
+        if secret:
+            return combine_keyfile_and_password(keyfile, secret)
+        return keyfile_password(keyfile)
+
+    if secret is None:
+        secret = _prompt("Password: ")
+    if not secret:
+        raise UsageError("Password is empty.")
+    return secret
+
+
+def _prompt(label):
+    if not sys.stdin.isatty():
+        raise UsageError("No password given: use --password-fd, "
+                         "--password-env or --keyfile.")
+    return getpass.getpass(label)
+
+
+# ── Commands ──────────────────────────────────────────────────────
+
+
+def _load_profile(name):
+    if not name:
+        return None
+    profile = load_profile(name)
+    if profile is None:
+        available = ", ".join(list_profiles()) or "none"
+        raise UsageError(f"Unknown profile '{name}' (available: {available}).")
+    return profile
+
+
+def _output_dir(args, prefs):
+    output_dir = args.output or prefs.get("output_directory")
+    if not output_dir:
+        raise UsageError("No output directory: pass -o/--output.")
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
+
+def _check_inputs(paths):
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        raise UsageError("No such file or directory: " + ", ".join(missing))
+
+
+def cmd_encrypt(args, prefs):
+    profile = _load_profile(args.profile) or {}
+    _check_inputs(args.items)
+
+    def option(name, profile_key, default):
+        value = getattr(args, name)
+        if value is not None:
+            return value
+        return profile.get(profile_key, prefs.get(profile_key, default))
+
+    method = option("method", "encryption_method", "zip")
+    output_dir = _output_dir(args, prefs)
+    password = resolve_password(args, profile)
+    tasks = build_encrypt_tasks(
+        [os.path.abspath(p) for p in args.items],
+        output_dir,
+        password,
+        method=method,
+        single_archive=option("single", "single_archive", False),
+        naming_scheme=option("naming", "naming_scheme", "original"),
+        manifest=args.manifest or (DEFAULT_ALGORITHM
+            if profile.get("integrity_manifest") else None),
+        veracrypt_options={
+            "filesystem": option("filesystem", "veracrypt_filesystem",
+                                 "FAT"),
+            "quick_format": option("quick_format", "veracrypt_quick_format",
+                                   False),
+            # veracrypt_dynamic is the key older profiles saved
+            "spare_space": option("spare_space", "veracrypt_spare_space",
+                                  profile.get("veracrypt_dynamic", False)),
+        })
+    if args.verify or profile.get("verify_after"):
+        tasks, limits = encrypt_then_verify(tasks, output_dir, password,
+                                            args.jobs)
+        return "Encrypt", tasks, limits
+    return "Encrypt", tasks, {}
+
+
+def cmd_update(args, prefs):
+    """
+    Add, replace and delete entries of an existing 7z/ZIP archive in
+    place; see crypto.operations.update_task.
+    """
+    profile = _load_profile(args.profile)
+    _check_inputs([args.archive] + args.items)
+    if not (args.items or args.delete):
+        raise UsageError("Nothing to do: give items to add or --delete.")
+    password = resolve_password(args, profile)
+    task = update_task(args.archive,
+                       [os.path.abspath(p) for p in args.items], password,
+                       delete=args.delete, prune=args.prune,
+                       file_type=args.type)
+    return "Update", [task], {}
+
+
+def cmd_backup(args, prefs):
+    """
+    Encrypt what changed since the last run into one dated archive; see
+    crypto.backup.IncrementalBackup.
+    """
+    from crypto.backup import IncrementalBackup
+
+    profile = _load_profile(args.profile) or {}
+    _check_inputs(args.items)
+    method = args.method or profile.get(
+        "encryption_method", prefs.get("encryption_method", "zip"))
+    output_dir = _output_dir(args, prefs)
+    password = resolve_password(args, profile)
+    backup = IncrementalBackup(args.items, output_dir, method=method,
+        index_file=args.index,
+        algorithm=args.hash or profile.get("backup_hash"),
+        full=args.full,
+        verify=args.verify or bool(profile.get("verify_after")),
+        manifest=args.manifest or (DEFAULT_ALGORITHM
+            if profile.get("integrity_manifest") else None),
+        veracrypt_options={
+            "filesystem": profile.get("veracrypt_filesystem", "FAT"),
+            "quick_format": profile.get("veracrypt_quick_format", False),
+            "spare_space": profile.get("veracrypt_spare_space",
+                profile.get("veracrypt_dynamic", False)),
+        })
+
+    def summary():
+        changes = backup.changes
+        return {"archive": backup.archive, "sequence": backup.sequence,
+                "changed": len(changes.changed),
+                "deleted": len(changes.deleted),
+                "bytes": changes.total_bytes}
+
+    args.summary = summary
+    return "Backup", [backup.task(password)], {}
+
+
+def cmd_restore(args, prefs):
+    """
+    Replay a base archive and its deltas, oldest first, or restore one
+    snapshot of a deduplicated store.
+    """
+    from crypto.backup import backup_archives, restore_task
+
+    profile = _load_profile(args.profile)
+    _check_inputs(args.archives)
+    if len(args.archives) == 1 and detect_type(args.archives[0]) == "dedup":
+        return _restore_store(args, prefs, profile)
+    if args.snapshot:
+        raise UsageError("--snapshot only applies to a deduplicated store.")
+    archives = backup_archives(args.archives)
+    if not archives:
+        raise UsageError("No archives found.")
+    output_dir = _output_dir(args, prefs)
+    password = resolve_password(args, profile)
+    return "Restore", [restore_task(archives, output_dir, password,
+                                    verify=args.verify)], {}
+
+
+def _restore_store(args, prefs, profile):
+    from crypto.dedup_engine import restore_snapshot
+    from utils.jobs import Task
+
+    store = args.archives[0]
+    output_dir = _output_dir(args, prefs)
+    password = resolve_password(args, profile)
+    snapshot = args.snapshot or "latest"
+
+    def run(progress):
+        chosen = select_password(store, "dedup", password)
+        restore_snapshot(store, output_dir, chosen,
+                         progress_callback=progress, snapshot=snapshot)
+
+    return "Restore", [Task(os.path.basename(store), run)], {}
+
+
+def _decrypt_types(args):
+    types = {}
+    for path in args.files:
+        effective = args.type or detect_type(path)
+        if effective not in EXTRACTORS:
+            raise UsageError(f"Unknown file type: {path} (use --type).")
+        types[path] = effective
+    return types
+
+
+def cmd_decrypt(args, prefs):
+    profile = _load_profile(args.profile)
+    _check_inputs(args.files)
+    types = _decrypt_types(args)
+    output_dir = _output_dir(args, prefs)
+    password = resolve_password(args, profile)
+    tasks = [decrypt_task(path, output_dir, password, file_type=types[path],
+                          verify=args.verify)
+             for path in args.files]
+    return "Decrypt", tasks, decrypt_group_limits(args.jobs)
+
+
+def cmd_verify(args, prefs):
+    """
+    Check each file decrypts, without extracting it: `7z t`, gpg into a
+    hashing sink or a read-only mount; see crypto.operations.verify_task.
+    """
+    profile = _load_profile(args.profile)
+    _check_inputs(args.files)
+    types = _decrypt_types(args)
+    password = resolve_password(args, profile)
+    tasks = [verify_task(path, password, file_type=types[path])
+             for path in args.files]
+    return "Verify", tasks, decrypt_group_limits(args.jobs)
+
+
+def cmd_snapshots(args):
+    """Print a store's snapshots, oldest first; needs no password."""
+    from crypto.dedup_engine import is_store, snapshot_ids
+
+    if not is_store(args.store):
+        raise UsageError(f"{args.store} is not a deduplicated store.")
+    for snapshot in snapshot_ids(args.store):
+        print(json.dumps({"snapshot": snapshot}))
+    return EXIT_OK
+
+
+def cmd_generate(args):
+    """Print passwords, one per line; needs no job engine."""
+    from utils.passwords import PasswordPolicy, generate_passwords
+
+    policy = PasswordPolicy(length=args.length, upper=args.upper,
+        lower=args.lower, digits=args.digits, symbols=args.symbols,
+        require_each=args.require_each,
+        exclude_ambiguous=args.exclude_ambiguous, exclude=args.exclude)
+    if args.count < 1:
+        raise UsageError("--count must be at least 1.")
+    sys.stdout.write("\n".join(generate_passwords(args.count, policy)) + "\n")
+    return EXIT_OK
+
+
+COMMANDS = {
+    "encrypt": cmd_encrypt,
+    "decrypt": cmd_decrypt,
+    "verify": cmd_verify,
+    "update": cmd_update,
+    "backup": cmd_backup,
+    "restore": cmd_restore,
+}
+
+
+# ── Entry point ───────────────────────────────────────────────────
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="diophantine",
+        description="Encrypt, decrypt and verify archives without the GUI.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--profile",
+        help="saved profile (config/profiles) to take settings from")
+    common.add_argument("-j", "--jobs", type=int, default=None,
+        help="items processed at once (default: max_workers preference)")
+    common.add_argument("-q", "--quiet", action="store_true",
+        help="no progress output; only the exit status")
+    auth = common.add_argument_group("authentication")
+    auth.add_argument("--password-fd", type=int, metavar="FD",
+        help="read the password from this file descriptor (first line)")
+    auth.add_argument("--password-env", metavar="VAR",
+        help="read the password from this environment variable")
+    auth.add_argument("--keyfile", metavar="PATH",
+        help="keyfile; combined with the password if one is given")
+    auth.add_argument("--recovery-phrase", action="store_true",
+        help="the secret read from --password-fd/--password-env or the "
+             "prompt is a recovery phrase")
+
+    enc = sub.add_parser("encrypt", parents=[common],
+        help="encrypt files and folders")
+    enc.add_argument("items", nargs="+", metavar="ITEM")
+    enc.add_argument("-o", "--output",
+        help="output directory (default: output_directory preference)")
+    enc.add_argument("-m", "--method", choices=METHODS)
+    enc.add_argument("--single", action="store_const", const=True,
+        help="one archive for all items")
+    enc.add_argument("--naming", choices=NAMING_SCHEMES)
+    enc.add_argument("--filesystem", choices=list(FILESYSTEMS),
+        help="VeraCrypt container filesystem")
+    enc.add_argument("--quick-format", action="store_const", const=True,
+        help="VeraCrypt quick format")
+    enc.add_argument("--spare-space", "--dynamic", action="store_const",
+        const=True, help="VeraCrypt quick format with spare space for "
+        "later additions (twice the needed size)")
+    enc.add_argument("--manifest", nargs="?", const=DEFAULT_ALGORITHM,
+        choices=ALGORITHMS, metavar="HASH",
+        help="store an integrity manifest of the inputs in each archive "
+             f"(HASH: {', '.join(ALGORITHMS)}; default %(const)s)")
+    enc.add_argument("--verify", action="store_true",
+        help="test each archive as soon as it is written, while the next "
+             "one is being created")
+
+    dec = sub.add_parser("decrypt", parents=[common],
+        help="decrypt archives and containers")
+    dec.add_argument("files", nargs="+", metavar="FILE")
+    dec.add_argument("-o", "--output",
+        help="output directory (default: output_directory preference)")
+    dec.add_argument("-t", "--type", choices=sorted(EXTRACTORS),
+        help="override type detection from the file extension")
+    dec.add_argument("--no-verify", dest="verify", action="store_false",
+        help="skip rechecking extracted files against the manifest")
+
+    ver = sub.add_parser("verify", parents=[common],
+        help="check archives decrypt with the given credentials, "
+             "without extracting them")
+    ver.add_argument("files", nargs="+", metavar="FILE")
+    ver.add_argument("-t", "--type", choices=sorted(EXTRACTORS),
+        help="override type detection from the file extension")
+
+    upd = sub.add_parser("update", parents=[common],
+        help="add, replace or delete entries of an existing 7z/ZIP "
+             "archive in place")
+    upd.add_argument("archive", metavar="ARCHIVE")
+    upd.add_argument("items", nargs="*", metavar="ITEM",
+        help="files and folders to add; changed files replace their "
+             "archived copies")
+    upd.add_argument("--delete", action="append", default=[],
+        metavar="PATH",
+        help="archive path to remove, with everything under it "
+             "(repeatable)")
+    upd.add_argument("--prune", action="store_true",
+        help="also remove archived files under the items that no longer "
+             "exist on disk")
+    upd.add_argument("-t", "--type", choices=sorted(UPDATERS),
+        help="override type detection from the file extension")
+
+    bak = sub.add_parser("backup", parents=[common],
+        help="encrypt only what changed since the last backup into a "
+             "dated archive")
+    bak.add_argument("items", nargs="+", metavar="ITEM")
+    bak.add_argument("-o", "--output",
+        help="output directory (default: output_directory preference)")
+    bak.add_argument("-m", "--method", choices=METHODS)
+    bak.add_argument("--full", action="store_true",
+        help="start a new backup set with a base archive of everything")
+    bak.add_argument("--hash", nargs="?", const=DEFAULT_ALGORITHM,
+        choices=ALGORITHMS, metavar="HASH",
+        help="also compare file contents, so touched but unchanged files "
+             "are skipped (default %(const)s)")
+    bak.add_argument("--index", metavar="PATH",
+        help="change index file (default: one per selection and output "
+             "directory in config/backups)")
+    bak.add_argument("--manifest", nargs="?", const=DEFAULT_ALGORITHM,
+        choices=ALGORITHMS, metavar="HASH",
+        help="store an integrity manifest in the archive")
+    bak.add_argument("--verify", action="store_true",
+        help="test the archive once it is written")
+
+    res = sub.add_parser("restore", parents=[common],
+        help="replay a backup set's base archive and deltas")
+    res.add_argument("archives", nargs="+", metavar="ARCHIVE",
+        help="archives of one set, the folder holding them, or a "
+             "deduplicated store")
+    res.add_argument("-o", "--output",
+        help="output directory (default: output_directory preference)")
+    res.add_argument("--no-verify", dest="verify", action="store_false",
+        help="skip rechecking extracted files against the manifest")
+    res.add_argument("--snapshot", metavar="ID",
+        help="snapshot of a deduplicated store to restore (default: the "
+             "latest; see the snapshots command)")
+
+    snap = sub.add_parser("snapshots",
+        help="list the snapshots of a deduplicated store")
+    snap.add_argument("store", metavar="STORE")
+
+    gen = sub.add_parser("generate",
+        help="print random passwords, one per line")
+    gen.add_argument("-n", "--count", type=int, default=1,
+        help="passwords to generate (default %(default)s)")
+    gen.add_argument("-l", "--length", type=int, default=24,
+        help="characters per password (default %(default)s)")
+    for name in ("upper", "lower", "digits", "symbols"):
+        gen.add_argument(f"--no-{name}", dest=name, action="store_false",
+            help=f"leave out {name}")
+    gen.add_argument("--exclude-ambiguous", action="store_true",
+        help="leave out look-alike characters such as I, l, 1, O and 0")
+    gen.add_argument("--exclude", default="", metavar="CHARS",
+        help="further characters to leave out")
+    gen.add_argument("--no-require-each", dest="require_each",
+        action="store_false",
+        help="do not require one character from every selected set")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in ("generate", "snapshots"):
+        try:
+            return (cmd_generate(args) if args.command == "generate"
+                    else cmd_snapshots(args))
+        except (UsageError, ValueError) as e:
+            print(f"diophantine: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    prefs = load_preferences()
+    args.jobs = resolve_workers(args.jobs or prefs.get("max_workers", 0))
+
+    try:
+        name, tasks, limits = COMMANDS[args.command](args, prefs)
+    except (UsageError, ValueError, FileNotFoundError) as e:
+        print(f"diophantine: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    engine = JobEngine()
+    progress = JsonProgress(quiet=args.quiet)
+    job = engine.submit(name, tasks, on_event=progress,
+        max_parallel=args.jobs, group_limits=limits)
+    try:
+        engine.wait(job)
+    except KeyboardInterrupt:
+        # Running tasks finish their current item; the rest are skipped
+        job.cancel()
+        engine.wait(job)
+    finally:
+        engine.shutdown()
+
+    for label, status in job.failed:
+        print(f"diophantine: {label}: {status}", file=sys.stderr)
+    summary = getattr(args, "summary", None)
+    if summary and not job.failed:
+        progress.emit(event="summary", job=name, **summary())
+    return EXIT_FAILED if job.failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,482 @@
+"""
+Incremental backups driven by a persistent change index.
+
+A backup set is a base archive followed by delta archives, all named with
+chronos_name() in one output directory. The change index records the
+size, mtime_ns, inode and optionally a content hash of every input file
+as of the last successful run. Each run scans the inputs, encrypts only
+new and changed files into one dated archive, and saves the index once
+that archive is written. A run with nothing to do writes no archive.
+
+The index lists plaintext paths, so it is kept in config/backups/ rather
+than next to the archives. With a content hash, a file whose metadata
+changed but whose bytes did not (touched, or rewritten by an editor that
+replaces files) is left out of the delta as well.
+
+Changed files are hardlinked into a staging tree that mirrors their
+layout in the archive, or copied when the output is on another
+filesystem, so every engine archives them under their usual paths. Each
+archive carries RECORD_NAME at its root with the set id, its sequence
+number and the paths deleted since the previous run. restore() extracts
+the archives in order into one folder, checks that none is missing, and
+applies the deletions.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from utils.jobs import Task
+from utils.naming import chronos_name
+
+INDEX_VERSION = 1
+
+# Stored at the root of every archive of a backup set
+RECORD_NAME = ".diophantine-backup.json"
+
+STAGING_PREFIX = ".diophantine-staging-"
+
+
+def _index_dir():
+    """Return config/backups inside the project root."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(here))
+    return os.path.join(project_root, "config", "backups")
+
+
+def index_path(items, output_dir):
+    """Default index file for a selection backed up to `output_dir`."""
+    key = json.dumps([sorted(os.path.realpath(i) for i in items),
+                      os.path.realpath(output_dir)])
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(_index_dir(), f"{digest}.json")
+
+
+def next_archive_name(output_dir, ext):
+    """First chronos_name() for today not yet taken in `output_dir`."""
+    index = 1
+    while os.path.exists(os.path.join(output_dir, chronos_name(index, ext))):
+        index += 1
+    return chronos_name(index, ext)
+
+
+def _safe_join(root, relpath):
+    """`relpath` ("/"-separated) under `root`, or None if it escapes."""
+    parts = relpath.split("/")
+    if not all(parts) or ".." in parts:
+        return None
+    return os.path.join(root, *parts)
+
+
+class ChangeIndex:
+    """
+    State of the inputs as of the last successful run.
+
+    Attributes:
+        set_id (str): Shared by a base archive and its deltas; None
+            before the first run
+        sequence (int): Number of the last archive written (0 = base)
+        algorithm (str): Content hash in use, or None
+        files (dict): relpath -> [size, mtime_ns, inode, hash or None]
+        dirs (set): relpaths of directories
+        archives (list): Archive names of the set, in order
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.set_id = None
+        self.sequence = -1
+        self.algorithm = None
+        self.files = {}
+        self.dirs = set()
+        self.archives = []
+
+    @classmethod
+    def load(cls, path):
+        """
+        The index stored at `path`, or an empty one if there is none.
+
+        Raises:
+            ValueError: If the file is not an index this version reads
+        """
+        index = cls(path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return index
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Cannot read the change index {path}: {e}\n"
+                             f"Run a full backup to start a new set.")
+        if not isinstance(data, dict) \
+                or data.get("version", 0) > INDEX_VERSION:
+            raise ValueError(f"Unsupported change index: {path}")
+        index.set_id = data.get("set")
+        index.sequence = data.get("sequence", -1)
+        index.algorithm = data.get("algorithm")
+        index.files = data.get("files", {})
+        index.dirs = set(data.get("dirs", ()))
+        index.archives = data.get("archives", [])
+        return index
+
+    def save(self):
+        """Write the index atomically; a crash keeps the previous one."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "set": self.set_id,
+                "sequence": self.sequence,
+                "algorithm": self.algorithm,
+                "archives": self.archives,
+                "dirs": sorted(self.dirs),
+                "files": self.files,
+            }, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+class Changes:
+    """What a run found, and the index state to save after it."""
+
+    def __init__(self):
+        self.changed = []       # inventory Entries to archive
+        self.deleted = []       # relpaths of files gone since the last run
+        self.new_dirs = []
+        self.deleted_dirs = []
+        self.files = {}         # index entries after the run
+        self.dirs = set()
+
+    @property
+    def empty(self):
+        return not (self.changed or self.deleted
+                    or self.new_dirs or self.deleted_dirs)
+
+    @property
+    def total_bytes(self):
+        return sum(e.size for e in self.changed)
+
+
+def find_changes(items, index, algorithm=None, full=False,
+                 max_workers=None):
+    """
+    Compare the inputs with the index.
+
+    A file is a candidate when it is new or its size, mtime or inode
+    differ. With `algorithm`, candidates are hashed on a thread pool and
+    those whose hash matches the index are dropped. A full run treats
+    every file as changed.
+
+    Returns:
+        Changes
+
+    Raises:
+        OSError: If an input cannot be listed or read; see
+            crypto.inventory.scan. Only files deleted mid-run are skipped.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from crypto.inventory import scan
+    from crypto.manifest import DEFAULT_HASH_WORKERS, hash_file
+
+    inventory = scan(items)
+    changes = Changes()
+    # Hashes made with another algorithm cannot be compared
+    same_hash = algorithm is not None and algorithm == index.algorithm
+    candidates = []
+    for entry in inventory.files:
+        relpath = entry.relpath.replace(os.sep, "/")
+        try:
+            st = os.stat(entry.src)
+        except FileNotFoundError:
+            # Deleted since the scan; recorded as a deletion. Anything
+            # else (EACCES, EIO) fails the run rather than skip the file.
+            continue
+        state = [st.st_size, st.st_mtime_ns, st.st_ino, None]
+        old = index.files.get(relpath)
+        if old is not None and not full and old[:3] == state[:3]:
+            if same_hash:
+                state[3] = old[3]
+            changes.files[relpath] = state
+            continue
+        changes.files[relpath] = state
+        candidates.append((entry, relpath, state,
+                           old[3] if old is not None and same_hash else None))
+
+    if algorithm and candidates:
+        workers = max(1, min(max_workers or DEFAULT_HASH_WORKERS,
+                             len(candidates)))
+        with ThreadPoolExecutor(max_workers=workers,
+                thread_name_prefix="diophantine-hash") as pool:
+            digests = list(pool.map(
+                lambda c: hash_file(c[0].src, algorithm), candidates))
+        for (entry, relpath, state, old_hash), digest in zip(candidates,
+                                                             digests):
+            state[3] = digest
+            if full or digest != old_hash:
+                changes.changed.append(entry)
+    else:
+        changes.changed = [c[0] for c in candidates]
+
+    changes.dirs = {d.relpath.replace(os.sep, "/") for d in inventory.dirs}
+    if full:
+        changes.new_dirs = sorted(changes.dirs)
+    else:
+        changes.new_dirs = sorted(changes.dirs - index.dirs)
+        changes.deleted_dirs = sorted(index.dirs - changes.dirs)
+        changes.deleted = sorted(set(index.files) - set(changes.files))
+    return changes
+
+
+def _stage(changes, record, staging_dir):
+    """
+    Lay out the changed files and the record under `staging_dir`.
+
+    Returns:
+        list: Top-level paths to hand to the engine
+    """
+    for relpath in changes.new_dirs:
+        os.makedirs(os.path.join(staging_dir, *relpath.split("/")),
+                    exist_ok=True)
+    for entry in changes.changed:
+        dst = os.path.join(staging_dir, entry.relpath)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.link(entry.src, dst)
+        except OSError:
+            # Another filesystem, or links not supported
+            shutil.copy2(entry.src, dst)
+    with open(os.path.join(staging_dir, RECORD_NAME), "w") as f:
+        json.dump(record, f, indent=1)
+    return [os.path.join(staging_dir, name)
+            for name in sorted(os.listdir(staging_dir))]
+
+
+class IncrementalBackup:
+    """
+    One run of an incremental backup set.
+
+    Args:
+        items (list): Files and folders to back up
+        output_dir (str): Where the set's archives are written
+        method (str): Engine, as in crypto.operations.METHODS, except
+            "dedup"
+        index_file (str): Change index; see index_path() for the default
+        algorithm (str): Content hash for change detection, or None to
+            trust size, mtime and inode alone
+        full (bool): Start a new set with a base archive of everything
+        verify (bool): Test the archive once it is written; if the test
+            fails, the archive is removed and the index left as it was
+        manifest (str), veracrypt_options (dict): As for
+            crypto.operations.build_encrypt_tasks
+
+    After run(), `archive` is the name of the archive written (None if
+    nothing changed) and `changes` what was found.
+    """
+
+    def __init__(self, items, output_dir, method="zip", index_file=None,
+                 algorithm=None, full=False, verify=False, manifest=None,
+                 veracrypt_options=None):
+        if method == "dedup":
+            raise ValueError("A deduplicated store keeps its own snapshots; "
+                             "encrypt to it with the dedup method instead.")
+        self.items = [os.path.abspath(i) for i in items]
+        self.output_dir = output_dir
+        self.method = method
+        self.index_file = index_file or index_path(self.items, output_dir)
+        self.algorithm = algorithm
+        self.full = full
+        self.verify = verify
+        self.manifest = manifest
+        self.veracrypt_options = veracrypt_options
+        self.archive = None
+        self.sequence = None
+        self.changes = None
+
+    def run(self, password, progress_callback=None):
+        from crypto.operations import EXT_MAP, build_encrypt_tasks, \
+            verify_task
+
+        index = ChangeIndex.load(self.index_file)
+        full = self.full or index.set_id is None
+        changes = find_changes(self.items, index, self.algorithm, full)
+        self.changes = changes
+        if changes.empty:
+            # Metadata-only changes still move the index forward
+            index.files, index.dirs = changes.files, changes.dirs
+            index.save()
+            if progress_callback:
+                progress_callback(1, 1)
+            return None
+
+        set_id = os.urandom(8).hex() if full else index.set_id
+        sequence = 0 if full else index.sequence + 1
+        record = {
+            "version": INDEX_VERSION,
+            "set": set_id,
+            "sequence": sequence,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "deleted": changes.deleted,
+            "deleted_dirs": changes.deleted_dirs,
+        }
+        name = next_archive_name(self.output_dir, EXT_MAP[self.method])
+        out = os.path.join(self.output_dir, name)
+        staging = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=self.output_dir)
+        try:
+            staged = _stage(changes, record, staging)
+            for task in build_encrypt_tasks(staged, self.output_dir,
+                    password, method=self.method, single_archive=True,
+                    veracrypt_options=self.veracrypt_options,
+                    manifest=self.manifest, single_name=name):
+                task.run(progress_callback)
+            if self.verify:
+                verify_task(out, password, file_type=None).run(None)
+        except BaseException:
+            # An archive the index does not list would break the set's
+            # sequence on restore, so it goes, verified or not
+            if os.path.exists(out):
+                os.remove(out)
+            raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        if full:
+            index.archives = []
+        index.set_id = set_id
+        index.sequence = sequence
+        index.algorithm = self.algorithm
+        index.files, index.dirs = changes.files, changes.dirs
+        index.archives.append(name)
+        index.save()
+        self.archive = name
+        self.sequence = sequence
+        return name
+
+    def task(self, password):
+        """The run as a job engine Task."""
+        return Task("Incremental backup",
+                    lambda progress: self.run(password, progress))
+
+
+def _read_record(output_dir, archive_name):
+    path = os.path.join(output_dir, RECORD_NAME)
+    try:
+        with open(path, "r") as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"{archive_name} is not part of an incremental backup set")
+    os.remove(path)
+    if record.get("version", 0) > INDEX_VERSION:
+        raise RuntimeError(f"{archive_name} was written by a newer release")
+    return record
+
+
+def _apply_deletions(output_dir, record):
+    for relpath in record.get("deleted", ()):
+        path = _safe_join(output_dir, relpath)
+        if path is None:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    # Deepest first, so emptied parents can go too
+    for relpath in sorted(record.get("deleted_dirs", ()),
+                          key=lambda p: p.count("/"), reverse=True):
+        path = _safe_join(output_dir, relpath)
+        if path is None:
+            continue
+        try:
+            os.rmdir(path)
+        except OSError:
+            # Not empty: it holds files from outside the set
+            pass
+
+
+def backup_archives(paths):
+    """
+    The archives to restore, in the order they were written.
+
+    Folders are expanded to the encrypted files directly inside them.
+    chronos_name() puts the date and a per-day counter first, so name
+    order is creation order.
+    """
+    from crypto.operations import detect_type
+
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(os.path.join(path, name)
+                         for name in os.listdir(path)
+                         if not name.startswith(".")
+                         and detect_type(name) != "unknown"
+                         and os.path.isfile(os.path.join(path, name)))
+        else:
+            found.append(path)
+    return sorted(found, key=os.path.basename)
+
+
+def restore(archives, output_dir, password, verify=True,
+            progress_callback=None):
+    """
+    Replay a base archive and its deltas into `output_dir`.
+
+    Args:
+        archives (list): Archives of one set, in order; see
+            backup_archives()
+        password (str | list): As for crypto.operations.decrypt_task
+
+    Returns:
+        int: Archives restored
+
+    Raises:
+        RuntimeError: If the first archive is not a base, one is missing
+            or belongs to another set, or an extraction fails
+    """
+    from crypto.operations import decrypt_task
+
+    sizes = [os.path.getsize(a) for a in archives]
+    total = sum(sizes) or 1
+    done = 0
+    set_id = None
+    for expected, (archive, size) in enumerate(zip(archives, sizes)):
+        name = os.path.basename(archive)
+
+        def progress(current, whole, base=done, size=size):
+            if progress_callback and whole:
+                progress_callback(base + size * current // whole, total)
+
+        decrypt_task(archive, output_dir, password,
+                     verify=verify).run(progress)
+        record = _read_record(output_dir, name)
+        if expected == 0 and record["sequence"] != 0:
+            raise RuntimeError(
+                f"{name} is delta {record['sequence']}; a restore starts "
+                f"from the base archive of its set")
+        if expected and record["sequence"] == 0:
+            raise RuntimeError(
+                f"{name} starts a new backup set; restore it and the "
+                f"archives after it into an empty folder")
+        if expected and record["set"] != set_id:
+            raise RuntimeError(f"{name} belongs to another backup set")
+        if record["sequence"] != expected:
+            raise RuntimeError(
+                f"Delta {expected} of the set is missing before {name}")
+        _apply_deletions(output_dir, record)
+        set_id = record["set"]
+        done += size
+    if progress_callback:
+        progress_callback(total, total)
+    return len(archives)
+
+
+def restore_task(archives, output_dir, password, verify=True):
+    """restore() as a job engine Task; the archives run one at a time."""
+    return Task("Restore",
+                lambda progress: restore(archives, output_dir, password,
+                                         verify, progress),
+                weight=sum(os.path.getsize(a) for a in archives) or 1)
@@ -0,0 +1,181 @@
+"""
+Parallel, byte-accounted file copying.
+
+Used to fill mounted VeraCrypt volumes and to copy their contents back out.
+Directories are created up front from the inventory, then files are copied
+on a bounded thread pool. Each copy uses the kernel fast paths where the
+platform has them (copy_file_range, then sendfile) and falls back to large
+buffered reads, reporting progress in bytes as it goes rather than per
+top-level entry.
+"""
+
+import errno
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from crypto.inventory import scan
+from crypto.progress import Reporter
+
+# Files are copied in chunks of this size so progress keeps moving on
+# multi-GB files.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Copies are I/O bound; a few concurrent streams keep the device busy
+# without thrashing a spinning disk.
+DEFAULT_COPY_WORKERS = 4
+
+# errno values meaning "this copy primitive does not apply here"
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                errno.ENOTSUP, errno.EBADF, errno.ETXTBSY}
+
+
+class _Unsupported(Exception):
+    """A copy primitive gave up after copying (and reporting) up to offset."""
+
+    def __init__(self, offset):
+        super().__init__(offset)
+        self.offset = offset
+
+
+def _copy_file_range(fin, fout, offset, size, reporter):
+    while offset < size:
+        try:
+            n = os.copy_file_range(fin, fout, min(CHUNK_SIZE, size - offset),
+                                   offset, offset)
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                raise _Unsupported(offset) from e
+            raise
+        if n == 0:
+            break
+        offset += n
+        reporter.add(n)
+    return offset
+
+
+def _sendfile(fin, fout, offset, size, reporter):
+    os.lseek(fout, offset, os.SEEK_SET)
+    while offset < size:
+        try:
+            n = os.sendfile(fout, fin, offset, min(CHUNK_SIZE, size - offset))
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                raise _Unsupported(offset) from e
+            raise
+        if n == 0:
+            break
+        offset += n
+        reporter.add(n)
+    return offset
+
+
+def _buffered(fin, fout, offset, size, reporter, digest=None):
+    os.lseek(fin, offset, os.SEEK_SET)
+    os.lseek(fout, offset, os.SEEK_SET)
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = os.readv(fin, [buf])
+        if n == 0:
+            break
+        if digest is not None:
+            digest.update(view[:n])
+        written = 0
+        while written < n:
+            written += os.write(fout, view[written:n])
+        offset += n
+        reporter.add(n)
+    return offset
+
+
+_METHODS = []
+if hasattr(os, "copy_file_range"):
+    _METHODS.append(_copy_file_range)
+if hasattr(os, "sendfile") and os.uname().sysname == "Linux":
+    # Only Linux sendfile accepts a regular file as the destination
+    _METHODS.append(_sendfile)
+
+
+def copy_file(src, dst, reporter=None, manifest=None, relpath=None):
+    """
+    Copy one file's data and metadata, reporting bytes to `reporter`.
+
+    With a ManifestBuilder, the data is hashed as it is copied (through
+    buffered reads, since the kernel fast paths never surface it) and
+    recorded under `relpath`.
+    """
+    reporter = reporter or Reporter(None, 0)
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fin, fout = fsrc.fileno(), fdst.fileno()
+        st = os.fstat(fin)
+        size = st.st_size
+        offset = 0
+        if manifest is not None:
+            digest = manifest.new_hash()
+            offset = _buffered(fin, fout, 0, size, reporter, digest)
+            manifest.add(relpath, offset, st.st_mtime, digest.hexdigest())
+            _copy_stat(src, dst)
+            return
+        for method in _METHODS:
+            try:
+                offset = method(fin, fout, offset, size, reporter)
+                break
+            except _Unsupported as e:
+                # Carry on from where it stopped; those bytes are counted
+                offset = e.offset
+                continue
+        else:
+            offset = _buffered(fin, fout, offset, size, reporter)
+        if offset < size:
+            # Fast path stopped short (file changed); finish with reads
+            _buffered(fin, fout, offset, size, reporter)
+    _copy_stat(src, dst)
+
+
+def _copy_stat(src, dst):
+    # FAT/exFAT mounts reject chmod; timestamps are still worth keeping
+    try:
+        shutil.copystat(src, dst)
+    except OSError:
+        pass
+
+
+def copy_items(items, dest_dir, progress_callback=None, max_workers=None,
+               manifest=None):
+    """
+    Copy files and folders into dest_dir, in parallel.
+
+    Each item lands under its basename, as shutil.copy/copytree would place
+    it. Existing files are overwritten.
+
+    Args:
+        items (list): Source files and folders
+        dest_dir (str): Destination directory (created if needed)
+        progress_callback (callable): progress_callback(bytes_done, bytes_total)
+        max_workers (int): Concurrent file copies (DEFAULT_COPY_WORKERS)
+        manifest (ManifestBuilder): Hashes every file while copying it
+    """
+    inventory = scan(items)
+    reporter = Reporter(progress_callback, inventory.total_bytes)
+
+    os.makedirs(dest_dir, exist_ok=True)
+    for d in inventory.dirs:
+        os.makedirs(os.path.join(dest_dir, d.relpath), exist_ok=True)
+
+    workers = max(1, min(max_workers or DEFAULT_COPY_WORKERS,
+                         len(inventory.files) or 1))
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix="diophantine-copy") as pool:
+        futures = [pool.submit(copy_file, f.src,
+                               os.path.join(dest_dir, f.relpath), reporter,
+                               manifest, f.relpath)
+                   for f in inventory.files]
+        for future in futures:
+            # Re-raise the first failure once the pool has drained
+            future.result()
+
+    # Directory timestamps last, after their contents stopped changing
+    for d in reversed(inventory.dirs):
+        _copy_stat(d.src, os.path.join(dest_dir, d.relpath))
+    reporter.finish()
@@ -1,62 +1,248 @@
 import subprocess
+import io
 import os
 import shutil
 import tarfile
-import tempfile
+import threading
+import time
 
+from crypto.manifest import (
+    MANIFEST_NAME, IntegrityError, ManifestBuilder, compare_hashes,
+    hash_stream, loads as load_manifest, sidecar_path
+)
+from crypto.progress import (
+    CountingWriter, Reporter, inventory_size, parse_gpg_progress
+)
+from crypto.tools import get_tool
 
-def _find_gpg():
-    for name in ("gpg", "gpg2"):
-        if shutil.which(name):
-            return name
-    raise FileNotFoundError(
-        "GPG is not installed.\n\n"
-        "Install via Homebrew:  brew install gnupg")
 
+# Ciphertext fed to gpg by the password pre-flight check
+PREFLIGHT_BYTES = 64 * 1024
 
-def _run_gpg(cmd, password=None):
-    """Run a GPG command, passing password via stdin for security."""
-    proc = subprocess.run(
-        cmd,
-        input=password,
-        capture_output=True,
-        text=True)
+# gpg's verdicts on a wrong passphrase
+_BAD_PASSPHRASE = ("bad session key", "bad passphrase")
+
+
+def _run_gpg(cmd, password=None, progress_callback=None):
+    """
+    Run a GPG command, passing password via stdin for security.
+
+    With a progress_callback, gpg's PROGRESS status lines are forwarded as
+    (bytes_done, bytes_total).
+    """
+    if progress_callback is None:
+        proc = subprocess.run(
+            cmd,
+            input=password,
+            capture_output=True,
+            text=True)
+        if proc.returncode != 0:
+            error_lines = (proc.stderr or proc.stdout or "").strip()
+            raise RuntimeError(
+                f"GPG failed (exit code {proc.returncode}).\n{error_lines}")
+        return
+
+    cmd = cmd[:1] + ["--status-fd", "2", "--enable-progress-filter"] + cmd[1:]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+        stderr=subprocess.PIPE, text=True)
+    try:
+        proc.stdin.write(password or "")
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    messages = []
+    for line in proc.stderr:
+        progress = parse_gpg_progress(line)
+        if progress:
+            progress_callback(*progress)
+        elif not line.startswith("[GNUPG:]"):
+            messages.append(line)
+    proc.wait()
     if proc.returncode != 0:
-        error_lines = (proc.stderr or proc.stdout or "").strip()
+        error_lines = "".join(messages).strip()
         raise RuntimeError(
             f"GPG failed (exit code {proc.returncode}).\n{error_lines}")
 
 
-def create_gpg_encrypted(items, output_path, password, single_archive=False):
+def _passphrase_pipe(password):
     """
-    Encrypt files using GPG symmetric AES-256.
+    Return the read end of a pipe preloaded with the passphrase.
 
-    Multiple files are tarred first, then encrypted -> output.tar.gpg
-    Single file is encrypted directly -> output.gpg
+    Used when gpg's stdin carries the payload. The passphrase never touches
+    argv or disk, and fits in the pipe buffer, so writing cannot block.
     """
-    gpg = _find_gpg()
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, password.encode("utf-8"))
+    finally:
+        os.close(write_fd)
+    return read_fd
 
-    if len(items) > 1 or single_archive:
-        # Tar first, then encrypt
-        tar_path = output_path + ".tar"
+
+def _collect(stream, sink):
+    """Read a subprocess stream to EOF on a helper thread."""
+    def run():
+        sink.append(stream.read())
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _encrypt_stream(gpg, output_path, password, produce):
+    """
+    Run gpg --symmetric while produce(stdin) writes the plaintext.
+
+    The plaintext only passes through a pipe; no copy of it hits disk.
+    """
+    pass_fd = _passphrase_pipe(password)
+    try:
+        proc = subprocess.Popen([
+            gpg,
+            "--batch", "--yes",
+            "--symmetric",
+            "--cipher-algo", "AES256",
+            "--passphrase-fd", str(pass_fd),
+            "--output", output_path,
+        ], stdin=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=(pass_fd,))
+    finally:
+        os.close(pass_fd)
+
+    stderr = []
+    reader = _collect(proc.stderr, stderr)
+    produce_error = None
+    try:
+        produce(proc.stdin)
+    except BrokenPipeError:
+        # gpg exited early; its own error message is more useful
+        pass
+    except Exception as e:
+        produce_error = e
+    finally:
         try:
-            with tarfile.open(tar_path, "w") as tar:
-                for item in items:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        if produce_error is not None:
+            proc.kill()
+        proc.wait()
+        reader.join()
+
+    if produce_error is not None or proc.returncode != 0:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    if produce_error is not None:
+        raise produce_error
+    if proc.returncode != 0:
+        error_lines = stderr[0].decode("utf-8", "replace").strip()
+        raise RuntimeError(
+            f"GPG failed (exit code {proc.returncode}).\n{error_lines}")
+
+
+def encrypt_bytes(data, output_path, password):
+    """Encrypt an in-memory payload to output_path with gpg --symmetric."""
+    _encrypt_stream(get_tool("gpg").path, output_path, password,
+                    lambda stdin: stdin.write(data))
+
+
+def decrypt_bytes(file_path, password):
+    """The decrypted contents of a small gpg file, held in memory."""
+    out = []
+    _decrypt_stream(get_tool("gpg").path, file_path, password,
+                    lambda stream: out.append(stream.read()))
+    return out[0]
+
+
+def _add_hashed(tar, path, arcname, manifest):
+    """tar.add(), hashing regular files into `manifest` as they stream."""
+    info = tar.gettarinfo(path, arcname)
+    if info is None:
+        # Sockets and other types tar cannot store
+        return
+    if info.isreg():
+        with open(path, "rb") as f:
+            reader = manifest.hashing_reader(f, arcname, os.fstat(f.fileno()))
+            tar.addfile(info, reader)
+            reader.finish()
+    elif info.isdir():
+        tar.addfile(info)
+        for name in sorted(os.listdir(path)):
+            _add_hashed(tar, os.path.join(path, name),
+                        os.path.join(arcname, name), manifest)
+    else:
+        tar.addfile(info)
+
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    info.mode = 0o600
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _stream_tar_to_gpg(gpg, items, output_path, password,
+                       progress_callback=None, manifest=None):
+    """Tar items straight into gpg's stdin; no plaintext .tar hits disk."""
+    reporter = Reporter(progress_callback,
+        inventory_size(items) if progress_callback else 0)
+
+    def produce(stdin):
+        with tarfile.open(fileobj=CountingWriter(stdin, reporter),
+                          mode="w|") as tar:
+            for item in items:
+                if manifest is None:
                     tar.add(item, arcname=os.path.basename(item))
+                else:
+                    _add_hashed(tar, item, os.path.basename(item), manifest)
+            if manifest is not None:
+                # Last member: the hashes are only known at the end
+                _add_bytes(tar, MANIFEST_NAME, manifest.to_bytes())
 
-            cmd = [
-                gpg,
-                "--batch", "--yes",
-                "--symmetric",
-                "--cipher-algo", "AES256",
-                "--passphrase-fd", "0",
-                "--output", output_path,
-                tar_path,
-            ]
-            _run_gpg(cmd, password=password)
-        finally:
-            if os.path.exists(tar_path):
-                os.remove(tar_path)
+    _encrypt_stream(gpg, output_path, password, produce)
+    reporter.finish()
+
+
+def _stream_file_to_gpg(gpg, path, output_path, password,
+                        progress_callback=None, manifest=None):
+    """Feed one file to gpg, hashing it on the way, plus a sidecar manifest."""
+    reporter = Reporter(progress_callback, os.path.getsize(path))
+    name, _ = _decrypted_name(output_path)
+
+    def produce(stdin):
+        with open(path, "rb") as f:
+            reader = manifest.hashing_reader(f, name, os.fstat(f.fileno()))
+            shutil.copyfileobj(reader, CountingWriter(stdin, reporter),
+                               1 << 20)
+            reader.finish()
+
+    _encrypt_stream(gpg, output_path, password, produce)
+    _encrypt_stream(gpg, sidecar_path(output_path), password,
+                    lambda stdin: stdin.write(manifest.to_bytes()))
+    reporter.finish()
+
+
+def create_gpg_encrypted(items, output_path, password, single_archive=False,
+                         progress_callback=None, manifest=None):
+    """
+    Encrypt files using GPG symmetric AES-256.
+
+    Multiple files are tarred and streamed into gpg -> output.tar.gpg
+    Single file is encrypted directly -> output.gpg
+
+    Args:
+        manifest (str): Hash algorithm for an integrity manifest (see
+            crypto.manifest), or None for none. Tarred inputs carry it as
+            the last member; a single file gets an encrypted sidecar.
+    """
+    gpg = get_tool("gpg").path
+    builder = ManifestBuilder(manifest) if manifest else None
+
+    if len(items) > 1 or single_archive:
+        _stream_tar_to_gpg(gpg, items, output_path, password,
+                           progress_callback, builder)
+    elif builder is not None:
+        _stream_file_to_gpg(gpg, items[0], output_path, password,
+                            progress_callback, builder)
     else:
         # Single file, encrypt directly
         cmd = [
@@ -68,71 +254,242 @@ def create_gpg_encrypted(items, output_path, password, single_archive=False):
             "--output", output_path,
             items[0],
         ]
-        _run_gpg(cmd, password=password)
+        _run_gpg(cmd, password=password, progress_callback=progress_callback)
 
 
-def extract_gpg_encrypted(file_path, output_dir, password, progress_callback=None):
+def _feed_file(path, stream, progress_callback=None, chunk_size=1 << 20):
     """
-    Decrypt a GPG-encrypted file.
-    Auto-detects and extracts tar archives.
+    Copy a file into a subprocess stdin on a helper thread.
+
+    Counting the ciphertext as it is fed gives real progress against the
+    encrypted file size, whatever gpg does with compression internally.
+
+    Returns:
+        tuple: (thread, errors list, Reporter)
     """
-    gpg = _find_gpg()
-    os.makedirs(output_dir, exist_ok=True)
+    reporter = Reporter(progress_callback, os.path.getsize(path))
+    errors = []
 
-    # Determine decrypted output name
+    def run():
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    stream.write(chunk)
+                    reporter.add(len(chunk))
+        except BrokenPipeError:
+            pass
+        except OSError as e:
+            errors.append(e)
+        finally:
+            try:
+                stream.close()
+            except BrokenPipeError:
+                pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, errors, reporter
+
+
+def _decrypt_stream(gpg, file_path, password, consume, progress_callback=None):
+    """
+    Run gpg --decrypt with ciphertext on stdin and hand its stdout to consume().
+
+    Plaintext is only ever held in a pipe buffer, never in a temporary file.
+    """
+    pass_fd = _passphrase_pipe(password)
+    try:
+        proc = subprocess.Popen([
+            gpg,
+            "--batch", "--yes",
+            "--decrypt",
+            "--passphrase-fd", str(pass_fd),
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, pass_fds=(pass_fd,))
+    finally:
+        os.close(pass_fd)
+
+    stderr = []
+    reader = _collect(proc.stderr, stderr)
+    feeder, feed_errors, reporter = _feed_file(
+        file_path, proc.stdin, progress_callback)
+    consume_error = None
+    try:
+        consume(proc.stdout)
+        # Drain anything left so gpg can finish and verify the MDC
+        while proc.stdout.read(1 << 20):
+            pass
+    except Exception as e:
+        consume_error = e
+        # Let gpg exit on its own if it is failing anyway (bad passphrase);
+        # otherwise it is blocked on a pipe nobody reads any more.
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    finally:
+        proc.stdout.close()
+        proc.wait()
+        feeder.join()
+        reader.join()
+
+    # gpg's own diagnosis (bad passphrase, corrupt data) wins over the
+    # secondary error it causes in the consumer.
+    if proc.returncode > 0 or (proc.returncode and consume_error is None):
+        error_lines = stderr[0].decode("utf-8", "replace").strip()
+        raise RuntimeError(
+            f"GPG failed (exit code {proc.returncode}).\n{error_lines}")
+    if consume_error is not None:
+        raise consume_error
+    if feed_errors:
+        raise feed_errors[0]
+    reporter.finish()
+
+
+def _untar_stream(stream, output_dir):
+    """
+    Extract members as they arrive from a non-seekable tar stream.
+
+    Returns:
+        dict: The integrity manifest member, read instead of extracted,
+        or None
+    """
+    # Reject absolute paths, traversal and device nodes where supported
+    kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+    manifest = None
+    with tarfile.open(fileobj=stream, mode="r|") as tar:
+        for member in tar:
+            if member.name == MANIFEST_NAME and member.isfile():
+                manifest = load_manifest(tar.extractfile(member).read())
+                continue
+            tar.extract(member, path=output_dir, **kwargs)
+    return manifest
+
+
+def _copy_stream(stream, output_path):
+    with open(output_path, "wb") as out:
+        shutil.copyfileobj(stream, out, 1 << 20)
+
+
+def _decrypted_name(file_path):
+    """(name of the decrypted output, whether it is a tar stream)."""
     base = os.path.basename(file_path)
     # Strip .gpg/.pgp/.asc extension
     for ext in (".tar.gpg", ".gpg", ".pgp", ".asc"):
         if base.lower().endswith(ext):
-            decrypted_name = base[:-len(ext)]
-            is_tar = ext == ".tar.gpg"
-            break
-    else:
-        decrypted_name = base + ".decrypted"
-        is_tar = False
+            return base[:-len(ext)], ext == ".tar.gpg"
+    return base + ".decrypted", False
 
-    if progress_callback:
-        progress_callback(10.0)
 
-    if is_tar:
-        # Decrypt to temp, then extract tar
-        with tempfile.NamedTemporaryFile(suffix=".tar", delete=False) as tmp:
-            tmp_path = tmp.name
+def extract_gpg_encrypted(file_path, output_dir, password, progress_callback=None):
+    """
+    Decrypt a GPG-encrypted file.
+    Auto-detects and extracts tar archives, streaming them member by member.
 
-        try:
-            cmd = [
-                gpg,
-                "--batch", "--yes",
-                "--decrypt",
-                "--passphrase-fd", "0",
-                "--output", tmp_path,
-                file_path,
-            ]
-            _run_gpg(cmd, password=password)
-
-            if progress_callback:
-                progress_callback(50.0)
-
-            with tarfile.open(tmp_path, "r") as tar:
-                tar.extractall(path=output_dir)
-
-            if progress_callback:
-                progress_callback(100.0)
-        finally:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+    Returns:
+        dict: The integrity manifest stored in the tar or in a sidecar
+        next to a single file, or None
+    """
+    gpg = get_tool("gpg").path
+    os.makedirs(output_dir, exist_ok=True)
+
+    decrypted_name, is_tar = _decrypted_name(file_path)
+    found = []
+
+    if is_tar:
+        consume = lambda stream: found.append(
+            _untar_stream(stream, output_dir))
     else:
-        # Decrypt directly to output
         decrypted_path = os.path.join(output_dir, decrypted_name)
-        cmd = [
+        consume = lambda stream: _copy_stream(stream, decrypted_path)
+
+    _decrypt_stream(gpg, file_path, password, consume, progress_callback)
+
+    sidecar = sidecar_path(file_path)
+    if not is_tar and os.path.isfile(sidecar):
+        _decrypt_stream(gpg, sidecar, password,
+            lambda stream: found.append(load_manifest(stream.read())))
+        # The sidecar describes the one file; follow a renamed .gpg
+        for entry in found[0]["files"][:1]:
+            entry["path"] = decrypted_name
+    return found[0] if found else None
+
+
+def verify_gpg_encrypted(file_path, password, progress_callback=None):
+    """
+    Decrypt into a hashing sink: nothing is written to disk.
+
+    gpg checks the MDC (or AEAD tag) of the whole message; each file's
+    plaintext is hashed on the way and, when the archive carries a
+    manifest, compared with it.
+
+    Raises:
+        RuntimeError: If gpg fails (wrong password, corrupt data)
+        IntegrityError: If the plaintext differs from the manifest
+    """
+    gpg = get_tool("gpg").path
+    decrypted_name, is_tar = _decrypted_name(file_path)
+    seen = {}
+    found = []
+
+    if is_tar:
+        def consume(stream):
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    data = tar.extractfile(member)
+                    if member.name == MANIFEST_NAME:
+                        found.append(load_manifest(data.read()))
+                    else:
+                        seen[member.name] = hash_stream(data)
+    else:
+        def consume(stream):
+            seen[decrypted_name] = hash_stream(stream)
+
+    _decrypt_stream(gpg, file_path, password, consume, progress_callback)
+
+    sidecar = sidecar_path(file_path)
+    if not is_tar and os.path.isfile(sidecar):
+        _decrypt_stream(gpg, sidecar, password,
+            lambda stream: found.append(load_manifest(stream.read())))
+        for entry in found[0]["files"][:1]:
+            entry["path"] = decrypted_name
+    if found:
+        problems = compare_hashes(found[0], seen)
+        if problems:
+            raise IntegrityError(problems)
+
+
+def check_gpg_password(file_path, password):
+    """
+    Cheaply tell whether a passphrase decrypts a file, before extracting.
+
+    Only the first PREFLIGHT_BYTES of ciphertext are given to gpg. The
+    session key is checked against the start of the encrypted packet, so
+    a wrong passphrase fails immediately, and a right one yields some
+    plaintext before gpg reaches the truncation.
+
+    Returns:
+        bool: False only if gpg rejects the passphrase
+    """
+    gpg = get_tool("gpg").path
+    with open(file_path, "rb") as f:
+        head = f.read(PREFLIGHT_BYTES)
+    pass_fd = _passphrase_pipe(password)
+    try:
+        result = subprocess.run([
             gpg,
             "--batch", "--yes",
             "--decrypt",
-            "--passphrase-fd", "0",
-            "--output", decrypted_path,
-            file_path,
-        ]
-        _run_gpg(cmd, password=password)
-
-        if progress_callback:
-            progress_callback(100.0)
+            "--passphrase-fd", str(pass_fd),
+        ], input=head, capture_output=True, pass_fds=(pass_fd,))
+    finally:
+        os.close(pass_fd)
+    if result.returncode == 0 or result.stdout:
+        return True
+    message = result.stderr.decode("utf-8", "replace").lower()
+    return not any(verdict in message for verdict in _BAD_PASSPHRASE)
@@ -0,0 +1,108 @@
+"""
+File inventory of the items selected for encryption.
+
+A single os.scandir walk that records every file and directory with its
+size and archive-relative path, so container sizing and copying can work
+from the same listing instead of re-walking the tree.
+"""
+
+import errno
+import os
+
+
+class Entry:
+    """One file or directory in the inventory."""
+
+    __slots__ = ("src", "relpath", "size", "is_dir", "children")
+
+    def __init__(self, src, relpath, size=0, is_dir=False):
+        self.src = src
+        self.relpath = relpath
+        self.size = size
+        self.is_dir = is_dir
+        self.children = []  # names of direct children (directories only)
+
+    @property
+    def name(self):
+        return os.path.basename(self.relpath)
+
+
+class Inventory:
+    """Flat listing of files and directories under the selected items."""
+
+    def __init__(self):
+        self.files = []
+        self.dirs = []
+        # Names placed directly in the archive/container root
+        self.top_level = []
+
+    @property
+    def total_bytes(self):
+        return sum(f.size for f in self.files)
+
+    @property
+    def file_count(self):
+        return len(self.files)
+
+
+def scan(items):
+    """
+    Build an Inventory for the given files and folders.
+
+    Each item lands at the root under its basename, matching how the
+    engines lay items out in archives and containers. Symlinks are followed
+    for files and directories, as shutil.copy and copytree do.
+
+    Raises:
+        OSError: If a directory cannot be listed, an entry cannot be
+            stat'ed (including dangling symlinks), or a symlink loops
+    """
+    inventory = Inventory()
+    for item in items:
+        item = item.rstrip(os.sep) or item
+        name = os.path.basename(item)
+        inventory.top_level.append(name)
+        if os.path.isdir(item):
+            _scan_dir(item, name, inventory)
+        elif os.path.isfile(item):
+            inventory.files.append(
+                Entry(item, name, os.path.getsize(item)))
+    return inventory
+
+
+def _scan_dir(path, relpath, inventory):
+    """
+    Walk one selected folder.
+
+    Symlinked directories are followed, as shutil.copytree does; a link
+    back to one of its own ancestors raises ELOOP instead of recursing
+    forever. Unreadable directories and entries raise too, so callers
+    never work from a listing that silently left files out.
+    """
+    entry = Entry(path, relpath, is_dir=True)
+    inventory.dirs.append(entry)
+    st = os.stat(path)
+    stack = [(entry, frozenset([(st.st_dev, st.st_ino)]))]
+    while stack:
+        current, ancestors = stack.pop()
+        with os.scandir(current.src) as it:
+            for child in it:
+                rel = os.path.join(current.relpath, child.name)
+                if child.is_dir():
+                    st = child.stat()
+                    key = (st.st_dev, st.st_ino)
+                    if key in ancestors:
+                        raise OSError(errno.ELOOP,
+                                      "Symbolic link loop", child.path)
+                    sub = Entry(child.path, rel, is_dir=True)
+                    inventory.dirs.append(sub)
+                    stack.append((sub, ancestors | {key}))
+                elif child.is_file():
+                    inventory.files.append(
+                        Entry(child.path, rel, child.stat().st_size))
+                else:
+                    # Raises for a dangling symlink; sockets, FIFOs and
+                    # devices are left out, as archivers do
+                    child.stat()
+                    continue
+                current.children.append(child.name)
@@ -0,0 +1,311 @@
+"""
+Plaintext integrity manifests.
+
+A manifest lists every file put into an archive or container with its
+archive-relative path, size, mtime and digest, so a restore can be proven
+bit-exact. It is computed while the engines read their inputs: the GPG tar
+stream and the VeraCrypt copy hash each file as it passes through, on the
+threads already doing the work. 7-Zip reads its inputs itself, so for ZIP
+and 7z archives the files are hashed on a thread pool just before 7z runs.
+
+The manifest is stored encrypted with the data: as MANIFEST_NAME at the
+root of archives and containers, or for a single GPG-encrypted file as a
+GPG-encrypted sidecar (sidecar_path). After extraction, verify_manifest()
+rehashes the extracted files in parallel. mtimes are recorded but not
+compared, since not every format restores them.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+# Stored at the root of archives and containers
+MANIFEST_NAME = ".diophantine-manifest.json"
+
+MANIFEST_VERSION = 1
+
+ALGORITHMS = ("sha256", "blake2b")
+DEFAULT_ALGORITHM = "sha256"
+
+# Hashing is I/O bound and hashlib releases the GIL on large updates
+DEFAULT_HASH_WORKERS = 4
+
+CHUNK_SIZE = 1024 * 1024
+
+# Suffix of the encrypted manifest written next to a single .gpg file
+SIDECAR_SUFFIX = ".manifest"
+
+
+class IntegrityError(RuntimeError):
+    """Extracted files do not match the archive's manifest."""
+
+    def __init__(self, problems):
+        self.problems = problems
+        shown = "\n".join(f"  {path}: {problem}"
+                          for path, problem in problems[:10])
+        more = len(problems) - 10
+        if more > 0:
+            shown += f"\n  ... and {more} more"
+        super().__init__(
+            f"{len(problems)} file(s) differ from the manifest:\n{shown}")
+
+
+def sidecar_path(encrypted_path):
+    """Where the manifest of a single GPG-encrypted file is kept."""
+    return encrypted_path + SIDECAR_SUFFIX
+
+
+def new_hash(algorithm=DEFAULT_ALGORITHM):
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unsupported manifest hash: {algorithm}")
+    return hashlib.new(algorithm)
+
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM, reporter=None):
+    """Hex digest of a file, read in CHUNK_SIZE pieces."""
+    digest = new_hash(algorithm)
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+            if reporter is not None:
+                reporter.add(n)
+    return digest.hexdigest()
+
+
+def hash_stream(stream):
+    """
+    (size, {algorithm: hex digest}) of a stream read to EOF.
+
+    Every supported algorithm is computed, for streams whose manifest
+    only arrives after the data (the last member of a GPG tar).
+    """
+    digests = [new_hash(a) for a in ALGORITHMS]
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        for digest in digests:
+            digest.update(chunk)
+    return size, {a: d.hexdigest() for a, d in zip(ALGORITHMS, digests)}
+
+
+class ManifestBuilder:
+    """
+    Collects file entries from the threads reading the inputs.
+
+    Engines call add() with the digest of each file as they finish reading
+    it; entries may arrive in any order and from several threads.
+    """
+
+    def __init__(self, algorithm=DEFAULT_ALGORITHM):
+        new_hash(algorithm)
+        self.algorithm = algorithm
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def new_hash(self):
+        return new_hash(self.algorithm)
+
+    def add(self, relpath, size, mtime, digest):
+        """
+        Args:
+            relpath (str): Path inside the archive, with os.sep separators
+            digest (str): Hex digest of the file contents
+        """
+        entry = {"path": relpath.replace(os.sep, "/"), "size": size,
+                 "mtime": mtime, self.algorithm: digest}
+        with self._lock:
+            self._entries[entry["path"]] = entry
+
+    def add_file(self, src, relpath, reporter=None):
+        """Hash a file that is not otherwise read, and add it."""
+        st = os.stat(src)
+        self.add(relpath, st.st_size, st.st_mtime,
+                 hash_file(src, self.algorithm, reporter))
+
+    def hashing_reader(self, raw, relpath, st):
+        """Wrap an open file; call finish() on it once it has been read."""
+        return _HashingReader(self, raw, relpath, st)
+
+    def manifest(self):
+        with self._lock:
+            files = [self._entries[p] for p in sorted(self._entries)]
+        return {"version": MANIFEST_VERSION, "algorithm": self.algorithm,
+                "files": files}
+
+    def to_bytes(self):
+        return dumps(self.manifest())
+
+
+class _HashingReader:
+    """File-like wrapper hashing everything read through it."""
+
+    def __init__(self, builder, raw, relpath, st):
+        self.builder = builder
+        self.raw = raw
+        self.relpath = relpath
+        self.st = st
+        self.digest = builder.new_hash()
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.digest.update(data)
+        self.count += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n = self.raw.readinto(buffer)
+        if n:
+            self.digest.update(memoryview(buffer)[:n])
+            self.count += n
+        return n
+
+    def close(self):
+        self.raw.close()
+
+    def finish(self):
+        """Record the file's entry with everything read so far."""
+        self.builder.add(self.relpath, self.count, self.st.st_mtime,
+                         self.digest.hexdigest())
+
+
+def build_manifest(files, algorithm=DEFAULT_ALGORITHM, max_workers=None,
+                   reporter=None):
+    """
+    Hash files on a thread pool.
+
+    Args:
+        files (list): (source path, archive-relative path) pairs
+        reporter (Reporter): Counts the bytes read
+
+    Returns:
+        ManifestBuilder
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    builder = ManifestBuilder(algorithm)
+    files = list(files)
+    workers = max(1, min(max_workers or DEFAULT_HASH_WORKERS, len(files) or 1))
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix="diophantine-hash") as pool:
+        for future in [pool.submit(builder.add_file, src, rel, reporter)
+                       for src, rel in files]:
+            future.result()
+    return builder
+
+
+def build_for_items(items, algorithm=DEFAULT_ALGORITHM, max_workers=None,
+                    reporter=None):
+    """Hash every file under the items, as laid out in an archive."""
+    from crypto.inventory import scan
+
+    return build_manifest(((f.src, f.relpath) for f in scan(items).files),
+                          algorithm, max_workers, reporter)
+
+
+def dumps(manifest):
+    return json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8")
+
+
+def loads(data):
+    """
+    Raises:
+        ValueError: If the data is not a manifest this version understands
+    """
+    manifest = json.loads(data)
+    if not isinstance(manifest, dict) or "files" not in manifest \
+            or manifest.get("algorithm") not in ALGORITHMS:
+        raise ValueError("Not a Diophantine manifest")
+    if manifest.get("version", 0) > MANIFEST_VERSION:
+        raise ValueError(
+            f"Manifest version {manifest['version']} is newer than this "
+            f"release supports")
+    return manifest
+
+
+def read_manifest(path):
+    """The manifest stored at `path`, or None if there is none."""
+    try:
+        with open(path, "rb") as f:
+            return loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def check_manifest(manifest, root, max_workers=None, reporter=None):
+    """
+    Rehash extracted files against a manifest, in parallel.
+
+    Returns:
+        list: (path, problem) pairs; empty when everything matches
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    algorithm = manifest["algorithm"]
+    entries = manifest["files"]
+
+    def check(entry):
+        parts = entry["path"].split("/")
+        if not all(parts) or ".." in parts:
+            return entry["path"], "unsafe path in manifest"
+        path = os.path.join(root, *parts)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return entry["path"], "missing"
+        if size != entry["size"]:
+            return entry["path"], f"size {size}, expected {entry['size']}"
+        if hash_file(path, algorithm, reporter) != entry[algorithm]:
+            return entry["path"], f"{algorithm} mismatch"
+        return None
+
+    workers = max(1, min(max_workers or DEFAULT_HASH_WORKERS,
+                         len(entries) or 1))
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix="diophantine-verify") as pool:
+        results = list(pool.map(check, entries))
+    return [r for r in results if r is not None]
+
+
+def verify_manifest(manifest, root, max_workers=None, reporter=None):
+    """
+    Raises:
+        IntegrityError: If any listed file is missing or differs
+    """
+    problems = check_manifest(manifest, root, max_workers, reporter)
+    if problems:
+        raise IntegrityError(problems)
+
+
+def compare_hashes(manifest, seen):
+    """
+    Check streamed files against a manifest.
+
+    Args:
+        seen (dict): path -> (size, {algorithm: hex digest}), from
+            hash_stream()
+
+    Returns:
+        list: (path, problem) pairs; empty when everything matches
+    """
+    algorithm = manifest["algorithm"]
+    problems = []
+    for entry in manifest["files"]:
+        found = seen.get(entry["path"])
+        if found is None:
+            problems.append((entry["path"], "missing"))
+        elif found[0] != entry["size"]:
+            problems.append((entry["path"],
+                             f"size {found[0]}, expected {entry['size']}"))
+        elif found[1][algorithm] != entry[algorithm]:
+            problems.append((entry["path"], f"{algorithm} mismatch"))
+    return problems
@@ -0,0 +1,250 @@
+"""
+Mounted-container session cache.
+
+Mounting a VeraCrypt container runs the full header key derivation
+(PBKDF2-SHA512 with the PIM iteration count), which dominates the cost of
+small extractions. MountManager keeps containers mounted between
+operations, keyed by container path, and hands the existing mount back to
+later extract/browse calls that present the same password. Sessions that
+nobody is using are dismounted after an idle TTL.
+
+The password itself is never stored: each session keeps an HMAC of it
+under a random per-process key, which is enough to check that a later
+caller knows the same password without making the cache a password store.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# hmac/hashlib, tempfile/shutil and the VeraCrypt engine are imported where
+# they are used: the window creates a MountManager at startup, long before
+# (if ever) a container is mounted.
+
+# Idle seconds before an unused session is dismounted
+DEFAULT_MOUNT_TTL = 300
+
+# How often the reaper looks for expired sessions (seconds)
+REAP_INTERVAL = 15
+
+
+class MountSession:
+    """One mounted container."""
+
+    def __init__(self, container_path, mount_dir, fingerprint, slot=None,
+                 owns_dir=True, pinned=False):
+        self.container_path = container_path
+        self.mount_dir = mount_dir
+        self.slot = slot
+        self.mounted_at = time.time()
+        self.last_used = time.monotonic()
+        # Mount-only sessions stay until dismounted explicitly
+        self.pinned = pinned
+        self.users = 0
+        self._fingerprint = fingerprint
+        # Temporary mount points are removed again on dismount
+        self._owns_dir = owns_dir
+
+    def idle_for(self, now=None):
+        return (now if now is not None else time.monotonic()) - self.last_used
+
+
+class MountManager:
+    """
+    Registry of mounted containers: path -> mount point, slot, timestamps.
+
+    Thread-safe; JobEngine workers acquire and release sessions while the
+    Tk thread lists and dismounts them.
+    """
+
+    def __init__(self, ttl=DEFAULT_MOUNT_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        # Serializes mount/dismount of the same container
+        self._path_locks = {}
+        self._key = os.urandom(32)
+        self._stop = threading.Event()
+        self._reaper = None
+
+    @staticmethod
+    def _key_for(container_path):
+        return os.path.realpath(container_path)
+
+    def _fingerprint(self, password):
+        import hashlib
+        import hmac
+
+        return hmac.new(self._key, password.encode("utf-8"),
+                        hashlib.sha256).digest()
+
+    def _path_lock(self, key):
+        with self._lock:
+            return self._path_locks.setdefault(key, threading.Lock())
+
+    def sessions(self):
+        """Snapshot of the current sessions."""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def get(self, container_path):
+        with self._lock:
+            return self._sessions.get(self._key_for(container_path))
+
+    def acquire(self, container_path, password, mount_dir=None, pinned=False):
+        """
+        Return a mounted session for the container, mounting if needed.
+
+        The caller must release() it when done. An existing mount is only
+        reused for the same password; a different password raises
+        PermissionError rather than silently granting access.
+
+        Args:
+            mount_dir (str): Where to mount; a temporary directory when
+                None. Ignored if the container is already mounted.
+            pinned (bool): Exempt the session from idle expiry (mount-only
+                browsing); an existing session can be pinned, not unpinned.
+        """
+        import hmac
+        import tempfile
+        from crypto.veracrypt_engine import (
+            mount_veracrypt_container, mounted_slot
+        )
+
+        key = self._key_for(container_path)
+        fingerprint = self._fingerprint(password)
+        with self._path_lock(key):
+            with self._lock:
+                session = self._sessions.get(key)
+            if session is not None and not os.path.ismount(session.mount_dir):
+                # Dismounted behind our back (e.g. from the VeraCrypt GUI)
+                self._forget(session)
+                session = None
+
+            if session is not None:
+                if not hmac.compare_digest(session._fingerprint, fingerprint):
+                    raise PermissionError(
+                        "Container is already mounted with a different "
+                        "password.")
+            else:
+                owns_dir = mount_dir is None
+                if owns_dir:
+                    mount_dir = tempfile.mkdtemp(prefix="diophantine-mount-")
+                try:
+                    mount_veracrypt_container(container_path, mount_dir,
+                                              password)
+                except BaseException:
+                    if owns_dir:
+                        import shutil
+                        shutil.rmtree(mount_dir, ignore_errors=True)
+                    raise
+                session = MountSession(container_path, mount_dir,
+                    fingerprint, slot=mounted_slot(mount_dir),
+                    owns_dir=owns_dir)
+                with self._lock:
+                    self._sessions[key] = session
+                self._start_reaper()
+
+            with self._lock:
+                session.users += 1
+                session.pinned = session.pinned or pinned
+                session.last_used = time.monotonic()
+            return session
+
+    def release(self, session):
+        with self._lock:
+            session.users = max(session.users - 1, 0)
+            session.last_used = time.monotonic()
+
+    @contextmanager
+    def session(self, container_path, password, mount_dir=None):
+        """Context manager yielding the mount directory."""
+        session = self.acquire(container_path, password, mount_dir)
+        try:
+            yield session.mount_dir
+        finally:
+            self.release(session)
+
+    def dismount(self, session, force=False):
+        """
+        Dismount one session.
+
+        Raises RuntimeError while a job is still using it (unless force),
+        and CalledProcessError if VeraCrypt refuses (e.g. files open).
+        """
+        with self._path_lock(self._key_for(session.container_path)):
+            if session.users and not force:
+                raise RuntimeError(
+                    f"{os.path.basename(session.container_path)} is in use "
+                    "by a running job.")
+            self._unmount(session)
+
+    def dismount_all(self, force=False):
+        """
+        Dismount every session, including pinned ones.
+
+        Returns:
+            list: (session, error) pairs for sessions that failed
+        """
+        failures = []
+        for session in self.sessions():
+            try:
+                self.dismount(session, force)
+            except Exception as e:
+                failures.append((session, e))
+        return failures
+
+    def reap(self, now=None):
+        """Dismount unpinned sessions idle for longer than the TTL."""
+        for session in self.sessions():
+            if not self._expired(session, now):
+                continue
+            with self._path_lock(self._key_for(session.container_path)):
+                # Re-check: a job may have picked it up in the meantime
+                if not self._expired(session, now):
+                    continue
+                try:
+                    self._unmount(session)
+                except Exception:
+                    # Busy (a shell sitting in it); try again next round
+                    pass
+
+    def close(self):
+        """Stop the reaper and dismount everything."""
+        self._stop.set()
+        return self.dismount_all(force=True)
+
+    def _expired(self, session, now=None):
+        with self._lock:
+            return (not session.pinned and session.users == 0
+                    and session.idle_for(now) >= self.ttl)
+
+    def _unmount(self, session):
+        from crypto.veracrypt_engine import unmount_veracrypt_container
+
+        if os.path.ismount(session.mount_dir):
+            unmount_veracrypt_container(session.mount_dir)
+        self._forget(session)
+
+    def _forget(self, session):
+        with self._lock:
+            key = self._key_for(session.container_path)
+            if self._sessions.get(key) is session:
+                del self._sessions[key]
+        # Never rmtree a live mount: that would delete the container contents
+        if session._owns_dir and not os.path.ismount(session.mount_dir):
+            import shutil
+            shutil.rmtree(session.mount_dir, ignore_errors=True)
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None or self._stop.is_set():
+                return
+            self._reaper = threading.Thread(target=self._reap_loop,
+                name="diophantine-mount-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop.wait(REAP_INTERVAL):
+            self.reap()
@@ -0,0 +1,416 @@
+"""
+Batch operations shared by the Tk tabs and the command-line interface.
+
+Turns a selection of paths plus options into utils.jobs Tasks that call
+the engines. Nothing here touches Tk, so the CLI can import it on a
+machine without a display.
+"""
+
+import importlib
+import os
+import threading
+
+from utils.jobs import Task
+from utils.naming import original_name, numeric_name, chronos_name
+
+# Engines are imported on first use: the window and the CLI should not pay
+# for tarfile, subprocess plumbing and every engine before they need one.
+
+METHODS = ("zip", "7z", "gpg", "veracrypt", "dedup")
+
+NAMING_SCHEMES = ("original", "numeric", "chronos")
+
+# Extension map for each encryption method
+EXT_MAP = {
+    "zip": ".zip",
+    "7z": ".7z",
+    "gpg": ".tar.gpg",
+    "veracrypt": ".hc",
+    "dedup": "",
+}
+
+# Extension-to-type mapping for auto-detection
+FILE_TYPE_MAP = {
+    '.zip': 'zip',
+    '.hc': 'veracrypt',
+    '.tc': 'veracrypt',
+    '.7z': '7z',
+    '.gpg': 'gpg',
+    '.pgp': 'gpg',
+    '.asc': 'gpg',
+}
+
+# Engine entry point per effective type, as (module, function)
+EXTRACTORS = {
+    'zip': ('crypto.zip_engine', 'extract_encrypted_zip'),
+    '7z': ('crypto.sevenz_engine', 'extract_encrypted_7z'),
+    'gpg': ('crypto.gpg_engine', 'extract_gpg_encrypted'),
+    'veracrypt': ('crypto.veracrypt_engine', 'extract_veracrypt_container'),
+    'dedup': ('crypto.dedup_engine', 'restore_snapshot'),
+}
+
+# Checks that read an archive without writing its contents anywhere
+VERIFIERS = {
+    'zip': ('crypto.zip_engine', 'verify_encrypted_zip'),
+    '7z': ('crypto.sevenz_engine', 'verify_encrypted_7z'),
+    'gpg': ('crypto.gpg_engine', 'verify_gpg_encrypted'),
+    'veracrypt': ('crypto.veracrypt_engine', 'verify_veracrypt_container'),
+    'dedup': ('crypto.dedup_engine', 'verify_store'),
+}
+
+# In-place update of an existing archive; other formats are rebuilt
+UPDATERS = {
+    'zip': ('crypto.zip_engine', 'update_encrypted_zip'),
+    '7z': ('crypto.sevenz_engine', 'update_encrypted_7z'),
+}
+
+# Cheap "does this password open it?" checks, run before the expensive
+# work. VeraCrypt has none: a failed mount is already the cheapest test.
+PASSWORD_CHECKS = {
+    'zip': ('crypto.zip_engine', 'check_encrypted_zip_password'),
+    '7z': ('crypto.sevenz_engine', 'check_encrypted_7z_password'),
+    'gpg': ('crypto.gpg_engine', 'check_gpg_password'),
+    'dedup': ('crypto.dedup_engine', 'check_store_password'),
+}
+
+# Concurrent extractions allowed per engine in one batch (None = worker
+# count from preferences). VeraCrypt mounts must stay serialized.
+DECRYPT_CONCURRENCY = {
+    'zip': None,
+    '7z': None,
+    'gpg': None,
+    'veracrypt': 1,
+    'dedup': None,
+}
+
+
+def detect_type(path):
+    """Detect file type from extension; folders may be dedup stores."""
+    if os.path.isdir(path):
+        from crypto.dedup_engine import is_store
+        return "dedup" if is_store(path) else "unknown"
+    ext = os.path.splitext(path)[1].lower()
+    # Handle .tar.gpg
+    if path.lower().endswith(".tar.gpg"):
+        return "gpg"
+    return FILE_TYPE_MAP.get(ext, "unknown")
+
+
+def extractor(file_type):
+    """Return the extract function for a type, importing its engine."""
+    module, name = EXTRACTORS[file_type]
+    return getattr(importlib.import_module(module), name)
+
+
+def verifier(file_type):
+    """Return the verify function for a type, importing its engine."""
+    module, name = VERIFIERS[file_type]
+    return getattr(importlib.import_module(module), name)
+
+
+def output_name(item, index, ext, scheme="original"):
+    if scheme == "numeric":
+        return numeric_name(index, ext=ext)
+    elif scheme == "chronos":
+        return chronos_name(index, ext=ext)
+    return original_name(item, ext=ext)
+
+
+def container_size_mb(items, filesystem="FAT", spare_space=False,
+                      manifest=False):
+    """Size create_veracrypt_container allocates, in MB; see veracrypt_sizing."""
+    from crypto.veracrypt_engine import SPARE_SPACE_FACTOR
+    from crypto.veracrypt_sizing import required_container_mb
+
+    size_mb = required_container_mb(items, filesystem, manifest)
+    if spare_space:
+        size_mb *= SPARE_SPACE_FACTOR
+    return size_mb
+
+
+def build_encrypt_tasks(items, output_dir, password, method="zip",
+                        single_archive=False, naming_scheme="original",
+                        veracrypt_options=None, manifest=None,
+                        single_name=None):
+    """
+    Turn a selection into encryption tasks, one per output file.
+
+    Args:
+        veracrypt_options (dict): filesystem, quick_format and spare_space
+        manifest (str): Hash algorithm for an integrity manifest in each
+            output (see crypto.manifest), or None for none
+        single_name (str): File name of the output when everything goes
+            into one archive (default "diophantine" plus the extension),
+            or of the store folder for "dedup"
+
+    Raises:
+        ValueError: If the items would not fit a container, or separate
+            archives would collide on the same name
+    """
+    from crypto.progress import inventory_size
+
+    items = list(items)
+    single = single_archive
+
+    if method == "veracrypt":
+        from crypto.veracrypt_engine import create_veracrypt_container
+
+        options = {"filesystem": "FAT", "quick_format": False,
+                   "spare_space": False}
+        options.update(veracrypt_options or {})
+        out = os.path.join(output_dir, single_name or "diophantine.hc")
+        size_mb = container_size_mb(items, options["filesystem"],
+                                    options["spare_space"], bool(manifest))
+        return [Task(os.path.basename(out), lambda progress:
+            create_veracrypt_container(items, out, password,
+                size_mb=size_mb, progress_callback=progress,
+                manifest=manifest, **options))]
+
+    if method == "dedup":
+        from crypto.dedup_engine import backup
+
+        # Always one store; a run adds a snapshot to an existing one
+        out = os.path.join(output_dir, single_name or "diophantine-store")
+        return [Task(os.path.basename(out), lambda progress:
+            backup(items, out, password, progress_callback=progress),
+            weight=inventory_size(items))]
+
+    if method == "gpg":
+        from crypto.gpg_engine import create_gpg_encrypted
+
+        if single or len(items) > 1:
+            out = os.path.join(output_dir,
+                               single_name or "diophantine.tar.gpg")
+            return [Task(os.path.basename(out), lambda progress:
+                create_gpg_encrypted(items, out, password,
+                    single_archive=True, progress_callback=progress,
+                    manifest=manifest))]
+        ext = ".gpg"
+
+        def create(item_list, out, progress):
+            create_gpg_encrypted(item_list, out, password,
+                single_archive=False, progress_callback=progress,
+                manifest=manifest)
+    elif method == "7z":
+        from crypto.sevenz_engine import create_encrypted_7z
+
+        if single:
+            out = os.path.join(output_dir, single_name or "diophantine.7z")
+            return [Task(os.path.basename(out), lambda progress:
+                create_encrypted_7z(items, out, password,
+                    progress_callback=progress, manifest=manifest))]
+        ext = EXT_MAP["7z"]
+
+        def create(item_list, out, progress):
+            create_encrypted_7z(item_list, out, password,
+                progress_callback=progress, manifest=manifest)
+    else:
+        from crypto.zip_engine import create_encrypted_zip
+
+        if single:
+            out = os.path.join(output_dir, single_name or "diophantine.zip")
+            return [Task(os.path.basename(out), lambda progress:
+                create_encrypted_zip(items, out, password,
+                    single_archive=True, progress_callback=progress,
+                    manifest=manifest))]
+        ext = EXT_MAP["zip"]
+
+        def create(item_list, out, progress):
+            create_encrypted_zip(item_list, out, password,
+                single_archive=False, progress_callback=progress,
+                manifest=manifest)
+
+    # Names are fixed up front so parallel runs produce the same outputs
+    names = [output_name(item, i, ext, naming_scheme)
+             for i, item in enumerate(items, start=1)]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(
+            "These items would produce the same archive name:\n"
+            + "\n".join(f"  {n}" for n in duplicates)
+            + "\n\nUse the Numeric or Chronological naming scheme.")
+
+    tasks = []
+    for item, name in zip(items, names):
+        out = os.path.join(output_dir, name)
+        tasks.append(Task(name,
+            lambda progress, item=item, out=out:
+                create([item], out, progress),
+            weight=inventory_size([item])))
+    return tasks
+
+
+def select_password(file_path, file_type, candidates):
+    """
+    Pick the candidate secret that opens an encrypted file.
+
+    Args:
+        candidates (str | list): One password, or secrets to try in order
+            (see DecryptTab._resolve_password)
+
+    Returns:
+        str: The first candidate the format's pre-flight check accepts;
+        the first candidate if the format has no check
+
+    Raises:
+        RuntimeError: If every candidate is rejected
+    """
+    if isinstance(candidates, str):
+        candidates = [candidates]
+    if file_type not in PASSWORD_CHECKS:
+        return candidates[0]
+    module, name = PASSWORD_CHECKS[file_type]
+    check = getattr(importlib.import_module(module), name)
+    for password in candidates:
+        if check(file_path, password):
+            return password
+    raise RuntimeError("Wrong password" if len(candidates) == 1 else
+                       f"Wrong password (none of {len(candidates)} "
+                       f"candidate secrets opens the file)")
+
+
+def decrypt_task(file_path, output_dir, password, file_type=None,
+                 sessions=None, verify=True):
+    """
+    Build the task extracting one encrypted file.
+
+    The password is checked cheaply before anything is extracted; see
+    select_password().
+
+    Args:
+        password (str | list): Password, or candidate secrets in order
+        file_type (str): Engine to use; detected from the name if None
+        sessions (MountManager): Keeps VeraCrypt containers mounted
+            between runs; see crypto.mount_sessions
+        verify (bool): Rehash the extracted files against the archive's
+            integrity manifest, if it has one; a mismatch fails the task
+    """
+    effective_type = file_type or detect_type(file_path)
+    options = ({'sessions': sessions}
+               if effective_type == 'veracrypt' and sessions else {})
+
+    def run(progress):
+        if effective_type not in EXTRACTORS:
+            raise ValueError("Unknown file type")
+        extract = extractor(effective_type)
+        chosen = select_password(file_path, effective_type, password)
+        manifest = extract(file_path, output_dir, chosen,
+            progress_callback=progress, **options)
+        if verify and manifest:
+            from crypto.manifest import verify_manifest
+            verify_manifest(manifest, output_dir)
+
+    return Task(os.path.basename(file_path), run,
+        weight=(os.path.getsize(file_path)
+                if os.path.isfile(file_path) else 1),
+        group=effective_type)
+
+
+def decrypt_group_limits(workers):
+    """Per-engine caps for a decrypt batch with `workers` overall."""
+    return {t: (cap or workers) for t, cap in DECRYPT_CONCURRENCY.items()}
+
+
+def verify_task(file_path, password, file_type=None, sessions=None):
+    """
+    Build the task checking one encrypted file without extracting it.
+
+    zip/7z run `7z t`, which checks each entry's stored CRC only; the
+    integrity manifest is not read. gpg decrypts into a hashing sink and
+    VeraCrypt containers are mounted read-only and read in place; both
+    are checked against the integrity manifest when there is one, and
+    dedup stores check every chunk against its id. `password` may be a
+    list of candidates, as for decrypt_task().
+    """
+    effective_type = file_type or detect_type(file_path)
+    options = ({'sessions': sessions}
+               if effective_type == 'veracrypt' and sessions else {})
+
+    def run(progress):
+        if effective_type not in VERIFIERS:
+            raise ValueError("Unknown file type")
+        chosen = select_password(file_path, effective_type, password)
+        verifier(effective_type)(file_path, chosen,
+            progress_callback=progress, **options)
+
+    return Task(os.path.basename(file_path), run,
+        weight=(os.path.getsize(file_path)
+                if os.path.isfile(file_path) else 1),
+        group=effective_type)
+
+
+def update_task(archive_path, items, password, delete=(), prune=False,
+                file_type=None):
+    """
+    Build the task updating an existing 7z/ZIP archive in place: new and
+    changed files under the items are added, and `delete` (plus, with
+    `prune`, entries no longer on disk) removed; see
+    sevenz_engine.update_archive.
+
+    Raises:
+        ValueError: If the archive is not a 7z or ZIP archive
+    """
+    effective_type = file_type or detect_type(archive_path)
+    if effective_type not in UPDATERS:
+        raise ValueError(
+            f"{os.path.basename(archive_path)}: only 7z and ZIP archives "
+            f"can be updated in place.")
+    from crypto.progress import inventory_size
+
+    module, name = UPDATERS[effective_type]
+    items = list(items)
+    delete = list(delete)
+
+    def run(progress):
+        update = getattr(importlib.import_module(module), name)
+        update(archive_path, items, password, delete=delete, prune=prune,
+               progress_callback=progress)
+
+    return Task(os.path.basename(archive_path), run,
+        weight=max(inventory_size(items), 1), group=effective_type)
+
+
+def encrypt_then_verify(tasks, output_dir, password, workers=1):
+    """
+    Follow every encryption task with a check of the archive it writes.
+
+    Encryption and verification run as two concurrency groups, so archive
+    N is tested while archive N+1 is still being created. A verify task
+    waits for its own archive only.
+
+    Args:
+        tasks (list): From build_encrypt_tasks(); their labels are the
+            output file names
+
+    Returns:
+        tuple: (tasks, group_limits) to submit as one job
+    """
+    verify_tasks = []
+    for task in tasks:
+        done = threading.Event()
+        created = []
+        create = task.run
+
+        def run(progress, create=create, done=done, created=created):
+            try:
+                create(progress)
+                created.append(True)
+            finally:
+                done.set()
+
+        def check(progress, task=task, done=done, created=created):
+            # A skipped (cancelled) task never runs; its status says so
+            while not done.wait(0.1) and task.status is None:
+                pass
+            if not created:
+                raise RuntimeError("Not verified: the archive was not "
+                                   "created")
+            verify_task(os.path.join(output_dir, task.label),
+                        password).run(progress)
+
+        task.run = run
+        task.group = "encrypt"
+        verify_tasks.append(Task(f"{task.label} (verify)", check,
+                                 weight=task.weight, group="verify"))
+    return (list(tasks) + verify_tasks,
+            {"encrypt": workers, "verify": workers})
@@ -0,0 +1,206 @@
+"""
+Shared progress protocol for the archive engines.
+
+Every create_*/extract_* function accepts progress_callback(bytes_done,
+bytes_total). The helpers here translate each tool's native reporting into
+that form: 7z's -bsp1 percentages (redrawn with backspaces and carriage
+returns, not newlines), gpg's --status-fd PROGRESS lines, and byte counting
+for tar streams that pass through Python.
+"""
+
+import os
+import re
+import subprocess
+import threading
+
+_PERCENT_RE = re.compile(rb"(\d{1,3})%")
+
+# Units gpg may append to PROGRESS status lines
+_GPG_UNITS = {
+    "B": 1,
+    "KiB": 1 << 10,
+    "MiB": 1 << 20,
+    "GiB": 1 << 30,
+    "TiB": 1 << 40,
+}
+
+# 7z switches: progress to stdout, regular messages off, errors to stderr
+SEVENZ_PROGRESS_SWITCHES = ["-bsp1", "-bso0", "-bse2"]
+
+
+def inventory_size(items):
+    """Total bytes of regular files under the given files/folders."""
+    total = 0
+    for item in items:
+        if os.path.isfile(item):
+            total += os.path.getsize(item)
+        elif os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                for f in filenames:
+                    path = os.path.join(dirpath, f)
+                    if os.path.isfile(path):
+                        total += os.path.getsize(path)
+    return total
+
+
+class Reporter:
+    """
+    Adapts a byte count to progress_callback(bytes_done, bytes_total).
+
+    Reports are clamped to the total (tar headers and archive overhead can
+    push raw counts slightly past it) and only forwarded when they move by
+    at least `step` bytes, so fast streams do not flood the UI.
+    """
+
+    def __init__(self, callback, total, steps=200):
+        self.callback = callback
+        self.total = max(int(total), 0)
+        self.done = 0
+        self._count = 0
+        self._step = max(self.total // steps, 1)
+        self._last = -1
+        self._lock = threading.Lock()
+
+    def set(self, done):
+        if not self.callback:
+            return
+        with self._lock:
+            done = min(int(done), self.total) if self.total else int(done)
+            # Concurrent adders may arrive out of order; never go backwards
+            self.done = max(self.done, done)
+            if self.done - self._last < self._step and self.done != self.total:
+                return
+            self._last = self.done
+        self.callback(self.done, self.total)
+
+    def add(self, count):
+        """Add to the running count; safe to call from several threads."""
+        with self._lock:
+            self._count += count
+            done = self._count
+        self.set(done)
+
+    def percent(self, pct):
+        self.set(self.total * pct / 100)
+
+    def finish(self):
+        if self.callback:
+            self.callback(self.total, self.total)
+
+
+class CountingWriter:
+    """File-like wrapper that reports every byte written through it."""
+
+    def __init__(self, raw, reporter):
+        self.raw = raw
+        self.reporter = reporter
+
+    def write(self, data):
+        n = self.raw.write(data)
+        self.reporter.add(len(data))
+        return n
+
+    def flush(self):
+        self.raw.flush()
+
+    def close(self):
+        self.raw.close()
+
+
+class CountingReader:
+    """File-like wrapper that reports every byte read through it."""
+
+    def __init__(self, raw, reporter):
+        self.raw = raw
+        self.reporter = reporter
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.reporter.add(len(data))
+        return data
+
+    def close(self):
+        self.raw.close()
+
+
+def iter_7z_percent(stream, chunk_size=256):
+    """
+    Yield percentages from 7z -bsp1 output.
+
+    7z redraws its progress line in place using backspaces and carriage
+    returns, so the stream is split on those as well as newlines.
+    """
+    buf = b""
+    while True:
+        chunk = stream.read1(chunk_size) if hasattr(stream, "read1") \
+            else stream.read(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+        parts = re.split(rb"[\r\n\b]+", buf)
+        buf = parts.pop()
+        for part in parts:
+            match = _PERCENT_RE.search(part)
+            if match:
+                yield min(int(match.group(1)), 100)
+    match = _PERCENT_RE.search(buf)
+    if match:
+        yield min(int(match.group(1)), 100)
+
+
+def parse_gpg_progress(line):
+    """
+    Parse a gpg --status-fd PROGRESS line.
+
+    Returns:
+        tuple: (bytes_done, bytes_total), or None if the line is not a
+        PROGRESS line or carries no total
+    """
+    parts = line.split()
+    if len(parts) < 6 or parts[0] != "[GNUPG:]" or parts[1] != "PROGRESS":
+        return None
+    try:
+        current, total = int(parts[4]), int(parts[5])
+    except ValueError:
+        return None
+    if total <= 0:
+        return None
+    unit = _GPG_UNITS.get(parts[6], 1) if len(parts) > 6 else 1
+    return current * unit, total * unit
+
+
+def run_7z(cmd, progress_callback=None, total=0, error_label="7-Zip failed",
+           progress_switches=True):
+    """
+    Run a 7z command, reporting -bsp1 progress as bytes of `total`.
+
+    Builds without the -bs* switches (progress_switches=False) only report
+    completion. Raises a sanitized RuntimeError on failure (the command
+    line, which carries the password, is never included).
+    """
+    if progress_callback is None or not progress_switches:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            error_lines = (result.stderr or result.stdout or "").strip()
+            raise RuntimeError(
+                f"{error_label} (exit code {result.returncode}).\n{error_lines}")
+        if progress_callback is not None:
+            progress_callback(total, total)
+        return
+
+    reporter = Reporter(progress_callback, total)
+    proc = subprocess.Popen(cmd + SEVENZ_PROGRESS_SWITCHES,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr = []
+    reader = threading.Thread(
+        target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+    reader.start()
+    for pct in iter_7z_percent(proc.stdout):
+        reporter.percent(pct)
+    proc.wait()
+    reader.join()
+    if proc.returncode != 0:
+        error_lines = stderr[0].decode("utf-8", "replace").strip()
+        raise RuntimeError(
+            f"{error_label} (exit code {proc.returncode}).\n{error_lines}")
+    reporter.finish()
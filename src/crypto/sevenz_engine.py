@@ -1,72 +1,385 @@
-import subprocess
+import os
 import shutil
+import subprocess
+import tempfile
 
+from crypto.manifest import (
+    MANIFEST_NAME, build_for_items, build_manifest, dumps, loads
+)
+from crypto.progress import inventory_size, run_7z
+from crypto.tools import get_tool
 
-def _find_7z():
-    for name in ("7z", "7zz"):
-        if shutil.which(name):
-            return name
-    raise FileNotFoundError(
-        "7-Zip is not installed.\n\n"
-        "Install via Homebrew:  brew install p7zip")
+# Keeps the manifest out of a full extraction; only the archive root
+EXCLUDE_MANIFEST = f"-xr-!{MANIFEST_NAME}"
 
 
-def _run_7z(cmd):
+def _run_7z(sz, cmd, progress_callback=None, total=0, **kwargs):
     """Run a 7z command, raising a sanitized error on failure."""
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        error_lines = (result.stderr or result.stdout or "").strip()
-        raise RuntimeError(
-            f"7-Zip failed (exit code {result.returncode}).\n{error_lines}")
+    run_7z(cmd, progress_callback, total,
+           progress_switches=sz.supports("progress_switches"), **kwargs)
+
+
+def manifest_items(items, algorithm):
+    """
+    Hash the items on a thread pool and write their manifest to a scratch
+    folder. 7z reads its inputs itself, so this runs just before it and
+    leaves the files in the page cache for it.
+
+    Returns:
+        tuple: (items with the manifest first, scratch folder to remove)
+    """
+    scratch = tempfile.mkdtemp(prefix="diophantine-manifest-")
+    try:
+        path = os.path.join(scratch, MANIFEST_NAME)
+        with open(path, "wb") as f:
+            f.write(build_for_items(items, algorithm).to_bytes())
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    # First in the archive, so reading it back never decompresses the
+    # rest of a solid block
+    return [path] + list(items), scratch
+
+
+def read_manifest_member(sz, archive_path, password, archive_type):
+    """
+    The manifest at the root of a 7z/ZIP archive, or None if it has none.
+    """
+    result = subprocess.run([
+        sz.path, "e",
+        f"-t{archive_type}",
+        f"-p{password}",
+        "-so",
+        archive_path,
+        MANIFEST_NAME,
+    ], capture_output=True)
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return loads(result.stdout)
 
 
-def create_encrypted_7z(items, output_path, password):
+def create_encrypted_7z(items, output_path, password, progress_callback=None,
+                        manifest=None):
     """
     Create a 7z archive with AES-256 encryption and header encryption.
+
+    Args:
+        manifest (str): Hash algorithm for an integrity manifest stored
+            at the archive root (see crypto.manifest), or None
     """
-    sz = _find_7z()
+    sz = get_tool("7z")
+    scratch = None
+    if manifest:
+        items, scratch = manifest_items(items, manifest)
 
     cmd = [
-        sz, "a",
+        sz.path, "a",
         "-t7z",
         "-mhe=on",
         f"-p{password}",
         output_path,
     ] + list(items)
 
-    _run_7z(cmd)
+    if sz.supports("multithread"):
+        cmd.insert(2, "-mmt=on")
+
+    total = inventory_size(items) if progress_callback else 0
+    try:
+        _run_7z(sz, cmd, progress_callback, total)
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
 
 
 def extract_encrypted_7z(archive_path, output_dir, password, progress_callback=None):
     """
     Extract an AES-256 encrypted 7z archive.
+
+    Progress is reported as bytes of the archive processed.
+
+    Returns:
+        dict: The archive's integrity manifest, or None
     """
-    sz = _find_7z()
+    sz = get_tool("7z")
 
     cmd = [
-        sz, "x",
+        sz.path, "x",
         "-t7z",
         f"-p{password}",
         f"-o{output_dir}",
         "-y",
+        EXCLUDE_MANIFEST,
+        archive_path,
+    ]
+
+    _run_7z(sz, cmd, progress_callback, os.path.getsize(archive_path),
+            error_label="7-Zip extraction failed")
+    return read_manifest_member(sz, archive_path, password, "7z")
+
+
+def verify_encrypted_7z(archive_path, password, progress_callback=None):
+    """
+    Test an encrypted 7z archive with `7z t`: every file is decrypted and
+    checked against its stored CRC, and nothing is written to disk.
+    """
+    sz = get_tool("7z")
+    cmd = [
+        sz.path, "t",
+        "-t7z",
+        f"-p{password}",
         archive_path,
     ]
+    _run_7z(sz, cmd, progress_callback, os.path.getsize(archive_path),
+            error_label="7-Zip test failed")
+
+
+def _slt_entries(listing, folders=False):
+    """
+    Entries of `7z l -slt` output, as dicts, in archive order: files only,
+    unless `folders`. The block describing the archive itself is skipped.
+    """
+    entries = []
+    for block in listing.split("\n\n"):
+        fields = dict(line.split(" = ", 1) for line in block.splitlines()
+                      if " = " in line)
+        if "Path" in fields and "Folder" in fields \
+                and (folders or fields["Folder"] != "+"):
+            entries.append(fields)
+    return entries
+
+
+def check_7z_password(sz, archive_path, password, archive_type="7z",
+                      smallest=False):
+    """
+    Cheaply tell whether a password opens an archive, before extracting.
 
-    if progress_callback is None:
-        _run_7z(cmd)
-        return
-
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                            universal_newlines=True)
-    for line in proc.stdout:
-        line = line.strip()
-        if "%" in line:
-            try:
-                pct = int(line.split("%")[0].strip().split()[-1])
-                progress_callback(float(pct))
-            except (ValueError, IndexError):
-                pass
-    proc.wait()
-    if proc.returncode != 0:
+    `7z l` fails at once for a wrong password when the headers are
+    encrypted (-mhe=on). Otherwise the listing is public, so a single
+    encrypted entry is tested: the first (in a solid 7z block, reaching
+    it decompresses the least) or the smallest (for ZIP, where entries
+    are independent).
+
+    Returns:
+        bool: False only if 7-Zip rejects the password
+
+    Raises:
+        RuntimeError: If the archive cannot be read at all
+    """
+    listing = subprocess.run([
+        sz.path, "l", "-slt",
+        f"-t{archive_type}",
+        f"-p{password}",
+        archive_path,
+    ], capture_output=True, text=True)
+    if listing.returncode != 0:
+        message = (listing.stderr or listing.stdout or "").strip()
+        if "password" in message.lower():
+            return False
         raise RuntimeError(
-            f"7-Zip extraction failed (exit code {proc.returncode}).")
+            f"7-Zip cannot open the archive (exit code "
+            f"{listing.returncode}).\n{message}")
+
+    encrypted = [e for e in _slt_entries(listing.stdout)
+                 if e.get("Encrypted") == "+"]
+    if not encrypted:
+        return True
+    if smallest:
+        entry = min(encrypted, key=lambda e: int(e["Size"] or 0))
+    else:
+        entry = encrypted[0]
+
+    test = subprocess.run([
+        sz.path, "t",
+        f"-t{archive_type}",
+        f"-p{password}",
+        archive_path,
+        "--", entry["Path"],
+    ], capture_output=True, text=True)
+    if test.returncode == 0:
+        return True
+    message = (test.stderr or test.stdout or "").strip()
+    if "password" in message.lower():
+        return False
+    raise RuntimeError(
+        f"7-Zip test failed (exit code {test.returncode}).\n{message}")
+
+
+def check_encrypted_7z_password(archive_path, password):
+    """Pre-flight password check for a 7z archive; see check_7z_password."""
+    return check_7z_password(get_tool("7z"), archive_path, password, "7z")
+
+
+# ── In-place update ───────────────────────────────────────────────
+
+# Add new files, replace any whose mtime differs from the archived copy,
+# keep identical ones. Entries no longer on disk are kept (q1): only an
+# explicit delete or prune removes them.
+UPDATE_SWITCHES = "-up1q1r2x2y2z1w2"
+
+
+def _listing(sz, archive_path, password, archive_type):
+    """Archive path -> `7z l -slt` fields, folders included."""
+    listing = subprocess.run([
+        sz.path, "l", "-slt",
+        f"-t{archive_type}",
+        f"-p{password}",
+        archive_path,
+    ], capture_output=True, text=True)
+    if listing.returncode != 0:
+        raise RuntimeError(
+            f"7-Zip cannot list the archive (exit code "
+            f"{listing.returncode}).\n"
+            f"{(listing.stderr or listing.stdout or '').strip()}")
+    return {e["Path"].replace(os.sep, "/"): e
+            for e in _slt_entries(listing.stdout, folders=True)}
+
+
+def _stale_entries(inventory, archived):
+    """Archived paths under the items' top-level names not on disk."""
+    on_disk = {e.relpath.replace(os.sep, "/")
+               for e in inventory.files + inventory.dirs}
+    tops = set(inventory.top_level)
+    return [path for path in archived
+            if path.split("/")[0] in tops and path not in on_disk]
+
+
+def _updated_manifest(manifest, removed, inventory, archived):
+    """
+    The manifest after deleting `removed` and refreshing the items.
+
+    An entry is kept without rereading its file when the file's size and
+    mtime still match the entry and the archived copy has that size:
+    `7z u` copies such a file across unchanged. Only new and changed files
+    are hashed, so the cost follows the change, not the selection.
+    """
+    def kept(path):
+        return not any(path == r or path.startswith(r + "/")
+                       for r in removed)
+
+    entries = {e["path"]: e for e in manifest["files"] if kept(e["path"])}
+    changed = []
+    for f in inventory.files:
+        path = f.relpath.replace(os.sep, "/")
+        old = entries.get(path)
+        listed = archived.get(path)
+        if old is not None and listed is not None:
+            st = os.stat(f.src)
+            if old["size"] == st.st_size == int(listed.get("Size") or 0) \
+                    and old["mtime"] == st.st_mtime:
+                continue
+        changed.append((f.src, f.relpath))
+    if changed:
+        fresh = build_manifest(changed, manifest["algorithm"]).manifest()
+        entries.update((e["path"], e) for e in fresh["files"])
+    return dict(manifest, files=[entries[p] for p in sorted(entries)])
+
+
+def update_archive(sz, archive_path, items, password, archive_type,
+                   switches, delete=(), prune=False, progress_callback=None):
+    """
+    Bring an encrypted 7z/ZIP archive up to date in place.
+
+    `7z u` adds new files and replaces changed ones under the items, then
+    `7z d` drops the entries to delete. Unchanged entries are copied
+    across in their compressed, encrypted form, so the cost follows the
+    size of the change, not of the archive (in a solid 7z archive, a
+    block holding a changed or deleted file is repacked). The password is
+    checked first, so new entries never end up under a different one, and
+    an integrity manifest at the archive root is brought up to date in
+    the same `7z u` step.
+
+    Deletions run last, so a failed update leaves the archive as it was.
+    If the delete step itself fails, the update has already been applied
+    and the archive still holds the entries to delete; the manifest then
+    omits them, which verification tolerates. A path both deleted and
+    present on disk under the items ends up deleted.
+
+    Args:
+        items (list): Files and folders to add or refresh; they land at
+            the root under their basenames, as on creation
+        switches (list): Encryption switches of the archive type
+        delete (list): Archive paths ("/"-separated) to remove, with
+            everything under them
+        prune (bool): Also remove archived files and folders under the
+            items' names that no longer exist on disk
+
+    Returns:
+        list: Archive paths removed
+
+    Raises:
+        RuntimeError: On a wrong password, before anything is changed, or
+            a 7-Zip failure. Each 7z step replaces the archive only once
+            it has written the new one, and a failed update happens before
+            any deletion.
+    """
+    from crypto.inventory import scan
+
+    items = [i.rstrip(os.sep) or i for i in items]
+    if not check_7z_password(sz, archive_path, password, archive_type,
+                             smallest=archive_type == "zip"):
+        raise RuntimeError("Wrong password; the archive was not changed.")
+
+    inventory = scan(items)
+    removed = [p.strip("/") for p in delete if p.strip("/")]
+    manifest = read_manifest_member(sz, archive_path, password, archive_type)
+    archived = (_listing(sz, archive_path, password, archive_type)
+                if (prune and items) or manifest else {})
+    if prune and items:
+        removed += _stale_entries(inventory, archived)
+
+    scratch = tempfile.mkdtemp(prefix="diophantine-update-")
+    try:
+        add = list(items)
+        if manifest and (add or removed):
+            path = os.path.join(scratch, MANIFEST_NAME)
+            with open(path, "wb") as f:
+                f.write(dumps(_updated_manifest(manifest, removed, inventory,
+                                                archived)))
+            add.insert(0, path)
+        if add:
+            cmd = [
+                sz.path, "u",
+                f"-t{archive_type}",
+            ] + switches + [
+                UPDATE_SWITCHES,
+                f"-p{password}",
+                archive_path,
+            ] + add
+            if sz.supports("multithread"):
+                cmd.insert(2, "-mmt=on")
+            total = inventory_size(add) if progress_callback else 0
+            _run_7z(sz, cmd, progress_callback, total,
+                    error_label="Archive left unchanged: 7-Zip update "
+                                "failed")
+        elif progress_callback:
+            progress_callback(1, 1)
+
+        if removed:
+            # A list file keeps odd names and long lists off the command line
+            listfile = os.path.join(scratch, "delete.txt")
+            with open(listfile, "w", encoding="utf-8") as f:
+                f.write("\n".join(removed) + "\n")
+            _run_7z(sz, [
+                sz.path, "d",
+                f"-t{archive_type}",
+            ] + switches + [
+                f"-p{password}",
+                "-scsUTF-8",
+                archive_path,
+                f"@{listfile}",
+            ], error_label="Update applied, but 7-Zip could not delete "
+                           "entries")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return removed
+
+
+def update_encrypted_7z(archive_path, items, password, delete=(),
+                        prune=False, progress_callback=None):
+    """
+    Add, replace and delete entries of a 7z archive in place, keeping
+    AES-256 and header encryption; see update_archive.
+    """
+    return update_archive(get_tool("7z"), archive_path, items, password,
+                          "7z", ["-mhe=on"], delete, prune,
+                          progress_callback)
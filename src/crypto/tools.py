@@ -0,0 +1,231 @@
+"""
+Registry of the external tools the engines drive (7z, gpg, VeraCrypt).
+
+Each tool is resolved on PATH once per process, then probed for its
+version and capabilities. Probe results are persisted in
+config/tools.json keyed by the binary's real path, mtime and size, so a
+later run skips the probe until the tool is upgraded or replaced.
+Engines ask the registry for the binary and check capabilities before
+enabling switches that older builds reject. Setting TOOLS_CACHE_ENV
+moves the cache elsewhere; the benchmarks point it at their scratch
+folder so stand-in tools never land in the real cache.
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+# Bump when probing logic changes so stale cache entries are re-probed
+PROBE_VERSION = 3
+
+PROBE_TIMEOUT = 10
+
+# Environment variable overriding the probe cache location
+TOOLS_CACHE_ENV = "DIOPHANTINE_TOOLS_CACHE"
+
+# Candidate names/paths per tool, in order of preference
+CANDIDATES = {
+    "7z": ("7z", "7zz"),
+    "gpg": ("gpg", "gpg2"),
+    # macOS: VeraCrypt CLI lives inside the app bundle
+    "veracrypt": ("veracrypt",
+                  "/Applications/VeraCrypt.app/Contents/MacOS/VeraCrypt"),
+}
+
+INSTALL_HINTS = {
+    "7z": ("7-Zip is not installed.\n\n"
+           "Install via Homebrew:  brew install p7zip"),
+    "gpg": ("GPG is not installed.\n\n"
+            "Install via Homebrew:  brew install gnupg"),
+    "veracrypt": ("VeraCrypt is not installed.\n\n"
+                  "Install it from https://veracrypt.fr/en/Downloads.html\n"
+                  "then create a symlink:\n"
+                  "  sudo ln -s /Applications/VeraCrypt.app/Contents/MacOS/"
+                  "VeraCrypt /usr/local/bin/veracrypt"),
+}
+
+
+class Tool:
+    """A resolved binary with its probed version and capabilities."""
+
+    def __init__(self, name, path, version=None, flavor=None,
+                 capabilities=None):
+        self.name = name
+        self.path = path
+        self.version = version
+        self.flavor = flavor
+        self.capabilities = capabilities or {}
+
+    def supports(self, capability):
+        return bool(self.capabilities.get(capability))
+
+    @property
+    def version_tuple(self):
+        if not self.version:
+            return ()
+        return tuple(int(p) for p in re.findall(r"\d+", self.version))
+
+    def __repr__(self):
+        return f"Tool({self.name!r}, {self.path!r}, {self.version!r})"
+
+
+# ── Probes ────────────────────────────────────────────────────────
+
+
+def _run(cmd):
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True,
+                                timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return (result.stdout or "") + (result.stderr or "")
+
+
+def _probe_7z(path):
+    # "7z i" prints the banner plus the format and codec tables
+    out = _run([path, "i"])
+    match = re.search(r"7-Zip(?: \[\d+\]| \(\w+\))? (\d+\.\d+)", out)
+    version = match.group(1) if match else None
+    if "p7zip" in out:
+        flavor = "p7zip"
+    elif os.path.basename(path).startswith("7zz"):
+        flavor = "7zz"
+    else:
+        flavor = "7-Zip"
+    major = int(version.split(".")[0]) if version else 0
+    return version, flavor, {
+        # -bsp/-bso/-bse output switches arrived in 7-Zip 15
+        "progress_switches": major >= 15,
+        # -mmt for 7z (LZMA2) and zip (deflate) compression threads
+        "multithread": major >= 9,
+    }
+
+
+def _probe_gpg(path):
+    out = _run([path, "--version"])
+    match = re.search(r"\(GnuPG[^)]*\) (\d+\.\d+(?:\.\d+)?)", out)
+    return (match.group(1) if match else None), "GnuPG", {}
+
+
+def _probe_veracrypt(path):
+    out = _run([path, "--text", "--version"])
+    match = re.search(r"VeraCrypt (\d+\.\d+(?:\.\d+)?)", out)
+    return (match.group(1) if match else None), "VeraCrypt", {}
+
+
+PROBES = {
+    "7z": _probe_7z,
+    "gpg": _probe_gpg,
+    "veracrypt": _probe_veracrypt,
+}
+
+
+# ── Persistent cache ──────────────────────────────────────────────
+
+
+def _cache_path():
+    """Return $DIOPHANTINE_TOOLS_CACHE, else config/tools.json."""
+    override = os.environ.get(TOOLS_CACHE_ENV)
+    if override:
+        return override
+    here = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(here))
+    return os.path.join(project_root, "config", "tools.json")
+
+
+def _load_cache():
+    try:
+        with open(_cache_path(), "r") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    path = _cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        # A read-only install still works; it just probes every run
+        pass
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size,
+            "probe": PROBE_VERSION}
+
+
+# ── Registry ──────────────────────────────────────────────────────
+
+_tools = {}
+_lock = threading.Lock()
+
+
+def _resolve(name):
+    for candidate in CANDIDATES[name]:
+        found = shutil.which(candidate)
+        if found:
+            # Keep the name as found: multi-call binaries dispatch on argv[0]
+            return os.path.abspath(found)
+    return None
+
+
+def get_tool(name):
+    """
+    Resolve and probe a tool, once per process.
+
+    Raises:
+        FileNotFoundError: With install instructions if it is missing
+    """
+    with _lock:
+        tool = _tools.get(name)
+        if tool is not None:
+            return tool
+
+        path = _resolve(name)
+        if path is None:
+            # Not memoized: installing the tool takes effect immediately
+            raise FileNotFoundError(INSTALL_HINTS[name])
+
+        key = os.path.realpath(path)
+        cache = _load_cache()
+        entry = cache.get(key)
+        fingerprint = _fingerprint(path)
+        if not entry or entry.get("tool") != name \
+                or entry.get("fingerprint") != fingerprint:
+            version, flavor, capabilities = PROBES[name](path)
+            entry = {"tool": name, "fingerprint": fingerprint,
+                     "version": version, "flavor": flavor,
+                     "capabilities": capabilities}
+            # Drop entries for binaries that have since been removed
+            cache = {p: e for p, e in cache.items() if os.path.exists(p)}
+            cache[key] = entry
+            _save_cache(cache)
+
+        tool = Tool(name, path, entry["version"], entry["flavor"],
+                    entry["capabilities"])
+        _tools[name] = tool
+        return tool
+
+
+def find_tool(name):
+    """get_tool(), or None if it is not installed."""
+    try:
+        return get_tool(name)
+    except FileNotFoundError:
+        return None
+
+
+def reset():
+    """Forget resolved tools (PATH changed, or a tool was upgraded)."""
+    with _lock:
+        _tools.clear()
@@ -3,32 +3,77 @@ import os
 import tempfile
 import shutil
 
-# macOS: VeraCrypt CLI lives inside the app bundle
-_VERACRYPT_PATHS = [
-    "veracrypt",
-    "/Applications/VeraCrypt.app/Contents/MacOS/VeraCrypt",
-]
+from crypto.copy_engine import copy_items
+from crypto.manifest import (
+    MANIFEST_NAME, ManifestBuilder, build_for_items, read_manifest,
+    verify_manifest
+)
+from crypto.progress import Reporter, inventory_size
+from crypto.tools import get_tool
+from crypto.veracrypt_sizing import required_container_mb
 
+# Container filesystems and the host formatter VeraCrypt needs for each
+# (FAT is formatted by VeraCrypt itself).
+CONTAINER_FILESYSTEMS = {
+    "FAT": (),
+    "exFAT": ("mkfs.exfat", "newfs_exfat"),
+    "ext4": ("mkfs.ext4",),
+    "NTFS": ("mkfs.ntfs", "mkntfs"),
+}
 
-def _find_veracrypt():
-    for path in _VERACRYPT_PATHS:
-        if shutil.which(path):
-            return path
-    raise FileNotFoundError(
-        "VeraCrypt is not installed.\n\n"
-        "Install it from https://veracrypt.fr/en/Downloads.html\n"
-        "then create a symlink:\n"
-        "  sudo ln -s /Applications/VeraCrypt.app/Contents/MacOS/VeraCrypt "
-        "/usr/local/bin/veracrypt")
+# Spelling expected by veracrypt --filesystem
+_FILESYSTEM_ARGS = {"FAT": "FAT", "exFAT": "exFAT", "ext4": "Ext4",
+                    "NTFS": "NTFS"}
+
+# Containers created with spare_space get this much room for later
+# additions. The Linux/macOS CLI cannot create dynamic (sparse) volumes,
+# so the room is allocated up front; quick format only saves the time of
+# encrypting it.
+SPARE_SPACE_FACTOR = 2
+
+
+def available_filesystems():
+    """Container filesystems that can be formatted on this machine."""
+    return [fs for fs, tools in CONTAINER_FILESYSTEMS.items()
+            if not tools or any(shutil.which(t) for t in tools)]
 
 
 def create_veracrypt_container(
     items,
     container_path,
     password,
-    size_mb=500
+    size_mb=None,
+    progress_callback=None,
+    filesystem="FAT",
+    quick_format=False,
+    spare_space=False,
+    manifest=None
 ):
-    vc = _find_veracrypt()
+    """
+    Create a VeraCrypt container holding the given items.
+
+    Args:
+        size_mb (int): Container size; computed from the items when None
+        filesystem (str): One of CONTAINER_FILESYSTEMS
+        quick_format (bool): Skip encrypting free space (much faster, but
+            reveals how much of the container is in use)
+        spare_space (bool): Quick-formatted container with
+            SPARE_SPACE_FACTOR times the room the items need; implies
+            quick_format, since encrypting the spare room is slow
+        manifest (str): Hash algorithm for an integrity manifest written
+            to the container root (see crypto.manifest), or None
+    """
+    vc = get_tool("veracrypt").path
+    if filesystem not in CONTAINER_FILESYSTEMS:
+        raise ValueError(f"Unsupported container filesystem: {filesystem}")
+    if size_mb is None:
+        size_mb = required_container_mb(items, filesystem,
+                                        manifest=bool(manifest))
+        if spare_space:
+            size_mb *= SPARE_SPACE_FACTOR
+    create_options = []
+    if quick_format or spare_space:
+        create_options.append("--quick")
     mount_dir = tempfile.mkdtemp()
 
     try:
@@ -39,11 +84,11 @@ def create_veracrypt_container(
             "--size", f"{size_mb}M",
             "--encryption", "AES",
             "--hash", "SHA-512",
-            "--filesystem", "FAT",
+            "--filesystem", _FILESYSTEM_ARGS[filesystem],
             "--password", password,
             "--pim", "0",
             "--non-interactive"
-        ], check=True)
+        ] + create_options, check=True)
 
         subprocess.run([
             vc,
@@ -54,24 +99,29 @@ def create_veracrypt_container(
             "--non-interactive"
         ], check=True)
 
-        for item in items:
-            shutil.copytree(item, os.path.join(mount_dir, os.path.basename(item))) \
-                if os.path.isdir(item) else shutil.copy(item, mount_dir)
+        builder = ManifestBuilder(manifest) if manifest else None
+        copy_items(items, mount_dir, progress_callback, manifest=builder)
+        if builder is not None:
+            with open(os.path.join(mount_dir, MANIFEST_NAME), "wb") as f:
+                f.write(builder.to_bytes())
 
     finally:
-        subprocess.run([vc, "-d"], check=False)
-        shutil.rmtree(mount_dir)
+        # Only this container's mount; other volumes stay as they are
+        subprocess.run([vc, "--text", "--dismount", mount_dir], check=False)
+        shutil.rmtree(mount_dir, ignore_errors=True)
 
 
-def mount_veracrypt_container(container_path, mount_dir, password):
+def mount_veracrypt_container(container_path, mount_dir, password,
+                              readonly=False):
     """
     Mount a VeraCrypt container at the specified directory.
 
     Returns:
         str: The mount directory path.
     """
-    vc = _find_veracrypt()
+    vc = get_tool("veracrypt").path
     os.makedirs(mount_dir, exist_ok=True)
+    options = ["--mount-options", "ro"] if readonly else []
     subprocess.run([
         vc,
         "--text",
@@ -79,7 +129,7 @@ def mount_veracrypt_container(container_path, mount_dir, password):
         mount_dir,
         "--password", password,
         "--non-interactive"
-    ], check=True)
+    ] + options, check=True)
     return mount_dir
 
 
@@ -90,7 +140,7 @@ def unmount_veracrypt_container(mount_dir=None):
     Args:
         mount_dir: Specific mount point to unmount. If None, unmounts all.
     """
-    vc = _find_veracrypt()
+    vc = get_tool("veracrypt").path
     if mount_dir:
         subprocess.run([
             vc, "--text", "--dismount", mount_dir
@@ -99,35 +149,113 @@ def unmount_veracrypt_container(mount_dir=None):
         subprocess.run([vc, "-d"], check=True)
 
 
-def extract_veracrypt_container(container_path, output_dir, password, progress_callback=None):
+def mounted_slot(mount_dir):
+    """
+    VeraCrypt slot number of the volume mounted at mount_dir.
+
+    Returns:
+        int: The slot, or None if nothing is mounted there (or VeraCrypt
+        cannot be queried)
+    """
+    vc = get_tool("veracrypt").path
+    result = subprocess.run([vc, "--text", "--list", "--non-interactive"],
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    mount_dir = os.path.normpath(mount_dir)
+    # "<slot>: <container> <virtual device> <mount point>"; paths may
+    # contain spaces, so match on the line ending rather than splitting
+    for line in result.stdout.splitlines():
+        slot, sep, rest = line.partition(":")
+        if sep and slot.strip().isdigit() and \
+                rest.rstrip().endswith(" " + mount_dir):
+            return int(slot)
+    return None
+
+
+def extract_veracrypt_container(container_path, output_dir, password,
+                                progress_callback=None, sessions=None):
     """
     Mount, copy all files to output_dir, then unmount.
+
+    Progress is reported as bytes copied out of the container.
+
+    Returns:
+        dict: The container's integrity manifest, or None
+
+    Args:
+        sessions (MountManager): When given, the mount is borrowed from (or
+            left in) this session cache instead of being torn down, so
+            repeated extractions skip the header key derivation.
     """
+    if sessions is not None:
+        with sessions.session(container_path, password) as mount_dir:
+            return _copy_out(mount_dir, output_dir, progress_callback)
+
     mount_dir = tempfile.mkdtemp()
     mounted = False
 
     try:
         mount_veracrypt_container(container_path, mount_dir, password)
         mounted = True
+        return _copy_out(mount_dir, output_dir, progress_callback)
+
+    finally:
+        if mounted:
+            unmount_veracrypt_container(mount_dir)
+        shutil.rmtree(mount_dir, ignore_errors=True)
 
-        # Collect all items in the mounted container
-        entries = os.listdir(mount_dir)
-        total = len(entries)
 
-        os.makedirs(output_dir, exist_ok=True)
+def _copy_out(mount_dir, output_dir, progress_callback):
+    # Collect all items in the mounted container; the manifest is read in
+    # place rather than copied out
+    entries = [os.path.join(mount_dir, e) for e in os.listdir(mount_dir)
+               if e != MANIFEST_NAME]
+    copy_items(entries, output_dir, progress_callback)
+    return read_manifest(os.path.join(mount_dir, MANIFEST_NAME))
+
+
+def verify_veracrypt_container(container_path, password,
+                               progress_callback=None, sessions=None):
+    """
+    Mount read-only and read every file in place, on a few threads.
+
+    Files are checked against the container's manifest when it has one;
+    otherwise reading them proves the volume decrypts and its filesystem
+    is intact. Nothing is copied out.
 
-        for i, entry in enumerate(entries):
-            src = os.path.join(mount_dir, entry)
-            dst = os.path.join(output_dir, entry)
-            if os.path.isdir(src):
-                shutil.copytree(src, dst)
-            else:
-                shutil.copy2(src, dst)
+    Args:
+        sessions (MountManager): Borrow an existing (or cached) mount
+            instead of mounting read-only just for this check
 
-            if progress_callback and total > 0:
-                progress_callback((i + 1) / total * 100)
+    Raises:
+        IntegrityError: If files differ from the manifest
+    """
+    if sessions is not None:
+        with sessions.session(container_path, password) as mount_dir:
+            _check_mounted(mount_dir, progress_callback)
+        return
 
+    mount_dir = tempfile.mkdtemp()
+    mounted = False
+    try:
+        mount_veracrypt_container(container_path, mount_dir, password,
+                                  readonly=True)
+        mounted = True
+        _check_mounted(mount_dir, progress_callback)
     finally:
         if mounted:
             unmount_veracrypt_container(mount_dir)
-        shutil.rmtree(mount_dir, ignore_errors=True)
\ No newline at end of file
+        shutil.rmtree(mount_dir, ignore_errors=True)
+
+
+def _check_mounted(mount_dir, progress_callback):
+    entries = [os.path.join(mount_dir, e) for e in os.listdir(mount_dir)
+               if e != MANIFEST_NAME]
+    reporter = Reporter(progress_callback, inventory_size(entries))
+    manifest = read_manifest(os.path.join(mount_dir, MANIFEST_NAME))
+    if manifest:
+        verify_manifest(manifest, mount_dir, reporter=reporter)
+    else:
+        build_for_items(entries, reporter=reporter)
+    reporter.finish()
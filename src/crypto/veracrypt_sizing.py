@@ -0,0 +1,256 @@
+"""
+VeraCrypt container sizing from the input file inventory.
+
+A container must hold the payload after the filesystem has rounded every
+file up to whole clusters, stored its directory entries and kept its own
+metadata (allocation tables, bitmaps, boot regions), plus VeraCrypt's
+volume headers. Guessing a fixed size either wastes time writing random
+data or overflows; this module computes the smallest size that fits.
+
+An integrity manifest, written to the container root after the copy, is
+counted as one more root file of MANIFEST_ENTRY_BYTES per listed file.
+"""
+
+import math
+
+from crypto.inventory import Entry, Inventory, scan
+from crypto.manifest import MANIFEST_NAME
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+TB = 1024 * GB
+
+SECTOR = 512
+
+# Primary + backup header groups (128 KiB each) that VeraCrypt reserves
+# around the data area of a file-hosted volume.
+VERACRYPT_HEADER_BYTES = 256 * KB
+
+# Headroom on top of the computed minimum, for rounding differences between
+# formatter versions and filesystem housekeeping.
+HEADROOM_FRACTION = 0.01
+HEADROOM_BYTES = 1 * MB
+
+MIN_CONTAINER_MB = 2
+
+# Manifest JSON per file, besides its path: size, mtime, a hex digest and
+# the indented keys around them
+MANIFEST_ENTRY_BYTES = 200
+MANIFEST_HEADER_BYTES = 1 * KB
+
+
+def _fat_cluster_size(volume_bytes):
+    """Cluster size chosen by VeraCrypt's built-in FAT formatter."""
+    for threshold, cluster in ((2 * TB, 128 * KB), (512 * GB, 64 * KB),
+                               (128 * GB, 32 * KB), (64 * GB, 16 * KB),
+                               (32 * GB, 8 * KB), (16 * GB, 4 * KB),
+                               (512 * MB, 2 * KB)):
+        if volume_bytes >= threshold:
+            return cluster
+    return SECTOR
+
+
+def _exfat_cluster_size(volume_bytes):
+    """Default exFAT cluster size (mkfs.exfat / newfs_exfat / Windows)."""
+    if volume_bytes > 32 * GB:
+        return 128 * KB
+    if volume_bytes > 256 * MB:
+        return 32 * KB
+    return 4 * KB
+
+
+def _fat_dir_entry_bytes(name, is_dir):
+    # 8.3 entry plus VFAT long-name entries of 13 UTF-16 units each
+    return 32 * (1 + math.ceil(len(name) / 13))
+
+
+def _exfat_dir_entry_bytes(name, is_dir):
+    # File + stream extension entries, then 15 UTF-16 units per name entry
+    return 32 * (2 + math.ceil(len(name) / 15))
+
+
+def _fat_metadata(clusters, cluster_size):
+    """Boot sector, both FAT copies and the fixed root (FAT12/16)."""
+    if clusters < 4085:
+        entry_bytes, reserved, root = 1.5, SECTOR, 512 * 32
+    elif clusters < 65525:
+        entry_bytes, reserved, root = 2, SECTOR, 512 * 32
+    else:
+        entry_bytes, reserved, root = 4, 32 * SECTOR, 0
+    fat = math.ceil((clusters + 2) * entry_bytes / SECTOR) * SECTOR
+    return reserved + 2 * fat + root
+
+
+def _exfat_metadata(clusters, cluster_size):
+    """Boot regions, FAT, allocation bitmap and up-case table."""
+    boot = 2 * 12 * SECTOR
+    fat = math.ceil((clusters + 2) * 4 / SECTOR) * SECTOR
+    bitmap = math.ceil(math.ceil(clusters / 8) / cluster_size) * cluster_size
+    upcase = math.ceil(5836 / cluster_size) * cluster_size
+    # Cluster heap is aligned to 1 MiB by current formatters
+    return boot + fat + bitmap + upcase + 1 * MB
+
+
+def _ext4_cluster_size(volume_bytes):
+    return 4 * KB if volume_bytes >= 512 * MB else 1 * KB
+
+
+def _ext4_dir_entry_bytes(name, is_dir):
+    # inode, rec_len, name_len, type, then the name padded to 4 bytes
+    return 8 + math.ceil(len(name.encode("utf-8")) / 4) * 4
+
+
+def _ext4_journal(volume_bytes):
+    """Default mke2fs journal size for the volume size."""
+    for limit, journal in ((128 * MB, 4 * MB), (1 * GB, 16 * MB),
+                           (2 * GB, 32 * MB), (16 * GB, 64 * MB),
+                           (32 * GB, 128 * MB), (64 * GB, 256 * MB),
+                           (128 * GB, 512 * MB)):
+        if volume_bytes < limit:
+            return journal
+    return 1 * GB
+
+
+def _ext4_metadata(clusters, cluster_size):
+    """Inode tables, bitmaps, journal and the 5% root reservation."""
+    data = clusters * cluster_size
+    # Solve for the volume size: inode tables take 256 bytes per 16 KiB
+    # (1/64) and reserved blocks another 5% of the whole volume.
+    volume = data / (1 - 1 / 64 - 0.05)
+    groups = math.ceil(volume / (cluster_size * 8 * cluster_size))
+    bitmaps_and_descriptors = groups * 3 * cluster_size
+    return int(volume - data) + bitmaps_and_descriptors + \
+        _ext4_journal(volume) + 1 * MB
+
+
+def _ntfs_cluster_size(volume_bytes):
+    return 4 * KB if volume_bytes <= 16 * TB else 64 * KB
+
+
+def _ntfs_dir_entry_bytes(name, is_dir):
+    # Index entry: 16-byte header plus a $FILE_NAME attribute (66 + name)
+    return 16 + 66 + 2 * len(name)
+
+
+def _ntfs_metadata(clusters, cluster_size):
+    """$LogFile plus the fixed system files."""
+    data = clusters * cluster_size
+    # $LogFile scales with the volume, between 2 and 64 MiB
+    logfile = min(64 * MB, max(2 * MB, data // 100))
+    # System files, $MFTMirr, boot sector and its backup
+    return logfile + 4 * MB
+
+
+class _Filesystem:
+    def __init__(self, cluster_size, dir_entry_bytes, dot_entries,
+                 metadata, min_mb, max_file_bytes=None, record_bytes=0,
+                 inode_ratio=0):
+        self.cluster_size = cluster_size
+        self.dir_entry_bytes = dir_entry_bytes
+        self.dot_entries = dot_entries
+        self.metadata = metadata
+        self.min_mb = min_mb
+        self.max_file_bytes = max_file_bytes
+        # Fixed per-file/per-directory record outside the cluster heap
+        # accounting (ext4 inodes are covered by the inode-table ratio)
+        self.record_bytes = record_bytes
+        # Volume bytes per inode; caps how many files a volume can hold
+        self.inode_ratio = inode_ratio
+
+
+FILESYSTEMS = {
+    "FAT": _Filesystem(_fat_cluster_size, _fat_dir_entry_bytes, True,
+                       _fat_metadata, MIN_CONTAINER_MB,
+                       max_file_bytes=4 * GB - 1),
+    "exFAT": _Filesystem(_exfat_cluster_size, _exfat_dir_entry_bytes, False,
+                         _exfat_metadata, MIN_CONTAINER_MB),
+    "ext4": _Filesystem(_ext4_cluster_size, _ext4_dir_entry_bytes, True,
+                        _ext4_metadata, 8, inode_ratio=16 * KB),
+    # Every file and directory costs a 1 KiB MFT record
+    "NTFS": _Filesystem(_ntfs_cluster_size, _ntfs_dir_entry_bytes, False,
+                        _ntfs_metadata, 4, record_bytes=1 * KB),
+}
+
+
+def _data_bytes(inventory, fs, cluster_size):
+    """Bytes of cluster heap used by file data and directory entries."""
+    clusters = 0
+    for f in inventory.files:
+        clusters += math.ceil(f.size / cluster_size)
+
+    # Root directory: one entry per top-level item
+    root_bytes = sum(fs.dir_entry_bytes(name, False)
+                     for name in inventory.top_level)
+    clusters += max(1, math.ceil(root_bytes / cluster_size))
+
+    for d in inventory.dirs:
+        entry_bytes = sum(fs.dir_entry_bytes(name, False)
+                          for name in d.children)
+        if fs.dot_entries:
+            entry_bytes += 2 * 32  # "." and ".."
+        clusters += max(1, math.ceil(entry_bytes / cluster_size))
+
+    records = fs.record_bytes * (len(inventory.files) + len(inventory.dirs))
+    return clusters * cluster_size + records
+
+
+def with_manifest(inventory):
+    """The inventory plus the manifest file written at the root."""
+    size = MANIFEST_HEADER_BYTES + sum(
+        MANIFEST_ENTRY_BYTES + len(f.relpath.encode("utf-8"))
+        for f in inventory.files)
+    counted = Inventory()
+    counted.files = inventory.files + [Entry(None, MANIFEST_NAME, size)]
+    counted.dirs = inventory.dirs
+    counted.top_level = inventory.top_level + [MANIFEST_NAME]
+    return counted
+
+
+def container_size_bytes(inventory, filesystem="FAT", manifest=False):
+    """
+    Smallest container size, in bytes, that holds the inventory, and its
+    integrity manifest when `manifest` is set.
+
+    Cluster size depends on the volume size, so the size is iterated to a
+    fixed point: a bigger volume may get bigger clusters and more rounding.
+    """
+    fs = FILESYSTEMS.get(filesystem)
+    if fs is None:
+        raise ValueError(f"Unsupported filesystem for sizing: {filesystem}")
+    if manifest:
+        inventory = with_manifest(inventory)
+
+    if fs.max_file_bytes is not None:
+        too_big = [f.relpath for f in inventory.files
+                   if f.size > fs.max_file_bytes]
+        if too_big:
+            raise ValueError(
+                f"{filesystem} cannot store files larger than 4 GB:\n"
+                + "\n".join(f"  {p}" for p in too_big[:10]))
+
+    size = fs.min_mb * MB
+    for _ in range(16):
+        cluster = fs.cluster_size(size)
+        data = _data_bytes(inventory, fs, cluster)
+        metadata = fs.metadata(math.ceil(data / cluster), cluster)
+        needed = data + metadata
+        needed += int(needed * HEADROOM_FRACTION) + HEADROOM_BYTES
+        if fs.inode_ratio:
+            # First 11 inodes are reserved by the filesystem
+            entries = len(inventory.files) + len(inventory.dirs) + 11
+            needed = max(needed, entries * fs.inode_ratio)
+        needed += VERACRYPT_HEADER_BYTES
+        if needed <= size:
+            break
+        size = needed
+    return size
+
+
+def required_container_mb(items, filesystem="FAT", manifest=False):
+    """
+    Container size in MB (as passed to veracrypt --size) for the given
+    files and folders, plus an integrity manifest if `manifest` is set.
+    """
+    size = container_size_bytes(scan(items), filesystem, manifest)
+    return max(math.ceil(size / MB), FILESYSTEMS[filesystem].min_mb)
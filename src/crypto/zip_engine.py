@@ -1,80 +1,117 @@
-import subprocess
 import os
 import shutil
 
+from crypto.progress import inventory_size, run_7z
+from crypto.sevenz_engine import (
+    EXCLUDE_MANIFEST, check_7z_password, manifest_items, read_manifest_member,
+    update_archive
+)
+from crypto.tools import get_tool
 
-def _find_7z():
-    for name in ("7z", "7zz"):
-        if shutil.which(name):
-            return name
-    raise FileNotFoundError(
-        "7-Zip is not installed.\n\n"
-        "Install via Homebrew:  brew install p7zip")
 
-
-def _run_7z(cmd):
+def _run_7z(sz, cmd, progress_callback=None, total=0, **kwargs):
     """Run a 7z command, raising a sanitized error on failure."""
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        # Extract useful error info from stderr/stdout without leaking the command
-        error_lines = (result.stderr or result.stdout or "").strip()
-        raise RuntimeError(
-            f"7-Zip failed (exit code {result.returncode}).\n{error_lines}")
+    run_7z(cmd, progress_callback, total,
+           progress_switches=sz.supports("progress_switches"), **kwargs)
 
 
 def create_encrypted_zip(
     items,
     output_path,
     password,
-    single_archive=False
+    single_archive=False,
+    progress_callback=None,
+    manifest=None
 ):
     """
     Uses 7-Zip AES-256 encryption.
+
+    Args:
+        manifest (str): Hash algorithm for an integrity manifest stored
+            at the archive root (see crypto.manifest), or None
     """
 
-    sz = _find_7z()
+    sz = get_tool("7z")
+    scratch = None
+    if manifest:
+        items, scratch = manifest_items(items, manifest)
 
     cmd = [
-        sz, "a",
+        sz.path, "a",
         "-tzip",
         "-mem=AES256",
         f"-p{password}",
         output_path,
     ] + list(items)
 
-    _run_7z(cmd)
+    if sz.supports("multithread"):
+        cmd.insert(2, "-mmt=on")
+
+    total = inventory_size(items) if progress_callback else 0
+    try:
+        _run_7z(sz, cmd, progress_callback, total)
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
 
 
 def extract_encrypted_zip(archive_path, output_dir, password, progress_callback=None):
     """
     Extract an AES-256 encrypted ZIP archive using 7-Zip.
+
+    Progress is reported as bytes of the archive processed.
+
+    Returns:
+        dict: The archive's integrity manifest, or None
     """
-    sz = _find_7z()
+    sz = get_tool("7z")
 
     cmd = [
-        sz, "x",
+        sz.path, "x",
         "-tzip",
         f"-p{password}",
         f"-o{output_dir}",
         "-y",
+        EXCLUDE_MANIFEST,
+        archive_path,
+    ]
+
+    _run_7z(sz, cmd, progress_callback, os.path.getsize(archive_path),
+            error_label="7-Zip extraction failed")
+    return read_manifest_member(sz, archive_path, password, "zip")
+
+
+def verify_encrypted_zip(archive_path, password, progress_callback=None):
+    """
+    Test an encrypted ZIP archive with `7z t` (CRC of every file, nothing
+    written to disk).
+    """
+    sz = get_tool("7z")
+    cmd = [
+        sz.path, "t",
+        "-tzip",
+        f"-p{password}",
         archive_path,
     ]
+    _run_7z(sz, cmd, progress_callback, os.path.getsize(archive_path),
+            error_label="7-Zip test failed")
+
 
-    if progress_callback is None:
-        _run_7z(cmd)
-        return
-
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                            universal_newlines=True)
-    for line in proc.stdout:
-        line = line.strip()
-        if "%" in line:
-            try:
-                pct = int(line.split("%")[0].strip().split()[-1])
-                progress_callback(float(pct))
-            except (ValueError, IndexError):
-                pass
-    proc.wait()
-    if proc.returncode != 0:
-        raise RuntimeError(
-            f"7-Zip extraction failed (exit code {proc.returncode}).")
+def check_encrypted_zip_password(archive_path, password):
+    """
+    Pre-flight password check for a ZIP archive: tests only its smallest
+    encrypted entry; see sevenz_engine.check_7z_password.
+    """
+    return check_7z_password(get_tool("7z"), archive_path, password, "zip",
+                             smallest=True)
+
+
+def update_encrypted_zip(archive_path, items, password, delete=(),
+                         prune=False, progress_callback=None):
+    """
+    Add, replace and delete entries of a ZIP archive in place, encrypting
+    new entries with AES-256; see sevenz_engine.update_archive.
+    """
+    return update_archive(get_tool("7z"), archive_path, items, password,
+                          "zip", ["-mem=AES256"], delete, prune,
+                          progress_callback)
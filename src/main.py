@@ -1,9 +1,36 @@
+import sys
+import time
+
+_STARTED = time.perf_counter()
+
 from tkinterdnd2 import TkinterDnD
 from ui.main_window import DiophantineUI
 from utils.preferences import load_preferences
 
+_IMPORTED = time.perf_counter()
+
+
+def report_startup(root):
+    """Draw the first frame, then print startup timings as JSON."""
+    import json
+    built = time.perf_counter()
+    root.update()
+    drawn = time.perf_counter()
+    print(json.dumps({
+        "imports_s": round(_IMPORTED - _STARTED, 4),
+        "window_s": round(built - _IMPORTED, 4),
+        "first_frame_s": round(drawn - _STARTED, 4),
+        "modules": len(sys.modules),
+    }))
+
+
 if __name__ == "__main__":
     prefs = load_preferences()
     root = TkinterDnD.Tk()
     app = DiophantineUI(root, prefs=prefs)
-    root.mainloop()
+    if "--measure-startup" in sys.argv[1:]:
+        # Used by benchmarks/startup.py; exits instead of entering the loop
+        report_startup(root)
+        root.destroy()
+    else:
+        root.mainloop()
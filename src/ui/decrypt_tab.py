@@ -1,38 +1,23 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
-import hashlib
 
-from crypto.zip_engine import extract_encrypted_zip
-from crypto.veracrypt_engine import (
-    mount_veracrypt_container,
-    unmount_veracrypt_container,
-    extract_veracrypt_container
+from crypto.operations import (
+    detect_type, decrypt_task, decrypt_group_limits, verify_task
 )
-from crypto.sevenz_engine import extract_encrypted_7z
-from crypto.gpg_engine import extract_gpg_encrypted
 from utils.keyfile_auth import (
-    load_keyfile, validate_keyfile, combine_keyfile_and_password
+    validate_keyfile, combine_keyfile_and_password, keyfile_password
 )
-from utils.recovery_phrase import validate_recovery_phrase
-
-
-# Extension-to-type mapping for auto-detection
-FILE_TYPE_MAP = {
-    '.zip': 'zip',
-    '.hc': 'veracrypt',
-    '.tc': 'veracrypt',
-    '.7z': '7z',
-    '.gpg': 'gpg',
-    '.pgp': 'gpg',
-    '.asc': 'gpg',
-}
+from utils.recovery_phrase import validate_recovery_phrase, word_status
+from utils.jobs import Task, PROGRESS, FINISHED, resolve_workers
+
 
 TYPE_DISPLAY = {
     'zip': 'ZIP (AES-256)',
     '7z': '7z (AES-256)',
     'gpg': 'GPG (AES-256)',
     'veracrypt': 'VeraCrypt Container',
+    'dedup': 'Deduplicated Store',
 }
 
 
@@ -52,7 +37,7 @@ class DecryptTab:
         self.current_keyfile = None
         self.veracrypt_mode = tk.StringVar(value="extract")
         self.output_dir = tk.StringVar()
-        self.current_mount = None
+        self.verify_manifest = tk.BooleanVar(value=True)
 
         self.frame = ttk.Frame(parent_notebook)
         self._build()
@@ -69,8 +54,12 @@ class DecryptTab:
             command=self.decrypt, default="active")
         self.decrypt_btn.pack(side=tk.RIGHT, padx=(5, 20), pady=8)
 
+        self.verify_btn = ttk.Button(action_bar, text="Verify",
+            command=self.verify)
+        self.verify_btn.pack(side=tk.RIGHT, padx=3, pady=8)
+
         self.unmount_btn = ttk.Button(action_bar, text="Unmount",
-            command=self._unmount_current)
+            command=self._unmount_all)
         # Hidden initially
         self.unmount_btn.pack_forget()
 
@@ -78,6 +67,10 @@ class DecryptTab:
             command=self.remove_item
         ).pack(side=tk.RIGHT, padx=3, pady=8)
 
+        ttk.Button(action_bar, text="Add Store",
+            command=self.browse_store
+        ).pack(side=tk.RIGHT, padx=3, pady=8)
+
         ttk.Button(action_bar, text="Add Files",
             command=self.browse_encrypted_files
         ).pack(side=tk.RIGHT, padx=3, pady=8)
@@ -195,7 +188,7 @@ class DecryptTab:
         self.vc_frame = ttk.Frame(self.vc_container)
 
         ui.radio(self.vc_frame,
-            "Mount + Extract + Unmount (automated)",
+            "Mount + Extract (unmounts when idle)",
             self.veracrypt_mode, "extract",
             command=self._update_decrypt_btn_text)
         ui.radio(self.vc_frame,
@@ -225,6 +218,9 @@ class DecryptTab:
             command=self.browse_output_dir
         ).pack(side=tk.RIGHT, padx=(5, 0))
 
+        ui.checkbox(parent, "Verify against integrity manifest",
+            self.verify_manifest)
+
     def _build_password_input(self, parent):
         ui = self.app
         p = ui.palette
@@ -280,10 +276,12 @@ class DecryptTab:
             highlightbackground=p["highlight_border"], highlightthickness=1,
             wrap=tk.WORD, state=tk.DISABLED)
         self.recovery_input.pack(fill=tk.X, pady=(0, 2))
+        self.recovery_input.bind("<KeyRelease>", self._check_recovery_input)
 
-        ttk.Label(parent,
+        self.recovery_hint = ttk.Label(parent,
             text="Enter the recovery phrase used during encryption",
-            font=("", 8)).pack(anchor=tk.W)
+            font=("", 8))
+        self.recovery_hint.pack(anchor=tk.W)
 
     # ── File Management ──────────────────────────────────────────
 
@@ -314,6 +312,20 @@ class DecryptTab:
                 self.listbox.insert(tk.END, path)
         self._update_item_count()
 
+    def browse_store(self):
+        """Add a deduplicated store folder; its latest snapshot is used."""
+        path = filedialog.askdirectory(title="Select deduplicated store")
+        if not path:
+            return
+        if detect_type(path) != "dedup":
+            messagebox.showerror("Diophantine",
+                f"{path} is not a deduplicated store.")
+            return
+        if path not in self.items:
+            self.items.append(path)
+            self.listbox.insert(tk.END, path)
+        self._update_item_count()
+
     def remove_item(self):
         selected_indices = self.listbox.curselection()
         for index in reversed(selected_indices):
@@ -332,7 +344,8 @@ class DecryptTab:
         if event.data:
             files = self.root.tk.splitlist(event.data)
             for path in files:
-                if os.path.isfile(path) and path not in self.items:
+                if (os.path.isfile(path) or detect_type(path) == "dedup") \
+                        and path not in self.items:
                     self.items.append(path)
                     self.listbox.insert(tk.END, path)
         self._update_item_count()
@@ -360,11 +373,7 @@ class DecryptTab:
 
     def _detect_type(self, path):
         """Detect file type from extension."""
-        ext = os.path.splitext(path)[1].lower()
-        # Handle .tar.gpg
-        if path.lower().endswith(".tar.gpg"):
-            return "gpg"
-        return FILE_TYPE_MAP.get(ext, "unknown")
+        return detect_type(path)
 
     def _update_type_display(self):
         """Update the type label based on current files."""
@@ -482,6 +491,31 @@ class DecryptTab:
             self.recovery_input.config(state=tk.DISABLED)
             self.password.config(state=tk.NORMAL)
 
+    def _check_recovery_input(self, event=None):
+        """Flag unknown words and report checksum state while typing."""
+        words = self.recovery_input.get(1.0, tk.END).split()
+        p = self.app.palette
+        if not words:
+            self.recovery_hint.config(
+                text="Enter the recovery phrase used during encryption",
+                foreground=p["light_text"])
+            return
+        # The word being typed may be incomplete; earlier ones may not
+        for i, word in enumerate(words):
+            status = word_status(word)
+            last = i == len(words) - 1
+            if status == "invalid" or (status == "prefix" and not last):
+                self.recovery_hint.config(
+                    text=f"Word {i + 1} ('{word}') is not in the word list",
+                    foreground=p["warning_fg"])
+                return
+        if validate_recovery_phrase(words):
+            self.recovery_hint.config(text=f"Valid {len(words)}-word phrase",
+                foreground=p["info_fg"])
+        else:
+            self.recovery_hint.config(text=f"{len(words)} words",
+                foreground=p["light_text"])
+
     def select_keyfile(self):
         file_path = filedialog.askopenfilename(
             title="Select Keyfile",
@@ -501,22 +535,52 @@ class DecryptTab:
                     text="Invalid keyfile selected",
                     foreground=p["warning_fg"])
 
-    def _unmount_current(self):
-        if self.current_mount:
-            try:
-                unmount_veracrypt_container(self.current_mount)
-                messagebox.showinfo("Diophantine",
-                    f"Container unmounted from:\n{self.current_mount}")
-                self.current_mount = None
-                self.unmount_btn.pack_forget()
-            except Exception as e:
+    def _unmount_all(self):
+        sessions = self.app.mounts.sessions()
+        if not sessions:
+            self.unmount_btn.pack_forget()
+            return
+
+        def on_event(event):
+            if event.kind != FINISHED:
+                return
+            self._refresh_unmount_btn()
+            failed = [(name, status) for name, status in event.job.results
+                      if status != "OK"]
+            if failed:
+                details = "\n".join(f"  {name}: {status}"
+                                    for name, status in failed)
                 messagebox.showerror("Error",
-                    f"Failed to unmount:\n{str(e)}")
+                    f"Failed to unmount:\n{details}")
+            else:
+                messagebox.showinfo("Diophantine",
+                    "Container unmounted from:\n" + "\n".join(
+                        s.mount_dir for s in sessions))
+
+        self.app.jobs.submit("Unmount", [
+            Task(os.path.basename(s.container_path),
+                 lambda progress, s=s: self.app.mounts.dismount(s))
+            for s in sessions], on_event=on_event)
+
+    def _refresh_unmount_btn(self):
+        """Show the Unmount button while any container is mounted."""
+        if self.app.mounts.sessions():
+            self.unmount_btn.pack(side=tk.RIGHT, padx=3, pady=8)
+        else:
+            self.unmount_btn.pack_forget()
 
     # ── Password Resolution ──────────────────────────────────────
 
     def _resolve_password(self):
-        """Resolve the decryption password from all auth sources."""
+        """
+        Resolve the candidate secrets from all auth sources.
+
+        Returns:
+            list: Secrets to try, most specific first, or None after
+            telling the user what is missing. Each file is opened with
+            the first candidate its pre-flight check accepts; see
+            crypto.operations.select_password.
+        """
 
         if self.use_recovery_phrase.get():
             phrase_text = self.recovery_input.get(1.0, tk.END).strip()
@@ -529,7 +593,7 @@ class DecryptTab:
                 messagebox.showerror("Diophantine",
                     "Invalid recovery phrase.")
                 return None
-            return phrase_text
+            return [phrase_text]
 
         password_text = self.password.get()
 
@@ -539,17 +603,19 @@ class DecryptTab:
                     "Keyfile is invalid or corrupted.")
                 return None
             if password_text:
-                return combine_keyfile_and_password(
-                    self.current_keyfile, password_text)
+                # Also try each factor alone, for archives made with one
+                return [combine_keyfile_and_password(
+                            self.current_keyfile, password_text),
+                        keyfile_password(self.current_keyfile),
+                        password_text]
             else:
-                keyfile_data = load_keyfile(self.current_keyfile)
-                return hashlib.sha256(keyfile_data).hexdigest()
+                return [keyfile_password(self.current_keyfile)]
 
         if not password_text:
             messagebox.showerror("Diophantine",
                 "Please enter a password.")
             return None
-        return password_text
+        return [password_text]
 
     # ── Decrypt Execution ────────────────────────────────────────
 
@@ -568,11 +634,8 @@ class DecryptTab:
             vc_files = [f for f in self.items
                         if self._get_effective_type(f) == "veracrypt"]
             if vc_files:
-                if len(vc_files) > 1:
-                    messagebox.showwarning("Diophantine",
-                        "Mount mode only supports one VeraCrypt file at a time.\n"
-                        "Only the first file will be mounted.")
-                self._mount_veracrypt(vc_files[0], password)
+                # No cheap check for containers: mount with the first
+                self._mount_veracrypt(vc_files, password[0])
                 return
 
         # Get or prompt for output directory
@@ -586,36 +649,74 @@ class DecryptTab:
 
         # Reset progress
         self.app.progress["value"] = 0
-        self.app.progress["maximum"] = len(self.items)
-        self.root.update_idletasks()
-
-        results = []  # (filename, "OK" or error_message)
-
-        for i, file_path in enumerate(self.items):
-            effective_type = self._get_effective_type(file_path)
-            filename = os.path.basename(file_path)
-
-            try:
-                if effective_type == "zip":
-                    self._decrypt_zip(file_path, output_dir, password)
-                elif effective_type == "7z":
-                    self._decrypt_7z(file_path, output_dir, password)
-                elif effective_type == "gpg":
-                    self._decrypt_gpg(file_path, output_dir, password)
-                elif effective_type == "veracrypt":
-                    self._extract_veracrypt(file_path, output_dir, password)
-                else:
-                    results.append((filename, "Unknown file type"))
-                    continue
-
-                results.append((filename, "OK"))
-            except Exception as e:
-                results.append((filename, str(e)))
-
-            self.app.progress["value"] = i + 1
-            self.root.update_idletasks()
-
-        # Show summary
+        self.app.progress["maximum"] = 100
+        self.decrypt_btn.state(['disabled'])
+
+        # Containers stay mounted between runs; see crypto.mount_sessions
+        verify = self.verify_manifest.get()
+        tasks = [decrypt_task(file_path, output_dir, password,
+                              file_type=self._get_effective_type(file_path),
+                              sessions=self.app.mounts, verify=verify)
+                 for file_path in self.items]
+
+        # Items are independent: fan out per engine, within its cap
+        workers = resolve_workers(self.app.prefs.get("max_workers", 0))
+        self.app.jobs.submit("Decrypt", tasks, on_event=self._on_job_event,
+            max_parallel=workers, group_limits=decrypt_group_limits(workers))
+
+    def _on_job_event(self, event):
+        if event.kind == PROGRESS:
+            self.app.progress["value"] = event.data
+        elif event.kind == FINISHED:
+            self.decrypt_btn.state(['!disabled'])
+            self.verify_btn.state(['!disabled'])
+            self._refresh_unmount_btn()
+            if event.job.name == "Verify":
+                self._show_verify_summary(event.job.results)
+            else:
+                self._show_summary(event.job.results)
+
+    # ── Verify ───────────────────────────────────────────────────
+
+    def verify(self):
+        """Check every listed file decrypts, without writing anything."""
+        if not self.items:
+            messagebox.showerror("Diophantine",
+                "No encrypted files selected.")
+            return
+
+        password = self._resolve_password()
+        if password is None:
+            return
+
+        self.app.progress["value"] = 0
+        self.app.progress["maximum"] = 100
+        self.decrypt_btn.state(['disabled'])
+        self.verify_btn.state(['disabled'])
+
+        tasks = [verify_task(file_path, password,
+                             file_type=self._get_effective_type(file_path),
+                             sessions=self.app.mounts)
+                 for file_path in self.items]
+        workers = resolve_workers(self.app.prefs.get("max_workers", 0))
+        self.app.jobs.submit("Verify", tasks, on_event=self._on_job_event,
+            max_parallel=workers, group_limits=decrypt_group_limits(workers))
+
+    def _show_verify_summary(self, results):
+        passed = [name for name, status in results if status == "OK"]
+        failed = [(name, status) for name, status in results
+                  if status != "OK"]
+        if not failed:
+            messagebox.showinfo("Diophantine",
+                f"Verification passed.\n{len(passed)} file(s) intact.")
+        else:
+            details = "\n".join(f"  {name}: {status}"
+                                for name, status in failed)
+            messagebox.showwarning("Diophantine",
+                f"Passed: {len(passed)}, Failed: {len(failed)}\n\n"
+                f"Failed files:\n{details}")
+
+    def _show_summary(self, results):
         ok_count = sum(1 for _, status in results if status == "OK")
         fail_count = len(results) - ok_count
 
@@ -630,42 +731,51 @@ class DecryptTab:
                 f"Successful: {ok_count}, Failed: {fail_count}\n\n"
                 f"Failed files:\n{details}")
 
-    def _decrypt_zip(self, file_path, output_dir, password):
-        def on_progress(percent):
-            self.root.update_idletasks()
-        extract_encrypted_zip(file_path, output_dir, password,
-            progress_callback=on_progress)
-
-    def _decrypt_7z(self, file_path, output_dir, password):
-        def on_progress(percent):
-            self.root.update_idletasks()
-        extract_encrypted_7z(file_path, output_dir, password,
-            progress_callback=on_progress)
-
-    def _decrypt_gpg(self, file_path, output_dir, password):
-        def on_progress(percent):
-            self.root.update_idletasks()
-        extract_gpg_encrypted(file_path, output_dir, password,
-            progress_callback=on_progress)
-
-    def _mount_veracrypt(self, file_path, password):
-        mount_dir = filedialog.askdirectory(
-            title="Select mount point")
-        if not mount_dir:
-            return
-        try:
-            mount_veracrypt_container(file_path, mount_dir, password)
-            self.current_mount = mount_dir
-            self.unmount_btn.pack(side=tk.RIGHT, padx=3, pady=8)
-            messagebox.showinfo("Diophantine",
-                f"Container mounted at:\n{mount_dir}\n\n"
-                "Use the Unmount button when done.")
-        except Exception as e:
-            messagebox.showerror("Diophantine",
-                f"Mount failed:\n{str(e)}")
+    def _mount_veracrypt(self, file_paths, password):
+        if len(file_paths) == 1:
+            mount_dir = filedialog.askdirectory(
+                title="Select mount point")
+            if not mount_dir:
+                return
+            targets = [(file_paths[0], mount_dir)]
+        else:
+            parent = filedialog.askdirectory(
+                title="Select folder for the mount points")
+            if not parent:
+                return
+            targets = [(f, os.path.join(parent,
+                        os.path.splitext(os.path.basename(f))[0]))
+                       for f in file_paths]
+
+        mounted = {}
+
+        def mount(file_path, mount_dir):
+            # Pinned: browsing sessions stay until Unmount, never idle out
+            session = self.app.mounts.acquire(file_path, password,
+                mount_dir=mount_dir, pinned=True)
+            self.app.mounts.release(session)
+            mounted[file_path] = session.mount_dir
 
-    def _extract_veracrypt(self, file_path, output_dir, password):
-        def on_progress(percent):
-            self.root.update_idletasks()
-        extract_veracrypt_container(file_path, output_dir, password,
-            progress_callback=on_progress)
+        def on_event(event):
+            if event.kind != FINISHED:
+                return
+            self.decrypt_btn.state(['!disabled'])
+            self._refresh_unmount_btn()
+            failed = [(name, status) for name, status in event.job.results
+                      if status != "OK"]
+            if mounted:
+                messagebox.showinfo("Diophantine",
+                    "Container mounted at:\n"
+                    + "\n".join(mounted[f] for f, _ in targets
+                                if f in mounted)
+                    + "\n\nUse the Unmount button when done.")
+            if failed:
+                messagebox.showerror("Diophantine",
+                    "Mount failed:\n" + "\n".join(
+                        f"  {name}: {status}" for name, status in failed))
+
+        self.decrypt_btn.state(['disabled'])
+        self.app.jobs.submit("Mount", [
+            Task(os.path.basename(f),
+                 lambda progress, f=f, d=d: mount(f, d))
+            for f, d in targets], on_event=on_event)
@@ -1,27 +1,30 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk, simpledialog
+from tkinter import messagebox, ttk
 import os
-import hashlib
-
-from crypto.zip_engine import create_encrypted_zip
-from crypto.veracrypt_engine import create_veracrypt_container
-from crypto.sevenz_engine import create_encrypted_7z
-from crypto.gpg_engine import create_gpg_encrypted
-from utils.naming import original_name, numeric_name, chronos_name
-from utils.entropy import calculate_entropy, entropy_to_strength
-from utils.recovery_phrase import generate_recovery_phrase
-from utils.keyfile_auth import (
-    generate_keyfile, load_keyfile, validate_keyfile,
-    combine_keyfile_and_password
+
+# Engines, dialogs, keyfile and recovery-phrase helpers are imported by the
+# methods that use them, so none of them delay the first frame.
+from crypto.manifest import DEFAULT_ALGORITHM
+from crypto.operations import (
+    build_encrypt_tasks, container_size_mb, encrypt_then_verify, update_task
 )
+from utils.strength import StrengthEstimator, LOW_STRENGTH_BITS
 from utils.profiles import save_profile, load_profile, list_profiles, delete_profile
+from utils.jobs import PROGRESS, FINISHED, Task, resolve_workers
+
+
+# Quiet period before the strength label is redrawn (ms)
+STRENGTH_REFRESH_MS = 120
 
-# Extension map for each encryption method
-EXT_MAP = {
-    "zip": ".zip",
-    "7z": ".7z",
-    "gpg": ".tar.gpg",
-    "veracrypt": ".hc",
+# Quiet period before the container size is re-estimated (ms)
+SIZE_ESTIMATE_MS = 300
+
+PATTERN_HINTS = {
+    "repeat": "contains repeated characters",
+    "sequence": "contains a sequence",
+    "keyboard": "contains a keyboard pattern",
+    "chunk": "repeats itself",
+    "word": "contains a common word",
 }
 
 
@@ -47,9 +50,12 @@ class EncryptTab:
         action_bar = ttk.Frame(self.frame)
         action_bar.pack(fill=tk.X)
 
-        ttk.Button(action_bar, text="Encrypt",
-            command=self.encrypt, default="active"
-        ).pack(side=tk.RIGHT, padx=(5, 20), pady=8)
+        self.encrypt_btn = ttk.Button(action_bar, text="Encrypt",
+            command=self.encrypt, default="active")
+        self.encrypt_btn.pack(side=tk.RIGHT, padx=(5, 20), pady=8)
+        self.update_btn = ttk.Button(action_bar, text="Update Archive",
+            command=self.update_archive)
+        self.update_btn.pack(side=tk.RIGHT, padx=3, pady=8)
 
         for label, cmd in [("Remove", self.remove_item),
                            ("Add Folder", self.add_folder),
@@ -100,6 +106,17 @@ class EncryptTab:
         self.single_archive = tk.BooleanVar()
         ui.checkbox(basic_inner, "Create single archive",
             self.single_archive)
+        self.write_manifest = tk.BooleanVar()
+        ui.checkbox(basic_inner, "Store integrity manifest",
+            self.write_manifest, command=self._update_size_estimate)
+        self.verify_after = tk.BooleanVar()
+        ui.checkbox(basic_inner, "Verify after encryption",
+            self.verify_after)
+        self.incremental = tk.BooleanVar()
+        ui.checkbox(basic_inner, "Incremental backup (changed files only)",
+            self.incremental)
+        # Content hash for incremental change detection; profiles only
+        self.backup_hash = None
 
         ui.section_label(basic_inner, "Encryption Method")
         self.encryption_method = tk.StringVar(value="zip")
@@ -108,10 +125,37 @@ class EncryptTab:
         ui.radio(basic_inner, "7z (AES-256)", self.encryption_method, "7z")
         ui.radio(basic_inner, "GPG (AES-256)", self.encryption_method, "gpg")
         ui.radio(basic_inner, "VeraCrypt Container", self.encryption_method, "veracrypt")
+        ui.radio(basic_inner, "Deduplicated Store", self.encryption_method, "dedup")
 
         self.size_estimate_label = ttk.Label(basic_inner, text="",
             font=("", 9))
         self.size_estimate_label.pack(anchor=tk.W, pady=(2, 0))
+        self._size_refresh = None
+        self._size_job = None
+
+        # Container options; frame always packed, contents shown/hidden
+        self.vc_container = ttk.Frame(basic_inner)
+        self.vc_container.pack(fill=tk.X)
+        self.vc_frame = ttk.Frame(self.vc_container)
+
+        fs_row = ttk.Frame(self.vc_frame)
+        fs_row.pack(fill=tk.X, pady=(2, 2))
+        ttk.Label(fs_row, text="Filesystem:",
+            font=("", 9)).pack(side=tk.LEFT)
+        self.vc_filesystem = tk.StringVar(value="FAT")
+        # Choices are probed when the list is first opened
+        self.vc_fs_combo = ttk.Combobox(fs_row,
+            textvariable=self.vc_filesystem, values=("FAT",),
+            postcommand=self._refresh_filesystems,
+            state='readonly', width=8, font=("", 10))
+        self.vc_fs_combo.pack(side=tk.LEFT, padx=(5, 0))
+        self.vc_filesystem.trace_add("write", self._on_method_change)
+
+        self.vc_quick_format = tk.BooleanVar()
+        ui.checkbox(self.vc_frame, "Quick format", self.vc_quick_format)
+        self.vc_spare_space = tk.BooleanVar()
+        ui.checkbox(self.vc_frame, "Quick format with spare space",
+            self.vc_spare_space, command=self._update_size_estimate)
 
         ui.section_label(basic_inner, "Naming Scheme")
         self.naming_scheme = tk.StringVar(value="original")
@@ -142,6 +186,8 @@ class EncryptTab:
             font=("", 9))
         self.strength.pack(anchor=tk.W, pady=(2, 0))
         self.password.bind("<KeyRelease>", self.update_strength)
+        self._strength_estimator = StrengthEstimator()
+        self._strength_refresh = None
 
         # ── Column 2: Advanced Options ───────────────────────────
         advanced = ttk.LabelFrame(options_row, text="  Advanced Options  ")
@@ -252,6 +298,7 @@ class EncryptTab:
         self._update_size_estimate()
 
     def add_files(self):
+        from tkinter import filedialog
         paths = filedialog.askopenfilenames(title="Select files")
         for p in paths:
             if p and p not in self.items:
@@ -260,6 +307,7 @@ class EncryptTab:
         self._update_item_count()
 
     def add_folder(self):
+        from tkinter import filedialog
         folder = filedialog.askdirectory(title="Select folder")
         if folder:
             if folder not in self.items:
@@ -306,28 +354,61 @@ class EncryptTab:
 
     # ── Container Size Estimation ────────────────────────────────
 
-    def _calculate_total_size(self):
-        """Recursively sum file sizes for all items."""
-        total = 0
-        for item in self.items:
-            if os.path.isfile(item):
-                total += os.path.getsize(item)
-            elif os.path.isdir(item):
-                for dirpath, _, filenames in os.walk(item):
-                    for f in filenames:
-                        total += os.path.getsize(os.path.join(dirpath, f))
-        return total
-
     def _update_size_estimate(self):
-        """Show estimated container size when VeraCrypt is selected."""
-        if self.encryption_method.get() == "veracrypt" and self.items:
-            total = self._calculate_total_size()
-            # 10% overhead, minimum 10MB
-            estimated_mb = max(10, int(total * 1.1 / (1024 * 1024)) + 1)
-            self.size_estimate_label.config(
-                text=f"Estimated container size: {estimated_mb} MB")
-        else:
+        """Show container size and options when VeraCrypt is selected."""
+        # Sizing walks every listed item, which can take seconds on a
+        # large tree; it runs as a job once the options stop changing
+        if self._size_refresh is not None:
+            self.root.after_cancel(self._size_refresh)
+            self._size_refresh = None
+        if self._size_job is not None:
+            self._size_job.cancel()
+            self._size_job = None
+
+        if self.encryption_method.get() != "veracrypt":
+            self.vc_frame.pack_forget()
             self.size_estimate_label.config(text="")
+            return
+
+        self.vc_frame.pack(in_=self.vc_container, fill=tk.X)
+        if not self.items:
+            self.size_estimate_label.config(text="")
+            return
+        self.size_estimate_label.config(text="Container size: estimating...")
+        self._size_refresh = self.root.after(
+            SIZE_ESTIMATE_MS, self._start_size_estimate)
+
+    def _start_size_estimate(self):
+        self._size_refresh = None
+        items = list(self.items)
+        filesystem = self.vc_filesystem.get()
+        spare_space = self.vc_spare_space.get()
+        manifest = self.write_manifest.get()
+        result = {}
+
+        def run(progress):
+            try:
+                size_mb = container_size_mb(items, filesystem, spare_space,
+                                            manifest)
+                result["text"] = f"Container size: {size_mb} MB"
+            except ValueError as e:
+                result["text"] = str(e).splitlines()[0]
+
+        def on_event(event):
+            # Superseded estimates finish unseen
+            if event.kind != FINISHED or event.job is not self._size_job:
+                return
+            self._size_job = None
+            failed = event.job.failed
+            self.size_estimate_label.config(text=result.get("text",
+                failed[0][1].splitlines()[0] if failed else ""))
+
+        self._size_job = self.app.jobs.submit("Estimate",
+            [Task("Container size", run)], on_event=on_event)
+
+    def _refresh_filesystems(self):
+        from crypto.veracrypt_engine import available_filesystems
+        self.vc_fs_combo["values"] = available_filesystems()
 
     def _on_method_change(self, *args):
         self._update_size_estimate()
@@ -341,6 +422,7 @@ class EncryptTab:
             self.profile_var.set("")
 
     def _save_profile(self):
+        from tkinter import simpledialog
         name = simpledialog.askstring("Save Profile",
             "Profile name:", parent=self.root)
         if not name:
@@ -349,9 +431,16 @@ class EncryptTab:
             "encryption_method": self.encryption_method.get(),
             "naming_scheme": self.naming_scheme.get(),
             "single_archive": self.single_archive.get(),
+            "integrity_manifest": self.write_manifest.get(),
+            "verify_after": self.verify_after.get(),
+            "incremental": self.incremental.get(),
+            "backup_hash": self.backup_hash,
             "advanced_enabled": self.advanced_enabled.get(),
             "keyfile_path": self.current_keyfile or "",
             "use_two_factor": self.use_two_factor.get(),
+            "veracrypt_filesystem": self.vc_filesystem.get(),
+            "veracrypt_quick_format": self.vc_quick_format.get(),
+            "veracrypt_spare_space": self.vc_spare_space.get(),
         }
         save_profile(name, settings)
         self._refresh_profiles()
@@ -368,6 +457,10 @@ class EncryptTab:
         self.encryption_method.set(settings.get("encryption_method", "zip"))
         self.naming_scheme.set(settings.get("naming_scheme", "original"))
         self.single_archive.set(settings.get("single_archive", False))
+        self.write_manifest.set(settings.get("integrity_manifest", False))
+        self.verify_after.set(settings.get("verify_after", False))
+        self.incremental.set(settings.get("incremental", False))
+        self.backup_hash = settings.get("backup_hash")
         self.advanced_enabled.set(settings.get("advanced_enabled", False))
         self.toggle_advanced_mode()
         kf = settings.get("keyfile_path", "")
@@ -377,6 +470,15 @@ class EncryptTab:
                 text=f"Keyfile: {os.path.basename(kf)}",
                 foreground=self.app.palette["info_fg"])
         self.use_two_factor.set(settings.get("use_two_factor", False))
+        from crypto.veracrypt_engine import available_filesystems
+        filesystem = settings.get("veracrypt_filesystem", "FAT")
+        if filesystem not in available_filesystems():
+            filesystem = "FAT"
+        self.vc_filesystem.set(filesystem)
+        self.vc_quick_format.set(settings.get("veracrypt_quick_format", False))
+        self.vc_spare_space.set(settings.get("veracrypt_spare_space",
+            settings.get("veracrypt_dynamic", False)))
+        self._update_size_estimate()
 
     def _delete_profile(self):
         name = self.profile_var.get()
@@ -398,6 +500,7 @@ class EncryptTab:
     # ── Advanced Features ────────────────────────────────────────
 
     def generate_recovery_phrase(self):
+        from utils.recovery_phrase import generate_recovery_phrase
         phrase_words = generate_recovery_phrase(128)
         phrase = " ".join(phrase_words)
         self.recovery_phrase_display.config(state=tk.NORMAL)
@@ -426,6 +529,8 @@ class EncryptTab:
             self.two_factor_checkbox.config(state=tk.DISABLED)
 
     def generate_keyfile(self):
+        from tkinter import filedialog
+        from utils.keyfile_auth import generate_keyfile
         file_path = filedialog.asksaveasfilename(
             title="Save Keyfile",
             defaultextension=".diophantus",
@@ -446,6 +551,8 @@ class EncryptTab:
                     f"Failed to generate keyfile:\n{str(e)}")
 
     def select_keyfile(self):
+        from tkinter import filedialog
+        from utils.keyfile_auth import validate_keyfile
         file_path = filedialog.askopenfilename(
             title="Select Keyfile",
             filetypes=[("Diophantus Keyfiles", "*.diophantus"),
@@ -478,20 +585,32 @@ class EncryptTab:
         self.password.config(
             show="" if self.show_password_var.get() else "*")
 
-    def update_strength(self, _):
-        password = self.password.get()
-        entropy = calculate_entropy(password)
-        strength_label, color = entropy_to_strength(entropy)
-        self.strength.config(
-            text=f"Entropy: {entropy:.1f} bits ({strength_label})",
-            foreground=color)
+    def update_strength(self, _=None):
+        # Scoring is incremental and cheap; redrawing the label on every
+        # key repeat is not, so the label waits for a pause in typing
+        self._strength_estimator.update(self.password.get())
+        if self._strength_refresh is not None:
+            self.root.after_cancel(self._strength_refresh)
+        self._strength_refresh = self.root.after(
+            STRENGTH_REFRESH_MS, self._refresh_strength)
+
+    def _refresh_strength(self):
+        self._strength_refresh = None
+        estimator = self._strength_estimator
+        strength_label, color = estimator.label
+        text = f"Entropy: {estimator.bits:.1f} bits ({strength_label})"
+        patterns = estimator.patterns()
+        if patterns:
+            text += f"; {PATTERN_HINTS[patterns[0][0]]}"
+        self.strength.config(text=text, foreground=color)
 
     # ── Encrypt ──────────────────────────────────────────────────
 
-    def encrypt(self):
-        if not self.items:
-            messagebox.showerror("Diophantine", "No files selected.")
-            return
+    def _resolve_password(self, check_strength=True):
+        """The engine password from the auth options, or None if missing."""
+        from utils.keyfile_auth import (
+            validate_keyfile, combine_keyfile_and_password, keyfile_password
+        )
 
         password = ""
 
@@ -510,13 +629,13 @@ class EncryptTab:
             if not validate_keyfile(self.current_keyfile):
                 messagebox.showerror("Error",
                     "Keyfile is invalid or corrupted.")
-                return
+                return None
 
             password_input = self.password.get()
             if not password_input:
                 messagebox.showerror("Error",
                     "Password required for two-factor authentication.")
-                return
+                return None
 
             password = combine_keyfile_and_password(
                 self.current_keyfile, password_input)
@@ -526,103 +645,161 @@ class EncryptTab:
             if not validate_keyfile(self.current_keyfile):
                 messagebox.showerror("Error",
                     "Keyfile is invalid or corrupted.")
-                return
+                return None
 
-            keyfile_data = load_keyfile(self.current_keyfile)
-            password = hashlib.sha256(keyfile_data).hexdigest()
+            password = keyfile_password(self.current_keyfile)
         else:
             password = self.password.get()
 
-            if not recovery_text:
-                entropy = calculate_entropy(password)
-                if entropy < 50:
+            if check_strength and not recovery_text:
+                if self._strength_estimator.update(password) \
+                        < LOW_STRENGTH_BITS:
                     if not messagebox.askyesno("Diophantine",
                             "Password entropy is low. "
                             "Continue anyway?"):
-                        return
+                        return None
+
+        return password
+
+    def encrypt(self):
+        from tkinter import filedialog
+
+        if not self.items:
+            messagebox.showerror("Diophantine", "No files selected.")
+            return
+
+        password = self._resolve_password()
+        if password is None:
+            return
 
         output_dir = filedialog.askdirectory()
         if not output_dir:
             return
 
         method = self.encryption_method.get()
-        ext = EXT_MAP.get(method, ".zip")
+        # A store is incremental by itself; each run adds a snapshot
+        if self.incremental.get() and method != "dedup":
+            self._start_backup(method, output_dir, password)
+            return
+        try:
+            tasks = self._build_tasks(method, output_dir, password)
+        except ValueError as e:
+            messagebox.showerror("Diophantine", str(e))
+            return
 
         # Reset progress
         self.app.progress["value"] = 0
-        self.app.progress["maximum"] = len(self.items) or 100
-        self.root.update_idletasks()
+        self.app.progress["maximum"] = 100
+        self.encrypt_btn.state(['disabled'])
+
+        # Separate archives are independent, so they may fan out
+        workers = resolve_workers(self.app.prefs.get("max_workers", 0))
+        limits = {}
+        if self.verify_after.get():
+            # Each archive is tested while the next one is written
+            tasks, limits = encrypt_then_verify(tasks, output_dir, password,
+                                                workers)
+        self.app.jobs.submit("Encrypt", tasks,
+            on_event=self._on_job_event, max_parallel=workers,
+            group_limits=limits)
+
+    def _build_tasks(self, method, output_dir, password):
+        """Turn the current selection into background tasks.
+
+        All Tk variables are read here, on the main thread; the tasks only
+        close over plain values.
+        """
+        return build_encrypt_tasks(self.items, output_dir, password,
+            method=method,
+            single_archive=self.single_archive.get(),
+            naming_scheme=self.naming_scheme.get(),
+            veracrypt_options={
+                "filesystem": self.vc_filesystem.get(),
+                "quick_format": self.vc_quick_format.get(),
+                "spare_space": self.vc_spare_space.get(),
+            },
+            manifest=DEFAULT_ALGORITHM if self.write_manifest.get() else None)
+
+    def update_archive(self):
+        """Add the listed items to an existing 7z/ZIP archive in place."""
+        from tkinter import filedialog
 
+        if not self.items:
+            messagebox.showerror("Diophantine", "No files selected.")
+            return
+        archive = filedialog.askopenfilename(title="Select archive to update",
+            filetypes=[("7z/ZIP archives", "*.7z *.zip")])
+        if not archive:
+            return
+        # The archive's own password; no strength prompt for it
+        password = self._resolve_password(check_strength=False)
+        if password is None:
+            return
+        prune = messagebox.askyesno("Diophantine",
+            "Also remove archived files under these items that no longer "
+            "exist on disk?")
         try:
-            if method == "veracrypt":
-                out = os.path.join(output_dir, "diophantine.hc")
-                create_veracrypt_container(self.items, out, password)
-            elif method == "gpg":
-                if self.single_archive.get() or len(self.items) > 1:
-                    out = os.path.join(output_dir, "diophantine.tar.gpg")
-                    create_gpg_encrypted(
-                        self.items, out, password, single_archive=True)
-                else:
-                    for i, item in enumerate(self.items, start=1):
-                        if self.naming_scheme.get() == "original":
-                            filename = original_name(item, ext=".gpg")
-                        elif self.naming_scheme.get() == "numeric":
-                            filename = numeric_name(i, ext=".gpg")
-                        elif self.naming_scheme.get() == "chronos":
-                            filename = chronos_name(i, ext=".gpg")
-                        else:
-                            filename = original_name(item, ext=".gpg")
-
-                        out = os.path.join(output_dir, filename)
-                        create_gpg_encrypted(
-                            [item], out, password, single_archive=False)
-                        self.app.progress["value"] = i
-                        self.root.update_idletasks()
-            elif method == "7z":
-                if self.single_archive.get():
-                    out = os.path.join(output_dir, "diophantine.7z")
-                    create_encrypted_7z(self.items, out, password)
-                else:
-                    for i, item in enumerate(self.items, start=1):
-                        if self.naming_scheme.get() == "original":
-                            filename = original_name(item, ext=ext)
-                        elif self.naming_scheme.get() == "numeric":
-                            filename = numeric_name(i, ext=ext)
-                        elif self.naming_scheme.get() == "chronos":
-                            filename = chronos_name(i, ext=ext)
-                        else:
-                            filename = original_name(item, ext=ext)
-
-                        out = os.path.join(output_dir, filename)
-                        create_encrypted_7z([item], out, password)
-                        self.app.progress["value"] = i
-                        self.root.update_idletasks()
+            task = update_task(archive, self.items, password, prune=prune)
+        except ValueError as e:
+            messagebox.showerror("Diophantine", str(e))
+            return
+
+        self.app.progress["value"] = 0
+        self.app.progress["maximum"] = 100
+        self.encrypt_btn.state(['disabled'])
+        self.update_btn.state(['disabled'])
+        self.app.jobs.submit("Update", [task], on_event=self._on_job_event)
+
+    def _start_backup(self, method, output_dir, password):
+        """Encrypt what changed since the last run; see crypto.backup."""
+        from crypto.backup import IncrementalBackup
+
+        self._backup = IncrementalBackup(self.items, output_dir,
+            method=method, algorithm=self.backup_hash,
+            verify=self.verify_after.get(),
+            manifest=DEFAULT_ALGORITHM if self.write_manifest.get() else None,
+            veracrypt_options={
+                "filesystem": self.vc_filesystem.get(),
+                "quick_format": self.vc_quick_format.get(),
+                "spare_space": self.vc_spare_space.get(),
+            })
+        self.app.progress["value"] = 0
+        self.app.progress["maximum"] = 100
+        self.encrypt_btn.state(['disabled'])
+        self.app.jobs.submit("Backup", [self._backup.task(password)],
+            on_event=self._on_job_event)
+
+    def _on_job_event(self, event):
+        if event.kind == PROGRESS:
+            self.app.progress["value"] = event.data
+        elif event.kind == FINISHED:
+            self.encrypt_btn.state(['!disabled'])
+            self.update_btn.state(['!disabled'])
+            job = event.job
+            failed = job.failed
+            if not failed and job.name == "Update":
+                self.app.progress["value"] = self.app.progress["maximum"]
+                messagebox.showinfo("Diophantine", "Archive updated.")
+            elif not failed and job.name == "Backup":
+                self.app.progress["value"] = self.app.progress["maximum"]
+                archive = self._backup.archive
+                messagebox.showinfo("Diophantine",
+                    f"Backup written to {archive}." if archive
+                    else "Nothing changed since the last backup.")
+            elif not failed:
+                self.app.progress["value"] = self.app.progress["maximum"]
+                verified = any(t.group == "verify" for t in job.tasks)
+                messagebox.showinfo("Diophantine", "Encryption complete."
+                    + ("\nEvery archive passed verification."
+                       if verified else ""))
+            elif len(job.results) == 1:
+                kind = (job.name if job.name in ("Update", "Backup")
+                        else "Encryption")
+                messagebox.showerror("Diophantine",
+                    f"{kind} failed:\n{failed[0][1]}")
             else:
-                # ZIP
-                if self.single_archive.get():
-                    out = os.path.join(output_dir, "diophantine.zip")
-                    create_encrypted_zip(
-                        self.items, out, password, single_archive=True)
-                else:
-                    for i, item in enumerate(self.items, start=1):
-                        if self.naming_scheme.get() == "original":
-                            filename = original_name(item, ext=ext)
-                        elif self.naming_scheme.get() == "numeric":
-                            filename = numeric_name(i, ext=ext)
-                        elif self.naming_scheme.get() == "chronos":
-                            filename = chronos_name(i, ext=ext)
-                        else:
-                            filename = original_name(item, ext=ext)
-
-                        out = os.path.join(output_dir, filename)
-                        create_encrypted_zip(
-                            [item], out, password, single_archive=False)
-                        self.app.progress["value"] = i
-                        self.root.update_idletasks()
-
-            self.app.progress["value"] = self.app.progress["maximum"]
-            self.root.update_idletasks()
-            messagebox.showinfo("Diophantine", "Encryption complete.")
-        except Exception as e:
-            messagebox.showerror("Diophantine",
-                f"Encryption failed:\n{str(e)}")
+                details = "\n".join(
+                    f"  {name}: {status}" for name, status in failed)
+                messagebox.showwarning("Diophantine",
+                    f"Successful: {job.ok_count}, Failed: {len(failed)}\n\n"
+                    f"Failed items:\n{details}")
@@ -3,6 +3,11 @@ from tkinter import ttk
 import platform
 
 from ui.theme import get_palette, is_macos
+from utils.jobs import JobEngine
+from crypto.mount_sessions import MountManager, DEFAULT_MOUNT_TTL
+
+# How often the Tk loop drains background job events (ms)
+JOB_POLL_INTERVAL = 50
 
 
 class DiophantineUI:
@@ -26,7 +31,15 @@ class DiophantineUI:
         # Track current appearance mode
         self._appearance = "auto"
 
+        # Background work runs here; events are drained on the Tk thread
+        self.jobs = JobEngine()
+        # VeraCrypt containers stay mounted between operations
+        self.mounts = MountManager(
+            ttl=self.prefs.get("mount_ttl", DEFAULT_MOUNT_TTL))
+
         self.build()
+        self._poll_jobs()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def build(self):
         main = ttk.Frame(self.root)
@@ -82,13 +95,36 @@ class DiophantineUI:
         self.notebook.pack(fill=tk.BOTH, expand=True)
 
         from ui.encrypt_tab import EncryptTab
-        from ui.decrypt_tab import DecryptTab
 
         self.encrypt_tab = EncryptTab(self.notebook, self)
-        self.decrypt_tab = DecryptTab(self.notebook, self)
-
         self.notebook.add(self.encrypt_tab.frame, text="  Encrypt  ")
-        self.notebook.add(self.decrypt_tab.frame, text="  Decrypt  ")
+
+        # The Decrypt tab is built the first time it is shown
+        self.decrypt_tab = None
+        self._decrypt_holder = ttk.Frame(self.notebook)
+        self.notebook.add(self._decrypt_holder, text="  Decrypt  ")
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+
+    def _on_tab_changed(self, event=None):
+        if self.decrypt_tab is not None:
+            return
+        if self.notebook.select() != str(self._decrypt_holder):
+            return
+        from ui.decrypt_tab import DecryptTab
+        self.decrypt_tab = DecryptTab(self._decrypt_holder, self)
+        self.decrypt_tab.frame.pack(fill=tk.BOTH, expand=True)
+
+    # ── Background Jobs ──────────────────────────────────────────
+
+    def _poll_jobs(self):
+        self.jobs.dispatch()
+        self.root.after(JOB_POLL_INTERVAL, self._poll_jobs)
+
+    def _on_close(self):
+        # Pending tasks are skipped; running subprocesses finish on their own
+        self.jobs.shutdown(wait=False)
+        self.mounts.close()
+        self.root.destroy()
 
     # ── Appearance Toggle ────────────────────────────────────────
 
@@ -118,6 +154,7 @@ class DiophantineUI:
         """Called after preferences are saved."""
         self.prefs = prefs
         self.palette = get_palette(prefs.get("theme"))
+        self.mounts.ttl = prefs.get("mount_ttl", DEFAULT_MOUNT_TTL)
 
     # ── Shared Widget Helpers ────────────────────────────────────
 
@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import ttk
-import secrets
-import string
+
+from utils.passwords import PasswordPolicy, generate
 
 
 class PasswordGeneratorDialog:
@@ -14,7 +14,7 @@ class PasswordGeneratorDialog:
 
         self.win = tk.Toplevel(app.root)
         self.win.title("Password Generator")
-        self.win.geometry("400x300")
+        self.win.geometry("400x330")
         self.win.resizable(False, False)
         self.win.transient(app.root)
         self.win.grab_set()
@@ -48,8 +48,10 @@ class PasswordGeneratorDialog:
         self.use_digits = tk.BooleanVar(value=True)
         self.use_symbols = tk.BooleanVar(value=True)
 
+        self.avoid_ambiguous = tk.BooleanVar(value=False)
+
         checks_row = ttk.Frame(main)
-        checks_row.pack(fill=tk.X, pady=(0, 10))
+        checks_row.pack(fill=tk.X, pady=(0, 4))
 
         for text, var in [("Uppercase", self.use_upper),
                           ("Lowercase", self.use_lower),
@@ -58,6 +60,11 @@ class PasswordGeneratorDialog:
             app.checkbox(checks_row, text, var,
                 command=self._on_option_change)
 
+        ambiguous_row = ttk.Frame(main)
+        ambiguous_row.pack(fill=tk.X, pady=(0, 10))
+        app.checkbox(ambiguous_row, "Avoid look-alikes (I l 1 O 0)",
+            self.avoid_ambiguous, command=self._on_option_change)
+
         # Generated password
         ttk.Label(main, text="Generated Password",
             font=("", 11, "bold")).pack(anchor=tk.W, pady=(0, 4))
@@ -94,21 +101,12 @@ class PasswordGeneratorDialog:
         self._generate()
 
     def _generate(self):
-        charset = ""
-        if self.use_upper.get():
-            charset += string.ascii_uppercase
-        if self.use_lower.get():
-            charset += string.ascii_lowercase
-        if self.use_digits.get():
-            charset += string.digits
-        if self.use_symbols.get():
-            charset += string.punctuation
-
-        if not charset:
-            charset = string.ascii_letters + string.digits
-
-        length = self.length_var.get()
-        password = "".join(secrets.choice(charset) for _ in range(length))
+        # Every selected set appears at least once
+        password = generate(PasswordPolicy(
+            length=self.length_var.get(),
+            upper=self.use_upper.get(), lower=self.use_lower.get(),
+            digits=self.use_digits.get(), symbols=self.use_symbols.get(),
+            exclude_ambiguous=self.avoid_ambiguous.get()))
 
         self.password_entry.config(state=tk.NORMAL)
         self.password_entry.delete(0, tk.END)
@@ -124,4 +122,6 @@ class PasswordGeneratorDialog:
         password = self.password_entry.get()
         self.target_entry.delete(0, tk.END)
         self.target_entry.insert(0, password)
+        # Let the owning tab rescore it as if it had been typed
+        self.target_entry.event_generate("<KeyRelease>")
         self.win.destroy()
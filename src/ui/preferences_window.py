@@ -12,7 +12,7 @@ class PreferencesWindow:
 
         self.win = tk.Toplevel(app.root)
         self.win.title("Preferences")
-        self.win.geometry("450x320")
+        self.win.geometry("450x450")
         self.win.resizable(False, False)
         self.win.transient(app.root)
         self.win.grab_set()
@@ -63,6 +63,24 @@ class PreferencesWindow:
             state='readonly', width=20, font=("", 10)
         ).pack(anchor=tk.W, pady=(0, 12))
 
+        # Parallel workers for "separate archives" mode
+        ttk.Label(main, text="Parallel Workers (0 = one per CPU)",
+            font=("", 11, "bold")).pack(anchor=tk.W, pady=(0, 4))
+
+        self.workers_var = tk.IntVar(value=prefs.get("max_workers", 0))
+        ttk.Spinbox(main, textvariable=self.workers_var,
+            from_=0, to=64, width=6, font=("", 10)
+        ).pack(anchor=tk.W, pady=(0, 12))
+
+        # Idle VeraCrypt mounts are dismounted after this long
+        ttk.Label(main, text="Keep Idle Containers Mounted (seconds)",
+            font=("", 11, "bold")).pack(anchor=tk.W, pady=(0, 4))
+
+        self.mount_ttl_var = tk.IntVar(value=prefs.get("mount_ttl", 300))
+        ttk.Spinbox(main, textvariable=self.mount_ttl_var,
+            from_=0, to=86400, increment=60, width=6, font=("", 10)
+        ).pack(anchor=tk.W, pady=(0, 12))
+
         # Buttons
         btn_row = ttk.Frame(main)
         btn_row.pack(fill=tk.X, pady=(10, 0))
@@ -81,11 +99,22 @@ class PreferencesWindow:
             self.output_var.set(directory)
 
     def _save(self):
-        prefs = {
+        try:
+            workers = max(0, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            workers = 0
+        try:
+            mount_ttl = max(0, int(self.mount_ttl_var.get()))
+        except (tk.TclError, ValueError):
+            mount_ttl = 300
+        prefs = load_preferences()
+        prefs.update({
             "output_directory": self.output_var.get(),
             "encryption_method": self.method_var.get(),
             "naming_scheme": self.naming_var.get(),
-        }
+            "max_workers": workers,
+            "mount_ttl": mount_ttl,
+        })
         save_preferences(prefs)
         self.app.apply_preferences(prefs)
         self.win.destroy()
@@ -0,0 +1,248 @@
+"""
+Background job engine for encryption and decryption work.
+
+The Tk main loop must never block on a 7z/gpg/VeraCrypt subprocess, so the
+UI (and any headless caller) packages the work as a Job made of Tasks and
+hands it to a JobEngine. Worker threads own the engine calls; progress,
+completion and errors travel back through a thread-safe event queue that the
+owner drains on its own thread with dispatch().
+"""
+
+import os
+import queue
+import threading
+
+
+# Event kinds posted to the queue
+STARTED = "started"
+PROGRESS = "progress"
+TASK_DONE = "task_done"
+FINISHED = "finished"
+
+
+def resolve_workers(requested=0):
+    """Return a usable worker count; 0 or None means one per CPU."""
+    if requested and requested > 0:
+        return int(requested)
+    return os.cpu_count() or 1
+
+
+class JobEvent:
+    """A single state change of a job, delivered on the dispatching thread."""
+
+    __slots__ = ("kind", "job", "task", "data")
+
+    def __init__(self, kind, job, task=None, data=None):
+        self.kind = kind
+        self.job = job
+        self.task = task
+        self.data = data
+
+
+class Task:
+    """
+    One unit of work inside a job.
+
+    Args:
+        label (str): Name shown in summaries (usually the file name)
+        run (callable): Called as run(progress) on a worker thread, where
+            progress(bytes_done, bytes_total) reports this task's completion
+            (the engines' progress_callback protocol)
+        weight (float): Share of the job's overall progress (e.g. bytes)
+        group (str): Concurrency group, capped by the job's group_limits
+    """
+
+    def __init__(self, label, run, weight=1, group=None):
+        self.label = label
+        self.run = run
+        self.weight = max(weight, 1)
+        self.group = group
+        self.percent = 0.0
+        self.status = None
+
+
+class Job:
+    """A named batch of tasks plus its aggregated state."""
+
+    def __init__(self, job_id, name, tasks, on_event=None, max_parallel=1,
+                 group_limits=None):
+        self.id = job_id
+        self.name = name
+        self.tasks = list(tasks)
+        self.on_event = on_event
+        self.max_parallel = max(1, max_parallel)
+        self.group_limits = dict(group_limits or {})
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def done(self):
+        """True once the FINISHED event has been queued."""
+        return self._finished.is_set()
+
+    @property
+    def results(self):
+        """(label, "OK" or error message) for finished tasks, in task order."""
+        return [(t.label, t.status) for t in self.tasks
+                if t.status is not None]
+
+    @property
+    def percent(self):
+        """Weighted completion across all tasks, 0-100."""
+        total = sum(t.weight for t in self.tasks)
+        if not total:
+            return 100.0
+        return sum(t.percent * t.weight for t in self.tasks) / total
+
+    @property
+    def ok_count(self):
+        return sum(1 for _, status in self.results if status == "OK")
+
+    @property
+    def failed(self):
+        return [(label, status) for label, status in self.results
+                if status != "OK"]
+
+    def cancel(self):
+        """Skip every task that has not started yet."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+class JobEngine:
+    """
+    Worker pool that runs jobs off the caller's thread.
+
+    Events are queued from worker threads and only delivered when the owner
+    calls dispatch(), so handlers may safely touch Tk widgets.
+    """
+
+    def __init__(self, max_workers=1):
+        self._max_workers = max_workers
+        # Created by the first submit(): concurrent.futures pulls in
+        # logging and friends, which startup should not wait for
+        self._executor = None
+        self.events = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._active = {}
+
+    def submit(self, name, tasks, on_event=None, max_parallel=1,
+               group_limits=None):
+        """
+        Queue a job for background execution.
+
+        Args:
+            name (str): Human-readable job name
+            tasks (list): Task objects, started in order
+            on_event (callable): Receives each JobEvent during dispatch()
+            max_parallel (int): How many of the job's tasks may run at once
+            group_limits (dict): Per-group caps that replace max_parallel
+                for tasks of that group (e.g. {"veracrypt": 1})
+
+        Returns:
+            Job: The submitted job
+        """
+        with self._lock:
+            job = Job(self._next_id, name, tasks, on_event, max_parallel,
+                      group_limits)
+            self._next_id += 1
+            self._active[job.id] = job
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="diophantine-job")
+        self._executor.submit(self._run_job, job)
+        return job
+
+    @property
+    def busy(self):
+        with self._lock:
+            return bool(self._active)
+
+    def dispatch(self):
+        """Deliver all pending events to their job handlers. Returns count."""
+        count = 0
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return count
+            count += 1
+            if event.kind == FINISHED:
+                with self._lock:
+                    self._active.pop(event.job.id, None)
+            if event.job.on_event:
+                event.job.on_event(event)
+
+    def wait(self, job, poll_interval=0.05):
+        """Block until a job finishes, dispatching events meanwhile."""
+        while not job._finished.wait(poll_interval):
+            self.dispatch()
+        self.dispatch()
+
+    def shutdown(self, wait=True):
+        for job in list(self._active.values()):
+            job.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    # ── Worker side ──────────────────────────────────────────────
+
+    def _post(self, kind, job, task=None, data=None):
+        self.events.put(JobEvent(kind, job, task, data))
+
+    def _run_job(self, job):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._post(STARTED, job)
+
+        # Each concurrency group gets its own bounded pool; groups run
+        # side by side, tasks within a group start in submission order.
+        groups = {}
+        for task in job.tasks:
+            groups.setdefault(task.group, []).append(task)
+
+        pools = []
+        try:
+            for group, tasks in groups.items():
+                cap = job.group_limits.get(group, job.max_parallel)
+                pool = ThreadPoolExecutor(
+                    max_workers=max(1, min(cap, len(tasks))),
+                    thread_name_prefix=f"diophantine-job{job.id}")
+                pools.append(pool)
+                for task in tasks:
+                    pool.submit(self._run_task, job, task)
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=True)
+
+        self._post(FINISHED, job, data=job.results)
+        job._finished.set()
+
+    def _run_task(self, job, task):
+        if job.cancelled:
+            self._finish_task(job, task, "Cancelled")
+            return
+
+        def progress(done, total):
+            percent = done * 100.0 / total if total else 0.0
+            task.percent = max(0.0, min(100.0, percent))
+            self._post(PROGRESS, job, task, job.percent)
+
+        try:
+            task.run(progress)
+            status = "OK"
+        except Exception as e:
+            status = str(e) or e.__class__.__name__
+        self._finish_task(job, task, status)
+
+    def _finish_task(self, job, task, status):
+        task.percent = 100.0
+        task.status = status
+        self._post(TASK_DONE, job, task, status)
+        self._post(PROGRESS, job, task, job.percent)
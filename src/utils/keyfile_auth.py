@@ -1,13 +1,37 @@
 """
 Keyfile authentication module for generating, storing, and using keyfiles
+
+Any readable file of at least MIN_KEYFILE_SIZE bytes can be a keyfile,
+including large ones such as a photo or a disk image. Keyfiles are hashed
+in a single streaming pass, and the derived secret is cached for the
+session keyed by path, size, mtime and inode, so a batch resolves its key
+once and an edited or replaced keyfile is hashed again.
 """
 
 import os
 import secrets
 import hashlib
 import hmac
+import threading
+from collections import namedtuple
 from pathlib import Path
 
+# Smallest accepted keyfile (128 bits)
+MIN_KEYFILE_SIZE = 16
+
+# Read size while hashing a keyfile
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# SHA-256 block size: HMAC hashes longer keys first (RFC 2104)
+_HMAC_BLOCK_SIZE = 64
+
+# digest: SHA-256 of the contents; hmac_key: the key HMAC actually uses,
+# i.e. the contents themselves when short, otherwise their digest
+KeyfileSecret = namedtuple("KeyfileSecret", "digest hmac_key")
+
+_cache = {}
+_cache_lock = threading.Lock()
+
 def generate_keyfile(file_path, size=64):
     """
     Generate a random keyfile with the specified size in bytes.
@@ -41,9 +65,61 @@ def load_keyfile(file_path):
     with open(file_path, 'rb') as f:
         return f.read()
 
+def _hash_keyfile(file_path):
+    """Stream the file through SHA-256, keeping it whole only if short."""
+    digest = hashlib.sha256()
+    head = b""
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            if len(head) <= _HMAC_BLOCK_SIZE:
+                head += view[:min(n, _HMAC_BLOCK_SIZE + 1)].tobytes()
+            digest.update(view[:n])
+    digest = digest.digest()
+    return KeyfileSecret(digest,
+                         head if len(head) <= _HMAC_BLOCK_SIZE else digest)
+
+def keyfile_secret(file_path):
+    """
+    Hash a keyfile, or return the cached result for the same file.
+
+    Args:
+        file_path (str): Path to the keyfile
+
+    Returns:
+        KeyfileSecret: Digest and HMAC key of the keyfile contents
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    st = os.stat(file_path)
+    key = (os.path.realpath(file_path), st.st_size, st.st_mtime_ns,
+           st.st_ino)
+    with _cache_lock:
+        secret = _cache.get(key)
+    if secret is None:
+        secret = _hash_keyfile(file_path)
+        with _cache_lock:
+            # Drop stale entries for a keyfile that changed on disk
+            for old in [k for k in _cache if k[0] == key[0]]:
+                del _cache[old]
+            _cache[key] = secret
+    return secret
+
+def clear_keyfile_cache():
+    """Forget every cached keyfile secret."""
+    with _cache_lock:
+        _cache.clear()
+
 def validate_keyfile(file_path):
     """
     Validate that a file is a proper keyfile.
+
+    Hashes the file (once per session) so a later combine is immediate.
     
     Args:
         file_path (str): Path to the keyfile
@@ -52,24 +128,13 @@ def validate_keyfile(file_path):
         bool: True if the file is a valid keyfile, False otherwise
     """
     try:
-        if not os.path.exists(file_path):
-            return False
-        
-        # Check file size (reasonable range for a keyfile)
-        file_size = os.path.getsize(file_path)
-        if file_size < 16 or file_size > 1024:  # Between 128 and 8192 bits
+        if not os.path.isfile(file_path):
             return False
-        
-        # Try to read the file to make sure it's accessible
-        with open(file_path, 'rb') as f:
-            key_data = f.read()
-        
-        # Basic check: key should be non-empty
-        if len(key_data) == 0:
+        if os.path.getsize(file_path) < MIN_KEYFILE_SIZE:
             return False
-        
+        keyfile_secret(file_path)
         return True
-    except:
+    except OSError:
         return False
 
 def combine_keyfile_and_password(keyfile_path, password):
@@ -83,18 +148,23 @@ def combine_keyfile_and_password(keyfile_path, password):
     Returns:
         str: Combined key derived from both inputs
     """
-    # Load the keyfile data
-    keyfile_data = load_keyfile(keyfile_path)
-    
-    # Combine the password and keyfile data using HMAC
-    # This creates a derived key that requires both the keyfile AND password
+    # HMAC keyed by the keyfile over the password: requires both factors.
+    # hmac_key is what hmac.new() would derive from the full contents.
     password_bytes = password.encode('utf-8')
-    
-    # Use the keyfile as the key and password as the message for HMAC
-    # Or vice versa - both approaches provide two-factor authentication
-    combined_key = hmac.new(keyfile_data, password_bytes, hashlib.sha256).hexdigest()
-    
-    return combined_key
+    key = keyfile_secret(keyfile_path).hmac_key
+    return hmac.new(key, password_bytes, hashlib.sha256).hexdigest()
+
+def keyfile_password(keyfile_path):
+    """
+    Derive the password used when a keyfile is the only factor.
+
+    Args:
+        keyfile_path (str): Path to the keyfile
+
+    Returns:
+        str: Hex SHA-256 digest of the keyfile contents
+    """
+    return keyfile_secret(keyfile_path).digest.hex()
 
 def get_removable_drives():
     """
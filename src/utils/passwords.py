@@ -0,0 +1,178 @@
+"""
+Random password generation.
+
+Characters are drawn by rejection sampling over large os.urandom buffers:
+random bytes at or above the largest multiple of the charset size are
+discarded, and the rest are mapped to characters with one
+bytes.translate() call, so every character is equally likely and a batch
+of thousands of passwords costs a handful of system calls.
+"""
+
+import os
+import string
+from functools import lru_cache
+
+# Characters easily confused with each other in print or handwriting
+AMBIGUOUS = "Il1|O0o`'\""
+
+CLASSES = {
+    "upper": string.ascii_uppercase,
+    "lower": string.ascii_lowercase,
+    "digits": string.digits,
+    "symbols": string.punctuation,
+}
+
+# Bytes per read from the system RNG during batch generation
+READ_SIZE = 64 * 1024
+
+
+class PasswordPolicy:
+    """
+    What a generated password may and must contain.
+
+    Args:
+        length (int): Characters per password
+        upper, lower, digits, symbols (bool): Character classes to use
+        require_each (bool): Every selected class appears at least once
+        exclude_ambiguous (bool): Leave out AMBIGUOUS characters
+        exclude (str): Further characters to leave out
+    """
+
+    def __init__(self, length=24, upper=True, lower=True, digits=True,
+                 symbols=True, require_each=True, exclude_ambiguous=False,
+                 exclude=""):
+        self.length = length
+        self.upper = upper
+        self.lower = lower
+        self.digits = digits
+        self.symbols = symbols
+        self.require_each = require_each
+        self.exclude_ambiguous = exclude_ambiguous
+        self.exclude = exclude
+
+    def _excluded(self):
+        return set(self.exclude) | (set(AMBIGUOUS)
+                                    if self.exclude_ambiguous else set())
+
+    def classes(self):
+        """Selected classes as name -> allowed characters (letters+digits if none)."""
+        selected = {name: chars for name, chars in CLASSES.items()
+                    if getattr(self, name)}
+        if not selected:
+            selected = {name: CLASSES[name]
+                        for name in ("upper", "lower", "digits")}
+        excluded = self._excluded()
+        return {name: "".join(c for c in chars if c not in excluded)
+                for name, chars in selected.items()}
+
+    def charset(self):
+        return "".join(self.classes().values())
+
+    def validate(self):
+        """
+        Raises:
+            ValueError: If no password can satisfy the policy
+        """
+        classes = self.classes()
+        if self.length < 1:
+            raise ValueError("Password length must be at least 1.")
+        if not any(classes.values()):
+            raise ValueError("Every selected character is excluded.")
+        if self.require_each:
+            empty = [name for name, chars in classes.items() if not chars]
+            if empty:
+                raise ValueError("No characters left in: " + ", ".join(empty))
+            if self.length < len(classes):
+                raise ValueError(
+                    f"Length {self.length} is too short to include all "
+                    f"{len(classes)} character classes.")
+
+    def required_sets(self):
+        """One character set per class that must appear."""
+        if not self.require_each:
+            return []
+        return [frozenset(chars) for chars in self.classes().values()]
+
+    def accepts(self, password, required=None):
+        if len(password) != self.length:
+            return False
+        if required is None:
+            required = self.required_sets()
+        return all(not cls.isdisjoint(password) for cls in required)
+
+
+def build_charset(upper=True, lower=True, digits=True, symbols=True,
+                  exclude_ambiguous=False):
+    """Characters to draw from for the selected sets (letters+digits if none)."""
+    return PasswordPolicy(upper=upper, lower=lower, digits=digits,
+                          symbols=symbols,
+                          exclude_ambiguous=exclude_ambiguous).charset()
+
+
+@lru_cache(maxsize=32)
+def _tables(charset):
+    """(translate table, rejected bytes, accepted count) for a charset."""
+    encoded = charset.encode("ascii")
+    if not encoded or len(encoded) > 256:
+        raise ValueError("Charset must have 1 to 256 ASCII characters.")
+    # Largest multiple of the charset size that fits in a byte
+    accept = 256 - 256 % len(encoded)
+    table = bytes(encoded[b % len(encoded)] if b < accept else 0
+                  for b in range(256))
+    return table, bytes(range(accept, 256)), accept
+
+
+def random_chars(charset, count):
+    """
+    `count` characters drawn uniformly and independently from `charset`.
+
+    Args:
+        charset (str): Distinct ASCII characters (duplicates would be
+            weighted accordingly)
+    """
+    table, rejected, accept = _tables(charset)
+    parts = []
+    have = 0
+    while have < count:
+        # Over-read by the expected rejection rate, plus a little slack
+        size = min(max((count - have) * 256 // accept + 64, 64), READ_SIZE)
+        part = os.urandom(size).translate(table, rejected)
+        parts.append(part)
+        have += len(part)
+    return b"".join(parts)[:count].decode("ascii")
+
+
+def generate_password(length, charset):
+    """One password of `length` characters drawn uniformly from `charset`."""
+    return random_chars(charset, length)
+
+
+def generate_passwords(count, policy=None):
+    """
+    Generate `count` passwords satisfying `policy`.
+
+    Passwords missing a required class are discarded and redrawn, which
+    keeps the result uniform over all passwords the policy accepts.
+
+    Raises:
+        ValueError: If the policy cannot be satisfied
+    """
+    policy = policy or PasswordPolicy()
+    policy.validate()
+    charset = policy.charset()
+    required = policy.required_sets()
+    length = policy.length
+    results = []
+    while len(results) < count:
+        missing = count - len(results)
+        chars = random_chars(charset, missing * length)
+        for i in range(0, missing * length, length):
+            password = chars[i:i + length]
+            if all(not cls.isdisjoint(password) for cls in required):
+                results.append(password)
+    return results
+
+
+def generate(policy=None):
+    """One password satisfying `policy`."""
+    return generate_passwords(1, policy)[0]
@@ -6,6 +6,8 @@ DEFAULT_PREFERENCES = {
     "encryption_method": "zip",
     "naming_scheme": "original",
     "theme": "system",
+    "max_workers": 0,  # parallel archive jobs; 0 = one per CPU
+    "mount_ttl": 300,  # seconds an idle VeraCrypt mount is kept
 }
 
 
@@ -0,0 +1,297 @@
+"""
+Pattern-aware password strength estimation.
+
+StrengthEstimator scores a password as the cheapest way to describe it:
+each character is either guessed by brute force over the character
+classes seen so far, or absorbed into a pattern that costs far fewer
+bits: a repeated character, an alphabetic or numeric sequence, a keyboard
+walk, a repeat of the preceding chunk, a BIP-39 word or a very common
+password. The estimate is a dynamic programme over character positions
+in which position i only depends on positions before it, so an edit keeps
+everything before its first changed character and rescans only the rest.
+Typing at the end of a 200-character passphrase costs a few steps per
+keystroke.
+
+The word and keyboard indexes are built on first use.
+"""
+
+import math
+from functools import lru_cache
+
+from utils.entropy import entropy_to_strength
+
+# Character class pool sizes for brute-force guessing
+POOL_SIZES = {"lower": 26, "upper": 26, "digit": 10, "symbol": 33}
+
+# Shortest run that counts as a repeat, sequence or keyboard walk
+MIN_RUN = 3
+
+# Longest chunk checked for "abcabc"-style repeats
+MAX_REPEAT_CHUNK = 16
+
+# Bits below which encryption asks for confirmation
+LOW_STRENGTH_BITS = 50
+
+# Top entries of leaked-password lists; guessed before anything else
+COMMON_PASSWORDS = (
+    "password", "passw0rd", "qwerty", "letmein", "welcome", "admin",
+    "login", "master", "dragon", "monkey", "shadow", "sunshine",
+    "princess", "football", "baseball", "iloveyou", "trustno1", "secret",
+    "superman", "batman", "starwars", "whatever", "freedom", "hello",
+    "charlie", "michael", "jordan", "hunter", "ashley", "diophantine",
+)
+
+_KEYBOARD_ROWS = ("`1234567890-=", "qwertyuiop[]\\", "asdfghjkl;'", "zxcvbnm,./")
+_SHIFTED = str.maketrans('~!@#$%^&*()_+{}|:"<>?', "`1234567890-=[]\\;',./")
+
+
+# Neighbours on the staggered layout: each row sits about half a key to
+# the right of the one above
+_NEIGHBOUR_OFFSETS = ((0, -1), (0, 1), (-1, 0), (-1, 1), (1, -1), (1, 0))
+
+
+@lru_cache(maxsize=None)
+def _keyboard():
+    """(key, adjacent key) -> direction index on a US QWERTY layout."""
+    positions = {}
+    for r, row in enumerate(_KEYBOARD_ROWS):
+        for c, key in enumerate(row):
+            positions[key] = (r, c)
+    moves = {}
+    for key, (r, c) in positions.items():
+        for direction, (dr, dc) in enumerate(_NEIGHBOUR_OFFSETS):
+            rr, cc = r + dr, c + dc
+            if 0 <= rr < len(_KEYBOARD_ROWS) and 0 <= cc < len(_KEYBOARD_ROWS[rr]):
+                moves[key, _KEYBOARD_ROWS[rr][cc]] = direction
+    return moves, len(positions)
+
+
+@lru_cache(maxsize=None)
+def _words():
+    """word -> bits to guess it, for every dictionary the estimator knows."""
+    from utils.recovery_phrase import ENGLISH_WORDS
+    words = dict.fromkeys(ENGLISH_WORDS, math.log2(len(ENGLISH_WORDS)))
+    common = math.log2(len(COMMON_PASSWORDS))
+    for word in COMMON_PASSWORDS:
+        words[word] = common
+    lengths = {len(w) for w in words}
+    return words, min(lengths), max(lengths)
+
+
+def _char_class(ch):
+    if ch.isdigit():
+        return "digit"
+    if ch.islower():
+        return "lower"
+    if ch.isupper():
+        return "upper"
+    return "symbol"
+
+
+# Composition classes as metron tested them; one character may be in none
+# ('中') or two ('Ⓤ' is upper case and not alphanumeric)
+_SCORE_TESTS = (
+    ("lower", str.islower),
+    ("upper", str.isupper),
+    ("digit", str.isdigit),
+    ("symbol", lambda ch: not ch.isalnum()),
+)
+
+
+def _score_classes(ch):
+    return frozenset(name for name, test in _SCORE_TESTS if test(ch))
+
+
+def _sequence_start_bits(ch):
+    # Sequences starting at an obvious place ("abc", "123") are tried first
+    if ch in "aAzZ019":
+        return 2
+    return math.log2(10 if ch.isdigit() else 26)
+
+
+class StrengthEstimator:
+    """
+    Incremental strength estimate for one password field.
+
+    Call update() with the full field text after every edit; it reuses the
+    analysis of the unchanged prefix.
+    """
+
+    def __init__(self, password=""):
+        self.password = ""
+        self._lower = ""
+        self._keys = ""
+        # Per position i (character i):
+        self._classes = []   # set of classes seen in password[:i + 1]
+        self._scored = []    # composition classes seen in password[:i + 1]
+        self._run = []       # same-character run length ending at i
+        self._seq = []       # (length, step) of a +-1 sequence ending at i
+        self._walk = []      # (length, turns, direction) of a keyboard walk
+        # Per prefix length n: cheapest bits for password[:n], and the
+        # pattern that ends there as (kind, start), for patterns()
+        self._bits = [0.0]
+        self._back = [None]
+        if password:
+            self.update(password)
+
+    # ── Public API ───────────────────────────────────────────────
+
+    def update(self, password):
+        """Re-score after an edit. Returns the new estimate in bits."""
+        old = self.password
+        if password == old:
+            return self.bits
+        if password.startswith(old):
+            keep = len(old)
+        else:
+            keep = 0
+            limit = min(len(old), len(password))
+            while keep < limit and old[keep] == password[keep]:
+                keep += 1
+
+        self.password = password
+        self._lower = password.lower()
+        if len(self._lower) != len(password):
+            # A few characters lower-case to two ('İ'); keep indexes aligned
+            self._lower = "".join(c.lower() if len(c.lower()) == 1 else c
+                                  for c in password)
+        self._keys = self._lower.translate(_SHIFTED)
+        del self._classes[keep:]
+        del self._scored[keep:]
+        del self._run[keep:]
+        del self._seq[keep:]
+        del self._walk[keep:]
+        del self._bits[keep + 1:]
+        del self._back[keep + 1:]
+        for i in range(keep, len(password)):
+            self._scan(i)
+        return self.bits
+
+    @property
+    def bits(self):
+        """Estimated bits of guessing work for the whole password."""
+        return self._bits[-1]
+
+    @property
+    def label(self):
+        """(strength label, color) for the estimate."""
+        return entropy_to_strength(self.bits)
+
+    @property
+    def score(self):
+        """Composition score 0-6: length >= 12 (2), then 1 per class."""
+        scored = self._scored[-1] if self._scored else ()
+        return (2 if len(self.password) >= 12 else 0) + len(scored)
+
+    def patterns(self):
+        """
+        Patterns that lowered the estimate, left to right.
+
+        Returns:
+            list: (kind, text) pairs, kind one of "repeat", "sequence",
+            "keyboard", "chunk" or "word"
+        """
+        found = []
+        n = len(self.password)
+        while n > 0:
+            kind, start = self._back[n]
+            if kind != "char":
+                found.append((kind, self.password[start:n]))
+            n = start
+        found.reverse()
+        return found
+
+    # ── Scanning ─────────────────────────────────────────────────
+
+    def _scan(self, i):
+        ch = self.password[i]
+        classes = self._classes[i - 1] if i else frozenset()
+        cls = _char_class(ch)
+        if cls not in classes:
+            classes = classes | {cls}
+        self._classes.append(classes)
+        scored = self._scored[i - 1] if i else frozenset()
+        self._scored.append(scored | _score_classes(ch))
+
+        pool = sum(POOL_SIZES[c] for c in classes)
+        best = self._bits[i] + math.log2(pool)
+        back = ("char", i)
+
+        def consider(kind, start, cost):
+            nonlocal best, back
+            bits = self._bits[start] + cost
+            if bits < best:
+                best, back = bits, (kind, start)
+
+        # Same character repeated
+        run = self._run[i - 1] + 1 if i and self.password[i - 1] == ch else 1
+        self._run.append(run)
+        if run >= MIN_RUN:
+            start = i - run + 1
+            consider("repeat", start,
+                     math.log2(POOL_SIZES[_char_class(ch)]) + math.log2(run))
+
+        # Alphabetic or numeric sequence, either direction
+        seq = (1, 0)
+        if i:
+            step = ord(self._lower[i]) - ord(self._lower[i - 1])
+            prev_len, prev_step = self._seq[i - 1]
+            if step in (1, -1) and self._lower[i].isalnum() \
+                    and self._lower[i - 1].isalnum():
+                seq = (prev_len + 1 if prev_step in (0, step) else 2, step)
+        self._seq.append(seq)
+        if seq[0] >= MIN_RUN:
+            start = i - seq[0] + 1
+            consider("sequence", start,
+                     _sequence_start_bits(self.password[start])
+                     + math.log2(seq[0]) + (1 if seq[1] < 0 else 0))
+
+        # Keyboard walk: each key adjacent to the previous one
+        moves, keys = _keyboard()
+        walk = (1, 0, None)
+        if i:
+            direction = moves.get((self._keys[i - 1], self._keys[i]))
+            if direction is not None:
+                prev_len, turns, prev_direction = self._walk[i - 1]
+                if prev_direction is not None and prev_direction != direction:
+                    turns += 1
+                walk = (prev_len + 1, turns, direction)
+        self._walk.append(walk)
+        if walk[0] >= MIN_RUN:
+            start = i - walk[0] + 1
+            # Start key, length, and a few guesses per change of direction
+            consider("keyboard", start,
+                     math.log2(keys) + math.log2(walk[0]) + 2 * walk[1])
+
+        # The chunk just typed repeats the chunk before it ("abcabc")
+        for size in range(2, min(MAX_REPEAT_CHUNK, (i + 1) // 2) + 1):
+            end = i + 1
+            if self.password[end - size:end] == \
+                    self.password[end - 2 * size:end - size]:
+                consider("chunk", end - size, 1 + math.log2(size))
+
+        # Dictionary words ending here, case-insensitive
+        words, shortest, longest = _words()
+        for size in range(shortest, min(longest, i + 1) + 1):
+            start = i + 1 - size
+            cost = words.get(self._lower[start:i + 1])
+            if cost is not None:
+                token = self.password[start:i + 1]
+                if token != token.lower():
+                    # Capitalised or all caps: a couple of extra guesses
+                    cost += 1 if token[1:] == token[1:].lower() \
+                        or token == token.upper() else size
+                consider("word", start, cost)
+
+        self._bits.append(best)
+        self._back.append(back)
+
+
+def estimate(password):
+    """One-off estimate in bits."""
+    return StrengthEstimator(password).bits
+
+
+def password_strength(password):
+    """Composition score 0-6 (length >= 12 counts 2, then 1 per class)."""
+    return StrengthEstimator(password).score
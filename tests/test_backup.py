@@ -0,0 +1,90 @@
+"""
+Incremental backup runs against the 7z stand-in from benchmarks/.
+
+    python -m unittest discover -s tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, os.path.join(HERE, "..", "benchmarks"))
+
+import standins  # noqa: E402
+from crypto import operations  # noqa: E402
+from crypto.backup import ChangeIndex, IncrementalBackup  # noqa: E402
+from crypto.tools import TOOLS_CACHE_ENV  # noqa: E402
+from utils.jobs import Task  # noqa: E402
+
+PASSWORD = "test-password-not-secret"
+
+
+class IncrementalBackupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="diophantine-test-")
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        bin_dir = os.path.join(self.tmp, "bin")
+        standins.install(bin_dir, ["7z"])
+        env = {
+            "PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+            "DIOPHANTINE_STANDIN_LATENCY_MS": "0",
+            TOOLS_CACHE_ENV: os.path.join(bin_dir, "tools.json"),
+        }
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tools = mock.patch.dict("crypto.tools._tools", clear=True)
+        tools.start()
+        self.addCleanup(tools.stop)
+
+        self.src = os.path.join(self.tmp, "data")
+        os.makedirs(self.src)
+        with open(os.path.join(self.src, "a.txt"), "w") as f:
+            f.write("first")
+        self.out = os.path.join(self.tmp, "out")
+        os.makedirs(self.out)
+        self.index_file = os.path.join(self.tmp, "index.json")
+
+    def backup(self, verify=True):
+        return IncrementalBackup([self.src], self.out, method="7z",
+                                 index_file=self.index_file, verify=verify)
+
+    def test_failed_verify_leaves_no_archive_and_no_index_change(self):
+        base = self.backup()
+        base.run(PASSWORD)
+        with open(self.index_file, "rb") as f:
+            index_before = f.read()
+        archives_before = sorted(os.listdir(self.out))
+
+        with open(os.path.join(self.src, "b.txt"), "w") as f:
+            f.write("second")
+
+        def failing_verify(path, password, file_type=None):
+            def run(progress):
+                raise RuntimeError("7-Zip test failed")
+            return Task(os.path.basename(path), run)
+
+        with mock.patch.object(operations, "verify_task", failing_verify):
+            with self.assertRaises(RuntimeError):
+                self.backup().run(PASSWORD)
+
+        self.assertEqual(sorted(os.listdir(self.out)), archives_before)
+        with open(self.index_file, "rb") as f:
+            self.assertEqual(f.read(), index_before)
+
+        # The next run continues the set where the base left off
+        delta = self.backup()
+        delta.run(PASSWORD)
+        self.assertEqual(delta.sequence, 1)
+        index = ChangeIndex.load(self.index_file)
+        self.assertEqual(index.archives, [base.archive, delta.archive])
+
+
+if __name__ == "__main__":
+    unittest.main()